@@ -0,0 +1,236 @@
+"""Benchmark the app's routes against a synthetic library and a local TMDB stub.
+
+Generates a library at the requested scale, starts the TMDB stub, imports
+src/main.py against both and times requests through Flask's test client:
+
+    python benchmarks/bench.py --movies 10000 --shows 500 --seasons 20 --latency 0.02
+    python benchmarks/bench.py --backend sqlite --compare benchmarks/results/<earlier run>.json
+
+Reports p50/p99 latency, throughput and TMDB calls per route and saves them
+as JSON under --output, named after the time and git commit, for comparing
+runs between versions.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from generate_library import generate
+from tmdb_stub import TmdbStub, show_title
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, wall, tmdb_calls):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'throughput': round(len(latencies) / wall, 1) if wall else None,
+        'tmdb_calls': tmdb_calls
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_app(workdir, stub, args):
+    """Import src/main.py configured for the synthetic library and the stub"""
+    os.environ.update({
+        'MOVIES_FILE': os.path.join(workdir, 'movies.json'),
+        'TV_SHOWS_FILE': os.path.join(workdir, 'tv_shows.json'),
+        'LIBRARY_BACKEND': args.backend,
+        'LIBRARY_DB_FILE': os.path.join(workdir, 'library.db'),
+        'TMDB_API_URL': stub.url,
+        'TMDB_API_KEY': 'benchmark',
+        'TMDB_CACHE_FILE': os.path.join(workdir, 'tmdb_cache.db'),
+        'TMDB_RATE_LIMIT': str(args.rate_limit),
+        'REFRESH_INTERVAL_MINUTES': '0',
+        'MOVIE_BACKFILL_BATCH_SIZE': '0',
+        'IMPORT_DIR': os.path.join(workdir, 'imports'),
+        'TMDB_INDEX_FILE': os.path.join(workdir, 'tmdb_index.db'),
+        'POSTER_CACHE_DIR': os.path.join(workdir, 'posters'),
+    })
+    if not args.tmdb_cache:
+        # Every TMDB call reaches the stub, so the counts show what a cold cache costs
+        for name in ('SEARCH', 'MOVIE_SEARCH', 'SERIES', 'FINISHED'):
+            os.environ[f'TMDB_CACHE_{name}_TTL'] = '0'
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+    import main
+
+    logging.disable(logging.INFO)
+    if args.backend == 'sqlite':
+        from json_library import JsonLibrary
+        from sqlite_library import import_json_library
+        source = JsonLibrary(main.movies_store, main.tv_shows_store, main.tv_episodes_store)
+        import_json_library(main.library, source.list_movies(), source.list_shows(with_episodes=True))
+    else:
+        # Parse (and pack) the files up front so the first timed request doesn't pay for it
+        main.library.list_movies()
+        main.library.list_shows()
+    return main
+
+
+def run_route(app, stub, name, method, path, make_data, count, concurrency):
+    """Time count requests (after a short warm-up), concurrency at a time"""
+    local = threading.local()
+
+    def request(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        data = make_data(i) if make_data else None
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        return time.perf_counter() - started, response.status_code >= 500
+
+    for i in range(max(1, count // 10)):
+        request(i)
+
+    calls_before = stub.count()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(request, range(count)))
+    wall = time.perf_counter() - started
+    return summarize([latency for latency, _ in results], sum(error for _, error in results), wall,
+                     stub.count() - calls_before)
+
+
+def run_pulls(main, stub, count):
+    """Time /pull_new_episodes until its background job finishes"""
+    client = main.app.test_client()
+    latencies, errors, tmdb_calls = [], 0, 0
+    for _ in range(count):
+        calls_before = stub.count()
+        started = time.perf_counter()
+        response = client.post('/pull_new_episodes', data={'force': 'true'})
+        job = main.refresh_scheduler.get(response.get_json()['job']['id'])
+        while not job.done:
+            time.sleep(0.005)
+        latencies.append(time.perf_counter() - started)
+        errors += len(job.errors) + (job.state == 'failed')
+        tmdb_calls += stub.count() - calls_before
+    return summarize(latencies, errors, sum(latencies), tmdb_calls)
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('commit')}, {baseline['meta']['created_at']}):")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p99_ms', 'throughput', 'tmdb_calls'):
+            if before.get(key):
+                changes.append(f"{key} {(result[key] - before[key]) / before[key] * 100:+.1f}%")
+            else:
+                changes.append(f"{key} {before.get(key)} -> {result[key]}")
+        print(f"  {name:<30} {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=500)
+    parser.add_argument('--seasons', type=int, default=20)
+    parser.add_argument('--episodes', type=int, default=10, help='Episodes per season')
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds the TMDB stub takes per request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=40, help='TMDB_RATE_LIMIT for the run')
+    parser.add_argument('--tmdb-cache', action='store_true', help='Keep the TMDB response cache enabled')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+    parser.add_argument('--pulls', type=int, default=3, help='Runs of /pull_new_episodes')
+    parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight per route')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results'))
+    parser.add_argument('--compare', help='Earlier results file to compare with')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='movie-picker-bench-')
+    stub = TmdbStub(latency=args.latency, jitter=args.jitter, seasons=args.seasons,
+                    episodes=args.episodes).start()
+    main_module = None
+    try:
+        started = time.perf_counter()
+        generate(workdir, args.movies, args.shows, args.seasons, args.episodes, args.seed)
+        main_module = load_app(workdir, stub, args)
+        print(f"Library of {args.movies} movies and {args.shows} shows x {args.seasons} seasons "
+              f"ready in {time.perf_counter() - started:.1f}s ({args.backend})")
+
+        rng = random.Random(args.seed)
+        app = main_module.app
+
+        def episode_update(i):
+            return {'title': show_title(rng.randint(1, args.shows)), 'season': rng.randint(1, args.seasons),
+                    'episode': rng.randint(1, args.episodes), 'watched': rng.choice(('true', 'false'))}
+
+        routes = [
+            ('GET /', 'GET', '/', None),
+            ('POST /pick_movie', 'POST', '/pick_movie', None),
+            ('POST /update_episode_status', 'POST', '/update_episode_status', episode_update),
+            ('GET /api/unwatched_episodes', 'GET', '/api/unwatched_episodes?limit=50', None),
+        ]
+        results = {}
+        for name, method, path, make_data in routes:
+            results[name] = run_route(app, stub, name, method, path, make_data, args.requests,
+                                      args.concurrency)
+            print(f"{name:<30} {results[name]}")
+        results['POST /pull_new_episodes'] = run_pulls(main_module, stub, args.pulls)
+        print(f"{'POST /pull_new_episodes':<30} {results['POST /pull_new_episodes']}")
+
+        commit = git_commit()
+        report = {
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'commit': commit,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+            },
+            'results': results
+        }
+        os.makedirs(args.output, exist_ok=True)
+        path = os.path.join(args.output, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'unknown'}-{args.backend}.json")
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=4)
+        print(f"Saved {path}")
+        if args.compare:
+            compare(results, args.compare)
+    finally:
+        if main_module:
+            main_module.tmdb_async.close()
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
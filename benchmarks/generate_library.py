@@ -0,0 +1,88 @@
+"""Write a synthetic movies.json / tv_shows.json pair for benchmarks.
+
+Shows are named "Show <n>" with tmdb_id n and carry the same seasons the
+TMDB stub serves for them (minus its extra episodes), so a refresh against
+the stub finds a few new episodes per show.
+
+    python benchmarks/generate_library.py /tmp/library --movies 10000 --shows 500 --seasons 20
+"""
+import argparse
+import json
+import os
+import random
+
+from tmdb_stub import season_episodes, show_title
+
+SHOW_STATUSES = ('ongoing', 'ongoing', 'on_hold', 'to_watch', 'watched')
+
+
+def generate_movies(count, rng):
+    movies = []
+    for i in range(1, count + 1):
+        watched = rng.random() < 0.6
+        movies.append({
+            'title': f"Movie {i}",
+            'watched': watched,
+            'rating': rng.randint(1, 5) if watched else 0,
+            'poster': f"https://image.tmdb.org/t/p/w500/movie{i}.jpg",
+            'overview': f"Synthetic movie {i}.",
+            'release_date': f"{rng.randint(1950, 2024)}-01-01",
+            'tmdb_rating': round(rng.uniform(4, 9), 1)
+        })
+    return movies
+
+
+def generate_shows(count, seasons, episodes, rng):
+    shows = []
+    for show_id in range(1, count + 1):
+        # Watched up to some point, like a real watch history
+        watched_through = rng.randint(0, seasons * episodes)
+        show_seasons = []
+        for season in range(1, seasons + 1):
+            season_eps = season_episodes(season, seasons, episodes)
+            for ep in season_eps:
+                ep['watched'] = (season - 1) * episodes + ep['episode_number'] <= watched_through
+            show_seasons.append({'season_number': season, 'episode_count': len(season_eps),
+                                 'episodes': season_eps})
+        shows.append({
+            'title': show_title(show_id),
+            'status': SHOW_STATUSES[show_id % len(SHOW_STATUSES)],
+            'rating': 0,
+            'overview': f"Synthetic show {show_id}.",
+            'poster': f"https://image.tmdb.org/t/p/w500/show{show_id}.jpg",
+            'year': '2000',
+            'tmdb_id': show_id,
+            'tmdb_rating': 7.5,
+            'seasons': show_seasons
+        })
+    return shows
+
+
+def generate(directory, movies=10000, shows=500, seasons=20, episodes=10, seed=0):
+    """Write movies.json and tv_shows.json into directory; returns their paths"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    movies_path = os.path.join(directory, 'movies.json')
+    shows_path = os.path.join(directory, 'tv_shows.json')
+    with open(movies_path, 'w') as file:
+        json.dump(generate_movies(movies, rng), file)
+    with open(shows_path, 'w') as file:
+        json.dump(generate_shows(shows, seasons, episodes, rng), file)
+    return movies_path, shows_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--movies', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=500)
+    parser.add_argument('--seasons', type=int, default=20)
+    parser.add_argument('--episodes', type=int, default=10, help='Episodes per season')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path in generate(args.directory, args.movies, args.shows, args.seasons, args.episodes, args.seed):
+        print(f"Wrote {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Local stand-in for the TMDB endpoints the app uses, for benchmarks.
+
+Serves search/movie, search/tv, tv/{id} (with append_to_response=season/N)
+and tv/{id}/season/{n} from deterministic synthetic data, after an optional
+artificial latency, and counts the requests it answers per endpoint.
+
+    python benchmarks/tmdb_stub.py --port 8765 --latency 0.05
+    TMDB_API_URL=http://127.0.0.1:8765/3 python src/main.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def show_title(show_id):
+    return f"Show {show_id}"
+
+
+def show_id_for(title):
+    """Inverse of show_title(); any other title maps to a stable id of its own"""
+    match = re.search(r'(\d+)\s*$', title)
+    return int(match.group(1)) if match else sum(map(ord, title)) % 100000 + 100000
+
+
+def season_episodes(season, seasons, episodes, extra_episodes=0, today=None):
+    """Episode payloads of one season; the last season's last episode aired yesterday.
+
+    Episodes are a week apart, counting back from there. extra_episodes are
+    added to the last season, e.g. to give a refresh something new to find.
+    """
+    today = today or date.today()
+    total = seasons * episodes + extra_episodes
+    count = episodes + (extra_episodes if season == seasons else 0)
+    result = []
+    for number in range(1, count + 1):
+        index = (season - 1) * episodes + number - 1
+        air_date = today - timedelta(days=1 + 7 * (total - 1 - index))
+        result.append({
+            'episode_number': number,
+            'name': f"Episode {number}",
+            'overview': f"Season {season}, episode {number}.",
+            'air_date': air_date.isoformat()
+        })
+    return result
+
+
+class TmdbStub:
+    """Threaded HTTP server answering TMDB requests under /3"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, seasons=20, episodes=10,
+                 extra_episodes=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.seasons = seasons
+        self.episodes = episodes
+        self.extra_episodes = extra_episodes
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/3"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='tmdb-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self):
+        """Requests answered so far, in total"""
+        with self._lock:
+            return sum(self.requests.values())
+
+    def _season(self, show_id, season):
+        return {
+            'id': show_id * 1000 + season,
+            'season_number': season,
+            'episodes': season_episodes(season, self.seasons, self.episodes, self.extra_episodes)
+        }
+
+    def _series(self, show_id, append):
+        data = {
+            'id': show_id,
+            'name': show_title(show_id),
+            'overview': f"Synthetic show {show_id}.",
+            'first_air_date': '2000-01-01',
+            'last_air_date': (date.today() - timedelta(days=1)).isoformat(),
+            'next_episode_to_air': None,
+            'status': 'Returning Series',
+            'number_of_seasons': self.seasons,
+            'vote_average': 7.5,
+            'poster_path': f"/show{show_id}.jpg"
+        }
+        for item in append:
+            match = re.fullmatch(r'season/(\d+)', item)
+            if match and 1 <= int(match.group(1)) <= self.seasons:
+                data[item] = self._season(show_id, int(match.group(1)))
+        return data
+
+    def route(self, path, params):
+        """(endpoint name, JSON payload) for a request path under /3"""
+        query = params.get('query', [''])[0]
+        if path == '/3/search/movie':
+            return 'search/movie', {'page': 1, 'total_pages': 1, 'results': [{
+                'id': show_id_for(query), 'title': query, 'overview': f"Synthetic movie {query}.",
+                'release_date': '2001-01-01', 'vote_average': 6.5, 'poster_path': '/movie.jpg'
+            }]}
+        if path == '/3/search/tv':
+            show_id = show_id_for(query)
+            return 'search/tv', {'page': 1, 'total_pages': 1, 'results': [{
+                'id': show_id, 'name': query, 'overview': f"Synthetic show {show_id}.",
+                'first_air_date': '2000-01-01', 'vote_average': 7.5, 'poster_path': f"/show{show_id}.jpg"
+            }]}
+        match = re.fullmatch(r'/3/tv/(\d+)/season/(\d+)', path)
+        if match:
+            return 'tv/season', self._season(int(match.group(1)), int(match.group(2)))
+        match = re.fullmatch(r'/3/tv/(\d+)', path)
+        if match:
+            append = params.get('append_to_response', [''])[0].split(',')
+            return 'tv', self._series(int(match.group(1)), append)
+        return None, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+
+    def handle(self, request):
+        url = urlparse(request.path)
+        endpoint, payload = self.route(url.path, parse_qs(url.query))
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        with self._lock:
+            self.requests[endpoint or 'not_found'] += 1
+        body = json.dumps(payload).encode('utf-8')
+        request.send_response(200 if endpoint else 404)
+        request.send_header('Content-Type', 'application/json;charset=utf-8')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds, at random')
+    parser.add_argument('--seasons', type=int, default=20)
+    parser.add_argument('--episodes', type=int, default=10, help='Episodes per season')
+    parser.add_argument('--extra-episodes', type=int, default=1, help='Extra episodes in the last season')
+    args = parser.parse_args()
+    stub = TmdbStub(args.host, args.port, args.latency, args.jitter, args.seasons, args.episodes,
+                    args.extra_episodes)
+    print(f"TMDB stub listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
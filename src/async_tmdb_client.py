@@ -0,0 +1,276 @@
+import json
+import asyncio
+import logging
+import functools
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from tmdb_client import (TMDB_API_URL, RETRY_STATUSES, _retry_after, cache_ttl, movie_details,
+                         show_details, season_batches, assemble_seasons, record_request,
+                         record_cache_lookup, index_lookup)
+
+logger = logging.getLogger(__name__)
+
+
+def _on_client_loop(method):
+    """Run a client coroutine on the client's own event loop.
+
+    Awaiting it from another loop (e.g. a Flask async view, which gets a
+    fresh loop per request) hands the call over to the client loop, so the
+    connection pool and the concurrency limit are shared by every request.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await method(self, *args, **kwargs)
+        future = asyncio.run_coroutine_threadsafe(method(self, *args, **kwargs), loop)
+        return await asyncio.wrap_future(future)
+    return wrapper
+
+
+class AsyncTmdbClient:
+    """asyncio TMDB client with the same endpoints as TmdbClient, as coroutines.
+
+    Requests run on one event loop in a background thread over a pooled
+    aiohttp session, at most `concurrency` at a time. They share the rate
+    limiter and cache with the synchronous client and are retried the same
+    way (connection errors and 429/5xx, honouring Retry-After), counted
+    in the same `metrics` series and answer searches from the same `index`.
+    The cache and the index are SQLite files, so their lookups run on
+    `disk_workers` threads rather than blocking the loop.
+    """
+
+    def __init__(self, api_key, rate_limiter=None, cache=None, ttls=None, pool_size=16,
+                 connect_timeout=3.05, read_timeout=10, max_retries=3, backoff=0.5,
+                 append_limit=20, concurrency=16, metrics=None, index=None, disk_workers=4):
+        self.api_key = api_key
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.metrics = metrics
+        self.index = index
+        self.ttls = {'search': 3600, 'movie_search': 7 * 86400, 'series': 3600, 'finished': 30 * 86400}
+        self.ttls.update(ttls or {})
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.append_limit = append_limit
+        self.concurrency = concurrency
+        self.disk_workers = disk_workers
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._session = None
+        self._semaphore = None
+        self._disk_executor = None
+
+    def headers(self):
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json;charset=utf-8'
+        }
+
+    # Event loop
+
+    def _ensure_loop(self):
+        """Start the client's loop thread on first use (again in a forked worker)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name='tmdb-async', daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop = loop
+                self._pid = os.getpid()
+            return self._loop
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size)
+        self._session = aiohttp.ClientSession(connector=connector, headers=self.headers(),
+                                              timeout=self.timeout)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._disk_executor = ThreadPoolExecutor(max_workers=self.disk_workers, thread_name_prefix='tmdb-disk')
+
+    async def _off_loop(self, func, *args):
+        """Run blocking disk work (cache and index lookups) on a worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._disk_executor, func, *args)
+
+    async def _close(self):
+        await self._session.close()
+        self._disk_executor.shutdown(wait=False)
+
+    def close(self):
+        """Close the session and stop the loop thread; a later call starts them again"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None or self._pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the client loop from any thread; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    # HTTP
+
+    async def _get(self, url, params=None):
+        """Throttled GET with timeouts and retries; returns (status, body text)"""
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            try:
+                async with self._semaphore:
+                    started = time.perf_counter()
+                    async with self._session.get(url, params=params) as response:
+                        status = response.status
+                        retry_after = _retry_after(response)
+                        text = await response.text()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                record_request(self.metrics, url, 'error', time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"TMDB request to {url} failed ({str(e) or type(e).__name__}), retrying in {delay}s")
+            else:
+                record_request(self.metrics, url, status, time.perf_counter() - started)
+                if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return status, text
+                delay = retry_after if retry_after is not None else self.backoff * 2 ** attempt
+                logger.warning(f"TMDB returned {status} for {url}, retrying in {delay}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @_on_client_loop
+    async def get_json(self, url, params=None):
+        """GET a TMDB endpoint and return its JSON, served from the cache when fresh"""
+        key = None
+        if self.cache:
+            key = self.cache.make_key(url, params)
+            data = await self._off_loop(self.cache.get, key)
+            record_cache_lookup(self.metrics, url, data is not None)
+            if data is not None:
+                return data
+
+        status, text = await self._get(url, params=params)
+        try:
+            data = json.loads(text)
+        except ValueError:
+            # Not JSON (e.g. an HTML error page from the edge)
+            raise aiohttp.ClientError(f"TMDB returned {status} with a non-JSON body")
+        # Error payloads (not found, bad key, rate limited) are never cached
+        if self.cache and status == 200 and 'status_code' not in data:
+            await self._off_loop(self.cache.set, key, data, cache_ttl(self.ttls, url, data))
+        return data
+
+    async def _index_lookup(self, kind, title, year=None):
+        if self.index is None:
+            return None
+        return await self._off_loop(index_lookup, self.index, self.metrics, kind, title, year)
+
+    # Endpoints
+
+    async def search_movies(self, query, year=None):
+        params = {'query': query, 'language': 'en-US'}
+        if year:
+            params['year'] = year
+        return await self.get_json(f"{TMDB_API_URL}/search/movie", params=params)
+
+    async def search_tv(self, query):
+        return await self.get_json(f"{TMDB_API_URL}/search/tv", params={'query': query, 'language': 'en-US'})
+
+    @_on_client_loop
+    async def find_movie(self, title, year=None):
+        """Details of the best TMDB match for `title` (from `year` when given), or None when nothing matches.
+
+        Unlike get_movie_details(), TMDB and network errors are raised.
+        """
+        hit = await self._index_lookup('movie', title, year)
+        if hit:
+            return movie_details(hit)
+        search_data = await self.search_movies(title, year)
+        if 'status_code' in search_data:
+            raise aiohttp.ClientError(f"TMDB error: {search_data.get('status_message')}")
+        if search_data.get('results'):
+            return movie_details(search_data['results'][0])
+        return None
+
+    async def get_movie_details(self, title):
+        try:
+            return await self.find_movie(title)
+        except Exception as e:
+            logger.error(f"Error fetching movie details: {str(e)}")
+        return None
+
+    @_on_client_loop
+    async def get_tv_show_details(self, title):
+        try:
+            show = await self._index_lookup('show', title)
+            if show is None:
+                search_data = await self.search_tv(title)
+                show = search_data['results'][0] if search_data['results'] else None
+            if show:
+                episodes = await self.get_tv_show_episodes(show['id'])
+                return show_details(show, episodes)
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching TV show details: {str(e)}")
+            return None
+
+    async def get_tv_show_episodes(self, show_id):
+        return (await self.fetch_tv_show(show_id))[1]
+
+    @_on_client_loop
+    async def fetch_tv_show(self, show_id, from_season=1):
+        """Fetch a show's series data and its aired seasons; returns (series_data, seasons).
+
+        Only seasons numbered from_season and up are fetched.
+        """
+        try:
+            series_url = f"{TMDB_API_URL}/tv/{show_id}"
+
+            async def fetch_season_batch(season_numbers):
+                # append_to_response returns each season under a "season/N" key
+                data = await self.get_json(
+                    series_url,
+                    params={'append_to_response': ','.join(f"season/{n}" for n in season_numbers)}
+                )
+                return data, {n: data.get(f"season/{n}") for n in season_numbers}
+
+            async def fetch_season(season):
+                return season, await self.get_json(f"{series_url}/season/{season}")
+
+            # The series request itself carries the first batch of seasons
+            series_data, season_data = await fetch_season_batch(range(from_season, from_season + self.append_limit))
+
+            if 'status_code' in series_data:
+                if series_data['status_code'] == 34:
+                    logger.error(f"TV show not found: {show_id}")
+                else:
+                    logger.error(f"TMDB error for show {show_id}: {series_data.get('status_message')}")
+                return {}, []
+
+            number_of_seasons = series_data.get('number_of_seasons', 0)
+            batches = season_batches(number_of_seasons, self.append_limit, from_season)
+            for _, batch_data in await asyncio.gather(*map(fetch_season_batch, batches)):
+                season_data.update(batch_data)
+
+            # Fall back to the per-season endpoint for anything the batches didn't return
+            missing = [n for n in range(from_season, number_of_seasons + 1) if not season_data.get(n)]
+            for season, data in await asyncio.gather(*map(fetch_season, missing)):
+                season_data[season] = data
+
+            return series_data, assemble_seasons(number_of_seasons, season_data, from_season)
+
+        except Exception as e:
+            logger.error(f"Error fetching TV show episodes: {str(e)}")
+            return {}, []
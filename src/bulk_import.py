@@ -0,0 +1,348 @@
+import os
+import csv
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from datetime import date, datetime
+from itertools import islice
+
+from title_index import TitleIndex
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'json', 'jsonl')
+SHOW_TYPES = {'show', 'tv', 'tv show', 'series', 'tvseries', 'tvminiseries', 'tv series', 'tv mini series'}
+# Errors kept on a job; the rest are only counted
+MAX_JOB_ERRORS = 50
+
+
+def _truthy(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'x', 'watched')
+
+
+def _rating(value, scale):
+    """A rating on a 1..scale scale as our 1-5 stars (0 when missing)"""
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return 0
+    if rating <= 0:
+        return 0
+    # Halves round up: 3.5 Letterboxd stars are 4 here
+    return min(5, max(1, int(rating * 5 / scale + 0.5)))
+
+
+def parse_entry(row, kind=None, watched=None):
+    """One export row as {'kind', 'title', 'year', 'watched', 'rating'}, or None if it has no title.
+
+    Understands Letterboxd exports (Name, Year, Rating out of 5, Watched Date),
+    IMDb exports (Title, Year, Title Type, Your Rating out of 10, Date Rated)
+    and plain lists with title/name, year, type, watched and rating columns.
+    """
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    title = (row.get('title') or row.get('name') or '').strip()
+    if not title:
+        return None
+
+    entry_kind = kind
+    if entry_kind is None:
+        row_type = str(row.get('title type') or row.get('type') or row.get('kind') or '').strip().lower()
+        entry_kind = 'show' if row_type in SHOW_TYPES else 'movie'
+
+    if 'your rating' in row:
+        rating = _rating(row.get('your rating'), 10)
+    else:
+        rating = _rating(row.get('rating'), 5 if 'letterboxd uri' in row else 10 if _is_ten_scale(row) else 5)
+
+    if watched is None:
+        if 'watched' in row:
+            watched = _truthy(row['watched'])
+        else:
+            # Rated or dated entries in Letterboxd/IMDb exports have been watched
+            watched = bool(rating or row.get('watched date') or row.get('date rated'))
+    # The year tells remakes apart when looking the title up
+    year = str(row.get('year') or '').strip()[:4] or None
+    return {'kind': entry_kind, 'title': title, 'year': year, 'watched': watched, 'rating': rating}
+
+
+def _is_ten_scale(row):
+    try:
+        return float(row.get('rating')) > 5
+    except (TypeError, ValueError):
+        return False
+
+
+def read_rows(path, fmt):
+    """Yield the raw rows of an export file one at a time"""
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            yield from csv.DictReader(file)
+    elif fmt == 'jsonl':
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        # A JSON array has to be parsed whole; use JSON lines for very large lists
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        for row in data if isinstance(data, list) else []:
+            if isinstance(row, dict):
+                yield row
+
+
+class ImportJob:
+    """Progress of one bulk import; saved as a checkpoint after every batch"""
+
+    FIELDS = ('id', 'path', 'format', 'kind', 'watched', 'state', 'total', 'offset', 'added',
+              'duplicates', 'not_found', 'failed', 'errors', 'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, job_id, path, fmt, kind=None, watched=None):
+        self.id = job_id
+        self.path = path
+        self.format = fmt
+        self.kind = kind
+        self.watched = watched
+        self.state = 'queued'
+        self.total = None
+        # Rows committed so far; a resumed import skips this many
+        self.offset = 0
+        self.added = 0
+        self.duplicates = 0
+        self.not_found = 0
+        self.failed = 0
+        self.errors = []
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        # Failed and interrupted jobs can be resumed
+        return self.state == 'finished'
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS if field != 'path'}
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data['id'], data['path'], data['format'])
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(job, field, data[field])
+        return job
+
+
+class BulkImporter:
+    """Imports watchlist exports into the library in batches.
+
+    Rows are read lazily from the uploaded file, normalized with
+    `normalize_title` and checked against a TitleIndex of the library, so
+    duplicates (also within the file) are skipped. Each batch is looked up
+    on TMDB concurrently through `tmdb` (an AsyncTmdbClient, so the shared
+    rate limit applies), then written in one library.batch(). The job is
+    checkpointed to `directory` after every batch; resume() carries on after
+    the last committed row, e.g. after a restart.
+    """
+
+    def __init__(self, library, tmdb, directory, normalize_title=lambda title: title,
+                 batch_size=50, concurrency=8):
+        self.library = library
+        self.tmdb = tmdb
+        self.directory = directory
+        self.normalize_title = normalize_title
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._jobs = {}
+        self._running = set()
+        self._lock = threading.Lock()
+
+    # Jobs
+
+    def _checkpoint_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def _checkpoint(self, job):
+        tmp_path = self._checkpoint_path(job.id) + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(dict(job.to_dict(), path=job.path), file)
+        os.replace(tmp_path, self._checkpoint_path(job.id))
+
+    def create(self, upload, fmt, kind=None, watched=None):
+        """Store an uploaded export (anything with .save(path), e.g. a werkzeug FileStorage)"""
+        os.makedirs(self.directory, exist_ok=True)
+        job_id = uuid.uuid4().hex[:12]
+        path = os.path.join(self.directory, f'{job_id}.{fmt}')
+        upload.save(path)
+        return self.create_from_path(path, fmt, kind=kind, watched=watched, job_id=job_id)
+
+    def create_from_path(self, path, fmt, kind=None, watched=None, job_id=None):
+        os.makedirs(self.directory, exist_ok=True)
+        job = ImportJob(job_id or uuid.uuid4().hex[:12], os.path.abspath(path), fmt, kind, watched)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._checkpoint(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job or not os.path.exists(self._checkpoint_path(job_id)):
+            return job
+        with open(self._checkpoint_path(job_id)) as file:
+            job = ImportJob.from_dict(json.load(file))
+        if job.state == 'running':
+            # The process running it went away
+            job.state = 'interrupted'
+        with self._lock:
+            return self._jobs.setdefault(job.id, job)
+
+    def start(self, job):
+        """Run (or resume) the job on a background thread; False if it's running or finished"""
+        with self._lock:
+            if job.id in self._running or job.done:
+                return False
+            self._running.add(job.id)
+        threading.Thread(target=self._execute, args=(job,), name=f'import-{job.id}', daemon=True).start()
+        return True
+
+    def _execute(self, job):
+        try:
+            self.run(job)
+        finally:
+            with self._lock:
+                self._running.discard(job.id)
+
+    # Pipeline
+
+    def run(self, job, progress=None):
+        """Import (or resume) a job on the calling thread; progress(job) is called after each batch"""
+        job.state = 'running'
+        job.started_at = job.started_at or datetime.now().isoformat(timespec='seconds')
+        started = time.monotonic()
+        try:
+            if job.total is None:
+                job.total = sum(1 for _ in read_rows(job.path, job.format))
+            self._checkpoint(job)
+            indexes = {
+                'movie': TitleIndex(movie['title'] for movie in self.library.list_movies()),
+                'show': TitleIndex(show['title'] for show in self.library.list_shows())
+            }
+            rows = islice(read_rows(job.path, job.format), job.offset, None)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self._import_batch(job, batch, indexes)
+                job.offset += len(batch)
+                self._checkpoint(job)
+                if progress:
+                    progress(job)
+            job.state = 'finished'
+        except Exception as e:
+            logger.error(f"Import {job.id} failed at row {job.offset}: {str(e)}")
+            self._error(job, None, e)
+            job.state = 'failed'
+        finally:
+            job.finished_at = datetime.now().isoformat(timespec='seconds')
+            self._checkpoint(job)
+            logger.info(f"Import {job.id} {job.state}: {job.added} added, {job.duplicates} duplicates, "
+                        f"{job.not_found} not found on TMDB, {job.failed} failed "
+                        f"in {round(time.monotonic() - started, 1)}s")
+
+    def _error(self, job, title, error):
+        if len(job.errors) < MAX_JOB_ERRORS:
+            job.errors.append({'title': title, 'error': str(error)})
+
+    def _import_batch(self, job, rows, indexes):
+        entries = []
+        for row in rows:
+            entry = parse_entry(row, kind=job.kind, watched=job.watched) if isinstance(row, dict) else None
+            if not entry:
+                job.failed += 1
+                self._error(job, None, 'Row without a title')
+                continue
+            entry['title'] = self.normalize_title(entry['title'])
+            index = indexes[entry['kind']]
+            if index.exact(entry['title']):
+                job.duplicates += 1
+                continue
+            # Claim the title now so a repeat later in the file counts as a duplicate
+            index.add(entry['title'])
+            entries.append(entry)
+
+        details = self.tmdb.submit(self._lookup_all(entries)).result()
+
+        with self.library.batch():
+            for entry, (found, error) in zip(entries, details):
+                if error:
+                    # Saved without details; the movie backfill / episode refresh fill them in later
+                    self._error(job, entry['title'], error)
+                elif not found:
+                    job.not_found += 1
+                if entry['kind'] == 'movie':
+                    added = self.library.add_movie(self._movie(entry, found, error))
+                else:
+                    added = self.library.add_show(self._show(entry, found))
+                if added:
+                    job.added += 1
+                else:
+                    job.duplicates += 1
+
+    async def _lookup_all(self, entries):
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def lookup(entry):
+            async with limit:
+                try:
+                    if entry['kind'] == 'movie':
+                        return await self.tmdb.find_movie(entry['title'], entry.get('year')), None
+                    return await self.tmdb.get_tv_show_details(entry['title']), None
+                except Exception as e:
+                    return None, e
+
+        return await asyncio.gather(*map(lookup, entries))
+
+    def _movie(self, entry, details, error=None):
+        movie = {
+            'title': entry['title'],
+            'watched': entry['watched'],
+            'rating': entry['rating'],
+            'poster': None,
+            'overview': None,
+            'release_date': None,
+            'tmdb_rating': None
+        }
+        if details is None and not error:
+            # TMDB has no match; keep the movie backfill from asking again
+            movie['tmdb_checked'] = date.today().isoformat()
+        if details:
+            movie.update({
+                'poster': details.get('poster'),
+                'overview': details.get('overview'),
+                'release_date': details.get('release_date'),
+                'tmdb_rating': details.get('rating')
+            })
+        return movie
+
+    def _show(self, entry, details):
+        details = details or {}
+        seasons = details.get('seasons', [])
+        if entry['watched']:
+            for season in seasons:
+                for episode in season.get('episodes', []):
+                    episode['watched'] = True
+        return {
+            'title': entry['title'],
+            'status': 'watched' if entry['watched'] else 'to_watch',
+            'rating': entry['rating'],
+            'overview': details.get('overview'),
+            'poster': details.get('poster_path'),
+            'year': details.get('first_air_date', '')[:4] if details.get('first_air_date') else None,
+            'tmdb_id': details.get('id'),
+            'tmdb_rating': details.get('rating'),
+            'seasons': seasons
+        }
@@ -0,0 +1,166 @@
+# Compact watch state for the JSON TV library.
+#
+# A stored season keeps its episode numbers and a bitset of watched flags
+# instead of one dict per episode:
+#
+#     {'season_number': 2, 'episode_count': 10, 'watched': '3ff',
+#      'watched_count': 10, 'last_air_date': '2019-05-19'}
+#
+# Bit i of `watched` (a hex string, so it survives json.dump) belongs to the
+# i-th episode in episode-number order. `episode_numbers` is only stored when
+# the season isn't simply 1..episode_count. Names, overviews and air dates
+# live in a separate episode store and are merged back by unpack_season().
+
+from bisect import bisect_left, bisect_right
+
+
+def is_packed(season):
+    return 'episodes' not in season
+
+
+def episode_numbers(season):
+    return season.get('episode_numbers') or range(1, season.get('episode_count', 0) + 1)
+
+
+def _bits(season):
+    return int(season.get('watched') or '0', 16)
+
+
+def _store_bits(season, bits):
+    season['watched'] = format(bits, 'x')
+    season['watched_count'] = bits.bit_count()
+
+
+def _position(season, episode):
+    numbers = episode_numbers(season)
+    i = bisect_left(numbers, episode)
+    return i if i < len(numbers) and numbers[i] == episode else None
+
+
+def pack_season(season):
+    """Split a season with episode dicts into (packed season, episode metadata list)"""
+    episodes = sorted(season.get('episodes', []), key=lambda ep: ep['episode_number'])
+    numbers = [ep['episode_number'] for ep in episodes]
+    bits = 0
+    for i, ep in enumerate(episodes):
+        if ep.get('watched'):
+            bits |= 1 << i
+    packed = {
+        'season_number': season['season_number'],
+        'episode_count': len(episodes),
+        'last_air_date': max((ep['air_date'] for ep in episodes if ep.get('air_date')), default=None)
+    }
+    if numbers != list(range(1, len(numbers) + 1)):
+        packed['episode_numbers'] = numbers
+    _store_bits(packed, bits)
+    metadata = [{key: value for key, value in ep.items() if key != 'watched'} for ep in episodes]
+    return packed, metadata
+
+
+def unpack_season(season, metadata=()):
+    """Rebuild a season with episode dicts from its packed form and its metadata"""
+    by_number = {ep['episode_number']: ep for ep in metadata}
+    bits = _bits(season)
+    episodes = []
+    for i, number in enumerate(episode_numbers(season)):
+        episode = {'name': f'Episode {number}', 'overview': '', 'air_date': None}
+        episode.update(by_number.get(number, {}))
+        episode['episode_number'] = number
+        episode['watched'] = bool(bits >> i & 1)
+        episodes.append(episode)
+    return {
+        'season_number': season['season_number'],
+        'episode_count': len(episodes),
+        'episodes': episodes
+    }
+
+
+def add_episodes(season, episodes):
+    """Merge episodes (dicts with episode_number, air_date and optionally watched) into a packed season.
+
+    Episodes the season already has are skipped, so their watch state is
+    untouched. Returns the episode numbers added.
+    """
+    new = {}
+    for ep in episodes:
+        if _position(season, ep['episode_number']) is None:
+            new[ep['episode_number']] = ep
+    if not new:
+        return []
+    added = sorted(new)
+    numbers = list(episode_numbers(season))
+    bits = _bits(season)
+    if not numbers or added[0] > numbers[-1]:
+        # The usual case, episodes aired after the stored ones: existing bits keep their positions
+        for i, number in enumerate(added, start=len(numbers)):
+            if new[number].get('watched'):
+                bits |= 1 << i
+        numbers += added
+    else:
+        watched = {number for i, number in enumerate(numbers) if bits >> i & 1}
+        watched.update(number for number in added if new[number].get('watched'))
+        numbers = sorted(numbers + added)
+        bits = sum(1 << i for i, number in enumerate(numbers) if number in watched)
+    season['episode_count'] = len(numbers)
+    if numbers != list(range(1, len(numbers) + 1)):
+        season['episode_numbers'] = numbers
+    else:
+        season.pop('episode_numbers', None)
+    _store_bits(season, bits)
+    air_dates = [ep['air_date'] for ep in new.values() if ep.get('air_date')]
+    if season.get('last_air_date'):
+        air_dates.append(season['last_air_date'])
+    season['last_air_date'] = max(air_dates, default=None)
+    return added
+
+
+def is_watched(season, episode):
+    i = _position(season, episode)
+    return i is not None and bool(_bits(season) >> i & 1)
+
+
+def set_watched(season, episode, watched):
+    """Flip one episode; False if the season has no such episode"""
+    i = _position(season, episode)
+    if i is None:
+        return False
+    bits = _bits(season)
+    _store_bits(season, bits | 1 << i if watched else bits & ~(1 << i))
+    return True
+
+
+def set_watched_through(season, episode, watched):
+    """Flip every episode numbered up to `episode` (None: the whole season); returns how many"""
+    count = season.get('episode_count', 0)
+    if episode is not None:
+        count = bisect_right(episode_numbers(season), episode)
+    mask = (1 << count) - 1
+    bits = _bits(season)
+    _store_bits(season, bits | mask if watched else bits & ~mask)
+    return count
+
+
+def all_watched(season):
+    return season.get('watched_count', 0) == season.get('episode_count', 0)
+
+
+def unwatched_count(season):
+    return season.get('episode_count', 0) - season.get('watched_count', 0)
+
+
+def unwatched_episodes(season, after=None):
+    """Episode numbers not yet watched, in order, optionally only those after episode `after`.
+
+    Walks the clear bits directly, so the cost follows the number of
+    unwatched episodes rather than the season length.
+    """
+    numbers = episode_numbers(season)
+    start = bisect_right(numbers, after) if after is not None else 0
+    unwatched = ~_bits(season) & ((1 << len(numbers)) - 1)
+    unwatched = unwatched >> start << start
+    result = []
+    while unwatched:
+        lowest = unwatched & -unwatched
+        result.append(numbers[lowest.bit_length() - 1])
+        unwatched ^= lowest
+    return result
@@ -0,0 +1,315 @@
+from bisect import bisect_left
+from contextlib import contextmanager, ExitStack
+from itertools import islice
+
+import episode_bits
+from library_mutations import set_show_episodes
+from library_store import VersionConflict
+
+
+def _missing_metadata(episodes, unsaved):
+    """The seasons of unsaved ({title: {season number: [...]}}) the episode store has nothing for"""
+    missing = {}
+    for title, seasons in unsaved.items():
+        entry = episodes.get(title)
+        stored = entry['seasons'] if entry else {}
+        seasons = {number: metadata for number, metadata in seasons.items() if number not in stored}
+        if seasons:
+            missing[title] = seasons
+    return missing
+
+
+class JsonLibrary:
+    """Library backend on top of the movies/TV shows JSON files.
+
+    Reads are served from the in-memory LibraryStore data and its title
+    indexes; writes are recorded through the stores' change logs. Returned
+    dicts are shared with the store and must not be modified by callers.
+
+    TV show seasons are stored packed (see episode_bits), with episode names,
+    overviews and air dates in a separate episode store that is only loaded
+    when shows are requested with_episodes=True or for the unwatched list.
+    Without with_episodes, a show's 'seasons' are in the packed form.
+    """
+
+    def __init__(self, movies_store, tv_shows_store, episodes_store):
+        self.movies_store = movies_store
+        self.tv_shows_store = tv_shows_store
+        self.episodes_store = episodes_store
+
+    def version(self):
+        """Changes whenever anything in the library changes (used for ETags and batch())"""
+        return '.'.join(str(store.version())
+                        for store in (self.movies_store, self.tv_shows_store, self.episodes_store))
+
+    @contextmanager
+    def batch(self, expected_version=None):
+        """Apply the writes made inside the block together: one change record per store.
+
+        The stores stay locked for the whole block. With expected_version,
+        raises VersionConflict up front if the library has moved on since.
+        """
+        with ExitStack() as stack:
+            for store in (self.movies_store, self.tv_shows_store, self.episodes_store):
+                stack.enter_context(store.batch())
+            current = self.version()
+            if expected_version is not None and str(expected_version) != current:
+                raise VersionConflict(expected_version, current)
+            yield
+
+    # Movies
+
+    def list_movies(self, watched=None, offset=0, limit=None):
+        movies = self.movies_store.load()
+        if watched is not None:
+            movies = (movie for movie in movies if movie['watched'] == watched)
+        # islice stops filtering as soon as the page is full
+        return list(islice(movies, offset, None if limit is None else offset + limit))
+
+    def count_movies(self, watched=None):
+        movies = self.movies_store.load()
+        if watched is None:
+            return len(movies)
+        unwatched = len(movies.unwatched)
+        return len(movies) - unwatched if watched else unwatched
+
+    def get_movie(self, title):
+        return self.movies_store.load().get(title)
+
+    def find_movie(self, title):
+        return self.movies_store.load().find(title)
+
+    def similar_movies(self, title, limit=5):
+        """[(movie, score)] with titles close to `title`, best first; 1.0 is a normalized duplicate"""
+        return self.movies_store.load().similar(title, limit)
+
+    def search_movies(self, query, limit=10):
+        return self.movies_store.load().search(query, limit)
+
+    def random_unwatched_movie(self, weight=None):
+        """Uniform pick, or weighted by TMDB rating with weight='rating'"""
+        return self.movies_store.load().unwatched.choice(weighted=weight == 'rating')
+
+    def add_movie(self, movie):
+        return self.movies_store.apply('add_movie', movie=movie)
+
+    def set_movie_watched(self, title, watched=True):
+        return self.movies_store.apply('set_movie_watched', title=title, watched=watched)
+
+    def set_movie_rating(self, title, rating):
+        return self.movies_store.apply('set_movie_rating', title=title, rating=rating)
+
+    def set_movie_fields(self, title, fields):
+        return self.movies_store.apply('set_movie_fields', title=title, fields=fields)
+
+    # TV shows
+
+    def _shows(self):
+        shows = self.tv_shows_store.load()
+        unsaved = shows.take_unsaved_metadata()
+        if unsaved:
+            # Left by a reload, e.g. replaying another process's records: that process
+            # stores the metadata itself, so only what the episode store lacks is written
+            self._save_metadata(shows, unsaved, only_missing=True)
+            shows = self.tv_shows_store.load()
+        return shows
+
+    def _save_metadata(self, shows, unsaved, only_missing=False):
+        """Move episode metadata split off by ShowList into the episode store"""
+        # Only the episode store lock is held while checking and writing: batch() takes the
+        # store locks in order (movies, shows, episodes) and this may run inside one
+        with self.episodes_store.batch():
+            # Checked and written under the store lock, so threads and processes don't both write it
+            episodes = self.episodes_store.load()
+            if only_missing:
+                unsaved = _missing_metadata(episodes, unsaved)
+            if not unsaved:
+                return
+            if len(unsaved) == 1:
+                (title, seasons), = unsaved.items()
+                self.episodes_store.apply('set_show_episodes', title=title, seasons=seasons)
+                return
+            # A pre-packing file (or a long replayed log): migrate it in one write
+            for title, seasons in unsaved.items():
+                set_show_episodes(episodes, title, seasons)
+            self.episodes_store.save(episodes)
+        # Rewrite the shows file packed so this only happens once (after releasing
+        # the episode store, for the same lock order)
+        self.tv_shows_store.save(shows)
+
+    def _apply_show(self, op, **args):
+        # Metadata from records replayed first, so what the write leaves behind is its own
+        self._shows()
+        result = self.tv_shows_store.apply(op, **args)
+        # Seasons passed with episode dicts leave metadata behind to store
+        shows = self.tv_shows_store.load()
+        unsaved = shows.take_unsaved_metadata()
+        if unsaved:
+            self._save_metadata(shows, unsaved)
+        return result
+
+    def _with_episodes(self, show):
+        entry = self.episodes_store.load().get(show['title'])
+        metadata = entry['seasons'] if entry else {}
+        seasons = [episode_bits.unpack_season(season, metadata.get(str(season['season_number']), []))
+                   for season in show.get('seasons', [])]
+        return dict(show, seasons=seasons)
+
+    def list_shows(self, status=None, with_episodes=False):
+        shows = self._shows()
+        if status is not None:
+            statuses = (status,) if isinstance(status, str) else status
+            shows = [show for show in shows if show['status'] in statuses]
+        if with_episodes:
+            return [self._with_episodes(show) for show in shows]
+        return list(shows)
+
+    def get_show(self, title, with_episodes=False):
+        show = self._shows().get(title)
+        if show and with_episodes:
+            return self._with_episodes(show)
+        return show
+
+    def find_show(self, title):
+        return self._shows().find(title)
+
+    def similar_shows(self, title, limit=5):
+        return self._shows().similar(title, limit)
+
+    def search_shows(self, query, limit=10):
+        """Shows matching a search box query, answered from the in-memory title index"""
+        return self._shows().search(query, limit)
+
+    def find_show_by_tmdb_id(self, tmdb_id):
+        return self._shows().find_by_tmdb_id(tmdb_id)
+
+    def has_episodes(self, title):
+        show = self.get_show(title)
+        return bool(show) and any(s.get('episode_count') for s in show.get('seasons', []))
+
+    def all_episodes_watched(self, title):
+        show = self.get_show(title)
+        return bool(show) and all(episode_bits.all_watched(s) for s in show.get('seasons', []))
+
+    def latest_season(self, title):
+        """Highest stored season number, or None"""
+        show = self.get_show(title)
+        return max((s['season_number'] for s in show.get('seasons', [])), default=None) if show else None
+
+    def episode_states(self, title, from_season=None):
+        """{(season_number, episode_number): watched} for every stored episode (from from_season on)"""
+        show = self.get_show(title)
+        if not show:
+            return {}
+        return {
+            (season['season_number'], number): episode_bits.is_watched(season, number)
+            for season in show.get('seasons', [])
+            if from_season is None or season['season_number'] >= from_season
+            for number in episode_bits.episode_numbers(season)
+        }
+
+    def unwatched_episodes(self, status='ongoing', after=None, limit=None, since=None):
+        """Unwatched episodes ordered by show title, season and episode.
+
+        `after` is the (show title, season, episode) key of the last episode
+        already seen; only episodes past it are returned, at most `limit` of
+        them. `since` keeps episodes that aired on or after that ISO date.
+        Shows are skipped by binary search and each season walks only its
+        unwatched bits, so a page costs about as much as its size.
+        """
+        shows = sorted(self.list_shows(status=status), key=lambda show: show['title'])
+        start = bisect_left([show['title'] for show in shows], after[0]) if after else 0
+        episodes = None
+        unwatched_episodes = []
+        for show in shows[start:]:
+            for season in sorted(show.get('seasons', []), key=lambda s: s['season_number']):
+                after_episode = None
+                if after and show['title'] == after[0]:
+                    if season['season_number'] < after[1]:
+                        continue
+                    if season['season_number'] == after[1]:
+                        after_episode = after[2]
+                if not episode_bits.unwatched_count(season):
+                    continue
+                if since and (season.get('last_air_date') or '') < since:
+                    continue
+                # Metadata is only loaded once something is actually unwatched
+                if episodes is None:
+                    episodes = self.episodes_store.load()
+                entry = episodes.get(show['title'])
+                metadata = (entry['seasons'] if entry else {}).get(str(season['season_number']), [])
+                by_number = {ep['episode_number']: ep for ep in metadata}
+                for number in episode_bits.unwatched_episodes(season, after=after_episode):
+                    meta = by_number.get(number, {})
+                    if since and (meta.get('air_date') or '') < since:
+                        continue
+                    unwatched_episodes.append({
+                        'show_title': show['title'],
+                        'season': season['season_number'],
+                        'episode': number,
+                        'title': meta.get('name', f'Episode {number}'),
+                        'air_date': meta.get('air_date'),
+                        'poster': show.get('poster')
+                    })
+                    if limit is not None and len(unwatched_episodes) >= limit:
+                        return unwatched_episodes
+        return unwatched_episodes
+
+    def count_unwatched_episodes(self, status='ongoing', since=None):
+        if since:
+            return len(self.unwatched_episodes(status=status, since=since))
+        return sum(episode_bits.unwatched_count(season)
+                   for show in self.list_shows(status=status)
+                   for season in show.get('seasons', []))
+
+    def add_show(self, show):
+        return self._apply_show('add_show', show=show)
+
+    def delete_show(self, title):
+        self.episodes_store.apply('delete_show_episodes', title=title)
+        return self._apply_show('delete_show', title=title)
+
+    def set_show_rating(self, title, rating):
+        return self._apply_show('set_show_rating', title=title, rating=rating)
+
+    def set_show_status(self, title, status):
+        return self._apply_show('set_show_status', title=title, status=status)
+
+    def set_show_fields(self, title, fields):
+        return self._apply_show('set_show_fields', title=title, fields=fields)
+
+    def replace_seasons(self, title, seasons):
+        return self._apply_show('replace_seasons', title=title, seasons=seasons)
+
+    def add_episodes(self, title, seasons):
+        """Store episodes the show doesn't have yet; stored episodes are left as they are.
+
+        The change records only carry the given episodes, so the cost follows
+        the number of new episodes rather than the size of the show.
+        """
+        if not self.get_show(title):
+            return False
+        metadata = {
+            str(season['season_number']): [{key: value for key, value in ep.items() if key != 'watched'}
+                                            for ep in season['episodes']]
+            for season in seasons
+        }
+        self.episodes_store.apply('add_show_episodes', title=title, seasons=metadata)
+        states = [
+            {'season_number': season['season_number'],
+             'episodes': [{'episode_number': ep['episode_number'], 'air_date': ep.get('air_date'),
+                           'watched': bool(ep.get('watched'))} for ep in season['episodes']]}
+            for season in seasons
+        ]
+        return self._apply_show('add_episodes', title=title, seasons=states)
+
+    def set_episode_watched(self, title, season, episode, watched):
+        return self._apply_show('set_episode_watched', title=title, season=season,
+                                episode=episode, watched=watched)
+
+    def set_episodes_watched_through(self, title, season, episode, watched):
+        return self._apply_show('set_episodes_watched_through', title=title,
+                                season=season, episode=episode, watched=watched)
+
+    def set_all_episodes_watched(self, title, watched):
+        return self._apply_show('set_all_episodes_watched', title=title, watched=watched)
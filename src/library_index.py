@@ -0,0 +1,266 @@
+import random
+import threading
+
+from episode_bits import is_packed, pack_season
+from title_index import TitleIndex
+
+
+def title_key(title):
+    """Key used for case-insensitive title lookups (duplicate checks, status updates)"""
+    return title.lower()
+
+
+class TitleIndexedList(list):
+    """A library list (movies or TV shows) with O(1) lookups by title and tmdb_id,
+    plus a TitleIndex for normalized/fuzzy title matches.
+
+    It is still a plain list as far as json.dump is concerned. Entries must be
+    added and removed through append()/remove_title() so the indexes stay in
+    sync; fields other than the title can be changed in place.
+    """
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self._reindex()
+
+    def _reindex(self):
+        self.by_title = {}
+        self.by_key = {}
+        self.by_tmdb_id = {}
+        self.titles = TitleIndex()
+        for item in self:
+            self._index(item)
+
+    def _index(self, item):
+        # setdefault keeps the first entry when legacy data holds duplicates,
+        # matching what the old linear scans returned
+        self.by_title.setdefault(item['title'], item)
+        self.by_key.setdefault(title_key(item['title']), item)
+        self.titles.add(item['title'])
+        if item.get('tmdb_id') is not None:
+            self.by_tmdb_id.setdefault(str(item['tmdb_id']), item)
+
+    def get(self, title):
+        """Exact title lookup"""
+        return self.by_title.get(title)
+
+    def find(self, title):
+        """Case-insensitive title lookup"""
+        return self.by_key.get(title_key(title))
+
+    def find_by_tmdb_id(self, tmdb_id):
+        return self.by_tmdb_id.get(str(tmdb_id))
+
+    def similar(self, title, limit=5):
+        """[(entry, score)] with a title close to `title`; 1.0 is the same normalized title"""
+        return [(self.by_title[match], score) for match, score in self.titles.similar(title, limit)]
+
+    def search(self, query, limit=10):
+        """Entries matching a search box query, best first"""
+        return [self.by_title[match] for match in self.titles.search(query, limit)]
+
+    def append(self, item):
+        super().append(item)
+        self._index(item)
+
+    def update_item(self, item, fields):
+        item.update(fields)
+        if 'tmdb_id' in fields:
+            self._index(item)
+
+    def remove_title(self, title):
+        if title not in self.by_title:
+            return False
+        self[:] = [item for item in self if item['title'] != title]
+        # Deletes are rare, so simply rebuild the indexes
+        self._reindex()
+        return True
+
+
+def rating_weight(movie):
+    """Pick weight for rating-weighted picks: the TMDB rating, 5 when unknown"""
+    rating = movie.get('tmdb_rating')
+    return max(float(rating), 0.5) if rating else 5.0
+
+
+class FenwickTree:
+    """Prefix sums over a growable array of weights, O(log n) per operation"""
+
+    def __init__(self, weights=()):
+        self.tree = [0.0] + [float(w) for w in weights]
+        # Linear-time build: push each node's sum up to its parent
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def prefix_sum(self, n):
+        """Sum of the first n weights"""
+        total = 0.0
+        while n > 0:
+            total += self.tree[n]
+            n -= n & -n
+        return total
+
+    def total(self):
+        return self.prefix_sum(len(self))
+
+    def add(self, index, delta):
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def append(self, weight):
+        i = len(self.tree)
+        # Node i covers (i - lowbit(i), i]; everything before i is already in place
+        self.tree.append(weight + self.prefix_sum(i - 1) - self.prefix_sum(i - (i & -i)))
+
+    def pop(self):
+        # No remaining node covers the last position, so dropping it is enough
+        self.tree.pop()
+
+    def find(self, target):
+        """Index of the weight the running total crosses `target` in"""
+        pos = 0
+        step = 1 << (len(self).bit_length())
+        while step:
+            nxt = pos + step
+            if nxt < len(self.tree) and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return min(pos, len(self) - 1)
+
+
+class RandomPicker:
+    """A set of items supporting O(1) add/remove and uniform picks, plus
+    O(log n) weighted picks.
+
+    Items live in an array with an item -> slot map; removal swaps the last
+    item into the freed slot. A Fenwick tree over the same slots holds the
+    weights. Items are tracked by identity, so legacy duplicates count twice.
+    """
+
+    def __init__(self, weight=None):
+        self.weight = weight or (lambda item: 1.0)
+        self.items = []
+        self.item_weights = []
+        self.slots = {}
+        self.weights = FenwickTree()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return id(item) in self.slots
+
+    def add(self, item):
+        if id(item) in self.slots:
+            return
+        self.slots[id(item)] = len(self.items)
+        weight = self.weight(item)
+        self.items.append(item)
+        self.item_weights.append(weight)
+        self.weights.append(weight)
+
+    def discard(self, item):
+        slot = self.slots.pop(id(item), None)
+        if slot is None:
+            return
+        last = self.items[-1]
+        if last is not item:
+            # Move the last item into the freed slot, weight included
+            self.weights.add(slot, self.item_weights[-1] - self.item_weights[slot])
+            self.items[slot] = last
+            self.item_weights[slot] = self.item_weights[-1]
+            self.slots[id(last)] = slot
+        self.items.pop()
+        self.item_weights.pop()
+        self.weights.pop()
+
+    def reweigh(self, item):
+        slot = self.slots.get(id(item))
+        if slot is not None:
+            weight = self.weight(item)
+            self.weights.add(slot, weight - self.item_weights[slot])
+            self.item_weights[slot] = weight
+
+    def choice(self, weighted=False):
+        if not self.items:
+            return None
+        if weighted:
+            total = self.weights.total()
+            if total > 0:
+                return self.items[self.weights.find(random.random() * total)]
+        return self.items[random.randrange(len(self.items))]
+
+
+class MovieList(TitleIndexedList):
+    """TitleIndexedList for movies that also keeps the unwatched ones in a RandomPicker,
+    so counts and random picks don't scan the library. Watched flags must be
+    changed through update_item().
+    """
+
+    def _reindex(self):
+        super()._reindex()
+        self.unwatched = RandomPicker(weight=rating_weight)
+        for item in self:
+            self._track(item)
+
+    def _track(self, item):
+        if item.get('watched'):
+            self.unwatched.discard(item)
+        else:
+            self.unwatched.add(item)
+
+    def append(self, item):
+        super().append(item)
+        self._track(item)
+
+    def update_item(self, item, fields):
+        super().update_item(item, fields)
+        if 'watched' in fields:
+            self._track(item)
+        elif 'tmdb_rating' in fields:
+            self.unwatched.reweigh(item)
+
+
+class ShowList(TitleIndexedList):
+    """TitleIndexedList for TV shows whose seasons are kept packed (see episode_bits).
+
+    Seasons handed over with episode dicts, through set_seasons() or in a file
+    written before packing existed, are packed on the way in. Their episode
+    metadata is held until take_unsaved_metadata() hands it to the episode store.
+    """
+
+    def __init__(self, items=()):
+        self._metadata_lock = threading.Lock()
+        self._unsaved_metadata = {}
+        super().__init__(items)
+        for show in self:
+            if not all(is_packed(season) for season in show.get('seasons', [])):
+                self.set_seasons(show, show['seasons'])
+
+    def set_seasons(self, show, seasons):
+        packed = []
+        metadata = {}
+        for season in seasons:
+            if is_packed(season):
+                packed.append(season)
+            else:
+                season, metadata[str(season['season_number'])] = pack_season(season)
+                packed.append(season)
+        show['seasons'] = packed
+        if metadata:
+            with self._metadata_lock:
+                self._unsaved_metadata.setdefault(show['title'], {}).update(metadata)
+
+    def take_unsaved_metadata(self):
+        """Return and forget the episode metadata packed since the last call, by title"""
+        with self._metadata_lock:
+            unsaved, self._unsaved_metadata = self._unsaved_metadata, {}
+        return unsaved
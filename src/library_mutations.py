@@ -0,0 +1,184 @@
+# Mutation handlers replayed by LibraryStore from its change log.
+#
+# Every handler takes the in-memory library (a TitleIndexedList, or a ShowList
+# for TV shows, whose seasons are packed watched bitsets) plus the
+# record's arguments and must be idempotent: after a crash during compaction
+# the same record can be replayed on top of a snapshot that already contains it.
+
+import episode_bits
+
+
+# Movie mutations
+
+def add_movie(movies, movie):
+    if movies.find(movie['title']):
+        return False
+    movies.append(movie)
+    return True
+
+def set_movie_watched(movies, title, watched=True):
+    movie = movies.get(title)
+    if not movie:
+        return False
+    # Through update_item so MovieList keeps its unwatched index in sync
+    movies.update_item(movie, {'watched': watched})
+    return True
+
+def set_movie_rating(movies, title, rating):
+    movie = movies.get(title)
+    if not movie:
+        return False
+    movie['rating'] = rating
+    return True
+
+def set_movie_fields(movies, title, fields):
+    movie = movies.get(title)
+    if not movie:
+        return False
+    movies.update_item(movie, fields)
+    return True
+
+
+# TV show mutations
+
+def add_show(shows, show):
+    if shows.get(show['title']):
+        return False
+    shows.append(show)
+    shows.set_seasons(show, show.get('seasons', []))
+    return True
+
+def delete_show(shows, title):
+    return shows.remove_title(title)
+
+def set_show_rating(shows, title, rating):
+    show = shows.get(title)
+    if not show:
+        return False
+    show['rating'] = rating
+    return True
+
+def set_show_status(shows, title, status):
+    show = shows.get(title)
+    if not show:
+        return False
+    show['status'] = status
+    return True
+
+def set_show_fields(shows, title, fields):
+    show = shows.get(title)
+    if not show:
+        return False
+    shows.update_item(show, fields)
+    return True
+
+def replace_seasons(shows, title, seasons):
+    show = shows.get(title)
+    if not show:
+        return False
+    shows.set_seasons(show, seasons)
+    return True
+
+def add_episodes(shows, title, seasons):
+    """Merge new episodes into a show, leaving the stored ones (and their watch state) alone"""
+    show = shows.get(title)
+    if not show:
+        return False
+    stored = show.setdefault('seasons', [])
+    for season in seasons:
+        target = _find_season(show, season['season_number'])
+        if target:
+            episode_bits.add_episodes(target, season['episodes'])
+        else:
+            stored.append(episode_bits.pack_season(season)[0])
+            stored.sort(key=lambda s: s['season_number'])
+    return True
+
+def _find_season(show, season_number):
+    for season in show.get('seasons', []):
+        if season['season_number'] == season_number:
+            return season
+    return None
+
+def set_episode_watched(shows, title, season, episode, watched):
+    show = shows.get(title)
+    if not show:
+        return False
+    target = _find_season(show, season)
+    return bool(target) and episode_bits.set_watched(target, episode, watched)
+
+def set_episodes_watched_through(shows, title, season, episode, watched):
+    """Mark every episode up to and including S{season}E{episode}"""
+    show = shows.get(title)
+    if not show:
+        return False
+    updated = False
+    for s in show.get('seasons', []):
+        # Earlier seasons are marked whole, the target season up to the target episode
+        if s['season_number'] < season:
+            updated = episode_bits.set_watched_through(s, None, watched) > 0 or updated
+        elif s['season_number'] == season:
+            updated = episode_bits.set_watched_through(s, episode, watched) > 0 or updated
+    return updated
+
+def set_all_episodes_watched(shows, title, watched):
+    show = shows.get(title)
+    if not show:
+        return False
+    for s in show.get('seasons', []):
+        episode_bits.set_watched_through(s, None, watched)
+    return True
+
+
+# Episode metadata mutations (names, overviews and air dates, keyed by show title)
+
+def set_show_episodes(entries, title, seasons):
+    """Store episode metadata lists for the given seasons ({"<season number>": [...]})"""
+    entry = entries.get(title)
+    if not entry:
+        entry = {'title': title, 'seasons': {}}
+        entries.append(entry)
+    entry['seasons'].update(seasons)
+    return True
+
+def add_show_episodes(entries, title, seasons):
+    """Append episode metadata to the given seasons, skipping episodes already stored"""
+    entry = entries.get(title)
+    if not entry:
+        entry = {'title': title, 'seasons': {}}
+        entries.append(entry)
+    for number, episodes in seasons.items():
+        stored = entry['seasons'].setdefault(number, [])
+        known = {ep['episode_number'] for ep in stored}
+        stored.extend(ep for ep in episodes if ep['episode_number'] not in known)
+    return True
+
+def delete_show_episodes(entries, title):
+    return entries.remove_title(title)
+
+
+MOVIE_MUTATIONS = {
+    'add_movie': add_movie,
+    'set_movie_watched': set_movie_watched,
+    'set_movie_rating': set_movie_rating,
+    'set_movie_fields': set_movie_fields,
+}
+
+TV_SHOW_MUTATIONS = {
+    'add_show': add_show,
+    'delete_show': delete_show,
+    'set_show_rating': set_show_rating,
+    'set_show_status': set_show_status,
+    'set_show_fields': set_show_fields,
+    'replace_seasons': replace_seasons,
+    'add_episodes': add_episodes,
+    'set_episode_watched': set_episode_watched,
+    'set_episodes_watched_through': set_episodes_watched_through,
+    'set_all_episodes_watched': set_all_episodes_watched,
+}
+
+EPISODE_MUTATIONS = {
+    'set_show_episodes': set_show_episodes,
+    'add_show_episodes': add_show_episodes,
+    'delete_show_episodes': delete_show_episodes,
+}
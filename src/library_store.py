@@ -0,0 +1,430 @@
+import json
+import os
+import time
+import uuid
+import threading
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): locking is per process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class VersionConflict(Exception):
+    """The library changed since the version the caller expected."""
+
+    def __init__(self, expected, current):
+        super().__init__(f"Library is at version {current}, expected {expected}")
+        self.expected = expected
+        self.current = current
+
+
+class LibraryStore:
+    """Process-level cache for a JSON library file (movies or TV shows).
+
+    The file is parsed once and served from memory. It is only parsed again
+    when its mtime or size changes on disk, e.g. when another process or a
+    manual edit touched it.
+
+    Changes are written as small JSON-lines records to an append-only change
+    log next to the file (``<file>.log``) and replayed on load, so the cost of
+    a write is proportional to the change rather than to the library. Once
+    enough records pile up, a background thread compacts the log into a new
+    snapshot that atomically replaces the JSON file.
+
+    Several processes (e.g. gunicorn workers) can share the files: writes
+    hold an exclusive flock on ``<file>.lock`` and catch up with the other
+    processes' records before appending, so every process applies the same
+    records in the same order. Each appended record bumps a version counter;
+    compaction carries it over to the new log in a header record. The header
+    also gives the log a generation id, so a cached copy is never mistaken
+    for a current one when a rotated file happens to have the same inode,
+    mtime and size as before.
+
+    Loads, bytes read and written and snapshot writes are recorded in
+    `metrics` (a metrics.Registry) when given.
+    """
+
+    def __init__(self, path, name='library', mutations=None, compact_every=500, factory=list,
+                 metrics=None):
+        self.path = path
+        self.name = name
+        self.metrics = metrics
+        # Container the parsed list is wrapped in, e.g. TitleIndexedList
+        self.factory = factory
+        self.mutations = mutations or {}
+        self.compact_every = compact_every
+        self.log_path = path + '.log'
+        # Log rotated out by a compaction that is still writing its snapshot
+        self.compacting_path = path + '.log.compacting'
+        self.lock_path = path + '.lock'
+        self._data = None
+        self._signature = None
+        self._log_offset = 0
+        self._pending = 0
+        self._version = 0
+        # Generation id from the current log's header, None for logs without one
+        self._generation = None
+        self._compactor = None
+        # Records held back by an open batch(), or None outside one
+        self._batch = None
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_pid = None
+        self._lock_depth = 0
+
+    def _flock(self, operation):
+        if self._lock_pid != os.getpid():
+            # A forked worker must not share its parent's open file description
+            self._lock_file = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_file, operation)
+
+    @contextmanager
+    def _locked(self, shared=False):
+        """Hold the store lock and the lock file, so other processes wait too.
+
+        Exclusive for anything that writes, shared while re-reading the files.
+        Nested calls reuse the outer hold, so writers must take it exclusive
+        from the start.
+        """
+        with self._lock:
+            if not self._lock_depth and fcntl:
+                self._flock(fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth and fcntl:
+                    self._flock(fcntl.LOCK_UN)
+
+    def _record_io(self, read=0, written=0):
+        if not self.metrics:
+            return
+        if read:
+            self.metrics.counter('library_read_bytes_total', 'Bytes of library files read',
+                                 ('store',)).inc(read, store=self.name)
+        if written:
+            self.metrics.counter('library_written_bytes_total', 'Bytes written to library files',
+                                 ('store',)).inc(written, store=self.name)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _file_signature(self):
+        return (self._stat(self.path), self._stat(self.log_path))
+
+    def _log_generation(self):
+        """Generation id in the header the change log starts with, or None"""
+        try:
+            with open(self.log_path, 'rb') as file:
+                line = file.readline()
+        except FileNotFoundError:
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return record.get('generation') if record.get('op') == 'version' else None
+
+    def _unchanged(self):
+        # stat alone can't tell a rotated log from the old one if the inode was reused
+        # within one mtime tick, so the generation in its header is checked too
+        return self._file_signature() == self._signature and self._log_generation() == self._generation
+
+    def load(self):
+        """Return the cached library, reloading it only if the files changed.
+
+        The returned list is shared and must be treated as read-only; changes
+        go through apply() so they reach the change log.
+        """
+        with self._lock:
+            if self._stat(self.path) is None:
+                with self._locked():
+                    # If the file doesn't exist (and no other process beat us to it),
+                    # create it with an empty list
+                    if self._stat(self.path) is None:
+                        self.save([])
+                        return self._data
+
+            if self._data is not None and self._unchanged():
+                return self._data
+
+            # Shared lock: no other process is appending or swapping in a snapshot meanwhile
+            with self._locked(shared=True):
+                snapshot_sig, log_sig = self._file_signature()
+                try:
+                    if self._can_replay_tail(snapshot_sig, log_sig):
+                        # Only the log grew (another process appended): replay the tail
+                        self._replay(self.log_path, self._data, start=self._log_offset)
+                    else:
+                        started = time.perf_counter()
+                        with open(self.path, 'r') as file:
+                            data = self.factory(json.load(file))
+                            self._record_io(read=file.tell())
+                        self._pending = 0
+                        self._version = 0
+                        self._replay(self.compacting_path, data)
+                        self._log_offset = 0
+                        self._generation = None
+                        self._replay(self.log_path, data)
+                        self._data = data
+                        if self.metrics:
+                            self.metrics.histogram('library_load_seconds', 'Full reloads of a library file',
+                                                   ('store',)).observe(time.perf_counter() - started,
+                                                                       store=self.name)
+                        logger.debug("Loaded %s from disk (%d entries)", self.name, len(self._data))
+                    self._signature = self._file_signature()
+                except Exception as e:
+                    logger.error(f"Error loading {self.name}: {str(e)}")
+                    # Keep serving the last good copy if we have one, an empty library otherwise
+                    if self._data is None:
+                        return self.factory([])
+
+            if self._pending >= self.compact_every:
+                self._schedule_compaction()
+            return self._data
+
+    def _can_replay_tail(self, snapshot_sig, log_sig):
+        # Same snapshot and the same log file, which only grew since we last read it
+        if self._data is None or self._signature is None or log_sig is None:
+            return False
+        if snapshot_sig != self._signature[0] or os.path.exists(self.compacting_path):
+            return False
+        if self._log_generation() != self._generation:
+            return False
+        previous_log = self._signature[1]
+        if previous_log is not None and previous_log[0] != log_sig[0]:
+            return False
+        return log_sig[2] >= self._log_offset
+
+    def _replay(self, path, data, start=0):
+        """Apply the records of a change log file to data, starting at byte offset start."""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as file:
+            file.seek(start)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    # Torn write from a crash mid-append; everything before it is intact
+                    logger.warning(f"Ignoring incomplete record at the end of {path}")
+                    break
+                record = json.loads(line)
+                if record['op'] == 'version':
+                    # Header written by compaction: the version the snapshot is at
+                    self._version = record['version']
+                    if path == self.log_path:
+                        self._generation = record.get('generation')
+                else:
+                    self._apply_record(data, record)
+                    self._pending += 1
+                    self._version += 1
+                if path == self.log_path:
+                    self._log_offset = file.tell()
+            self._record_io(read=file.tell() - start)
+
+    def _apply_record(self, data, record):
+        args = dict(record)
+        op = args.pop('op')
+        if op == 'batch':
+            return [self._apply_record(data, inner) for inner in args['records']]
+        return self.mutations[op](data, **args)
+
+    def _append(self, record, count=True):
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        with open(self.log_path, 'ab') as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        self._log_offset += len(line)
+        self._record_io(written=len(line))
+        if count:
+            self._pending += 1
+            self._version += 1
+        self._signature = self._file_signature()
+        if self._pending >= self.compact_every:
+            self._schedule_compaction()
+
+    def _start_log(self):
+        """Begin a new change log with a header: the version the snapshot is at and a new generation id"""
+        self._generation = uuid.uuid4().hex
+        self._append({'op': 'version', 'version': self._version, 'generation': self._generation}, count=False)
+
+    def apply(self, op, **args):
+        """Record a mutation in the change log, then apply it in memory.
+
+        Returns whatever the mutation handler returns (usually whether the
+        target was found).
+        """
+        if op not in self.mutations:
+            raise ValueError(f"Unknown {self.name} mutation: {op}")
+        with self._locked():
+            # Catch up with other processes first, so the record lands after theirs
+            data = self.load()
+            record = {'op': op, **args}
+            if self._batch is not None:
+                self._batch.append(record)
+            else:
+                self._append(record)
+            return self._apply_record(data, record)
+
+    @contextmanager
+    def batch(self):
+        """Group the apply() calls made inside the block into one change record.
+
+        Mutations still take effect in memory straight away, so reads inside
+        the block see them, but the log only gets a single record (one write,
+        one fsync) when the block exits. A torn append loses the whole record,
+        so a batch is all-or-nothing on disk. If the block raises, nothing is
+        logged and the cached copy is dropped so the next load() rebuilds it
+        from the files. Other threads and processes wait for the batch to finish.
+        """
+        with self._locked():
+            # Catch up with other processes before anything in the block reads
+            self.load()
+            if self._batch is not None:
+                # Nested: the outer batch writes everything
+                yield
+                return
+            self._batch = []
+            try:
+                yield
+            except BaseException:
+                records, self._batch = self._batch, None
+                if records:
+                    self.invalidate()
+                raise
+            records, self._batch = self._batch, None
+            if len(records) == 1:
+                self._append(records[0])
+            elif records:
+                self._append({'op': 'batch', 'records': records})
+
+    def _write_tmp(self, text):
+        # Snapshots are written to a temp file and renamed over the original,
+        # so a crash mid-write can never leave a truncated library behind
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+            self._record_io(written=file.tell())
+        if self.metrics:
+            self.metrics.counter('library_snapshots_total', 'Full library file writes (save or compaction)',
+                                 ('store',)).inc(store=self.name)
+        return tmp_path
+
+    def save(self, data):
+        """Replace the whole library with data and start a fresh change log."""
+        with self._locked():
+            try:
+                os.replace(self._write_tmp(json.dumps(data, indent=4)), self.path)
+                for path in (self.log_path, self.compacting_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._data = self.factory(data)
+                self._log_offset = 0
+                self._pending = 0
+                if self._batch is not None:
+                    # The snapshot already holds the batch's changes
+                    self._batch = []
+                self._version += 1
+                self._start_log()
+            except Exception as e:
+                logger.error(f"Error saving {self.name}: {str(e)}")
+
+    def _schedule_compaction(self):
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name=f"compact-{self.name}", daemon=True)
+        self._compactor.start()
+
+    @contextmanager
+    def _compaction_lock(self):
+        """Yield whether this process may compact; only one process compacts a file at a time"""
+        if fcntl is None:
+            yield True
+            return
+        fd = os.open(self.path + '.compact.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def compact(self):
+        """Fold the change log into a new snapshot of the library file."""
+        try:
+            with self._compaction_lock() as allowed:
+                if not allowed:
+                    return
+                with self._locked():
+                    self.load()
+                    if self._data is None or not self._pending:
+                        return
+                    text = json.dumps(self._data, indent=4)
+                    # Rotate the log: records appended from now on go to a fresh log
+                    if os.path.exists(self.log_path):
+                        if os.path.exists(self.compacting_path):
+                            # Left over from an interrupted compaction; keep its records
+                            with open(self.log_path, 'rb') as src, open(self.compacting_path, 'ab') as dst:
+                                dst.write(src.read())
+                            os.remove(self.log_path)
+                        else:
+                            os.replace(self.log_path, self.compacting_path)
+                    compacted = self._pending
+                    self._log_offset = 0
+                    self._pending = 0
+                    self._start_log()
+                    snapshot_sig = self._stat(self.path)
+
+                # Writing the snapshot is the slow part; it runs without blocking writers
+                tmp_path = self._write_tmp(text)
+
+                with self._locked():
+                    if self._stat(self.path) != snapshot_sig:
+                        # save() replaced the library meanwhile; our snapshot is stale
+                        os.remove(tmp_path)
+                        return
+                    os.replace(tmp_path, self.path)
+                    if os.path.exists(self.compacting_path):
+                        os.remove(self.compacting_path)
+                    if self._data is not None:
+                        # Other processes may have appended to the new log meanwhile; the
+                        # signature below vouches for them, so they must be applied first
+                        self._replay(self.log_path, self._data, start=self._log_offset)
+                        self._signature = self._file_signature()
+            logger.info(f"Compacted {compacted} {self.name} change records into {self.path}")
+        except Exception as e:
+            logger.error(f"Error compacting {self.name}: {str(e)}")
+
+    def version(self):
+        """Number of changes made to the library, as recorded in its files.
+
+        Only ever grows (compaction carries it over), and every process
+        serving the same files agrees on it.
+        """
+        with self._lock:
+            self.load()
+            return self._version
+
+    def invalidate(self):
+        """Drop the cached copy so the next load() re-reads the files."""
+        with self._lock:
+            self._data = None
+            self._signature = None
@@ -1,21 +1,56 @@
-from flask import Flask, jsonify, request, render_template
-import json
-import random
+from flask import Flask, jsonify, request, render_template, g, redirect, send_file, abort
+import click
 import os
-import requests
+import json
+import base64
+import hashlib
+import mimetypes
+import asyncio
+import time
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+from concurrent.futures import as_completed
+from library_store import LibraryStore, VersionConflict
+from library_mutations import MOVIE_MUTATIONS, TV_SHOW_MUTATIONS, EPISODE_MUTATIONS
+from library_index import TitleIndexedList, MovieList, ShowList
+from json_library import JsonLibrary
+from sqlite_library import SqliteLibrary, import_json_library
+from rate_limiter import TokenBucket
+from refresh_scheduler import RefreshScheduler
+from tmdb_cache import TmdbCache
+from tmdb_client import TmdbClient, TMDB_IMAGE_URL
+from tmdb_index import TmdbIndex, KINDS as TMDB_INDEX_KINDS
+from poster_cache import PosterCache, POSTER_SIZES, proxy_url
+from tv_search import TvSearch
+from async_tmdb_client import AsyncTmdbClient
+from movie_backfill import MovieBackfill
+from metrics import Registry
+from bulk_import import BulkImporter, FORMATS as IMPORT_FORMATS
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# Root log level (DEBUG, INFO, WARNING, ...)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Per-module overrides, e.g. "tmdb_client=DEBUG,library_store=WARNING"
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+
+def configure_logging(level, overrides):
+    logging.basicConfig(level=getattr(logging, level, logging.INFO),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    for item in filter(None, (part.strip() for part in overrides.split(','))):
+        name, _, module_level = item.partition('=')
+        logging.getLogger(name.strip()).setLevel(module_level.strip().upper() or 'INFO')
 
-logging.basicConfig(level=logging.DEBUG)
+configure_logging(LOG_LEVEL, LOG_LEVELS)
 logger = logging.getLogger(__name__)
 
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 if not TMDB_API_KEY:
     logger.error("TMDB_API_KEY is not set. Please check your .env file.")
 else:
-    logger.debug(f"TMDB_API_KEY loaded successfully: {TMDB_API_KEY}")
+    # Never log the key itself
+    logger.info("TMDB_API_KEY loaded")
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'default_secret_key')
@@ -26,13 +61,128 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Update file paths to use environment variables
 MOVIES_FILE = os.getenv('MOVIES_FILE', os.path.join(BASE_DIR, 'data', 'movies.json'))
 TV_SHOWS_FILE = os.getenv('TV_SHOWS_FILE', os.path.join(BASE_DIR, 'data', 'tv_shows.json'))
+# Episode names/overviews/air dates; tv_shows.json only keeps packed watch state
+TV_EPISODES_FILE = os.getenv('TV_EPISODES_FILE', os.path.join(os.path.dirname(TV_SHOWS_FILE), 'tv_episodes.json'))
+# Number of change log records after which the log is compacted into a new snapshot
+CHANGELOG_COMPACT_EVERY = int(os.getenv('CHANGELOG_COMPACT_EVERY', 500))
+# Storage backend: 'json' (the files above) or 'sqlite'
+LIBRARY_BACKEND = os.getenv('LIBRARY_BACKEND', 'json')
+LIBRARY_DB_FILE = os.getenv('LIBRARY_DB_FILE', os.path.join(BASE_DIR, 'data', 'library.db'))
 
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
-TMDB_SEARCH_URL = "https://api.themoviedb.org/3/search/movie"
-TMDB_MOVIE_URL = "https://api.themoviedb.org/3/movie"
 
-# Add new TMDB TV endpoint
-TMDB_TV_SEARCH_URL = "https://api.themoviedb.org/3/search/tv"
+# TMDB accepts at most 20 sub-requests in one append_to_response
+TMDB_APPEND_LIMIT = 20
+# Upper bound on concurrent TMDB requests made for a single show
+TMDB_MAX_WORKERS = int(os.getenv('TMDB_MAX_WORKERS', 4))
+# Ceiling on TMDB requests per second across all threads (TMDB allows roughly 50/s)
+TMDB_RATE_LIMIT = float(os.getenv('TMDB_RATE_LIMIT', 40))
+# Keep-alive connections held open to TMDB
+TMDB_POOL_SIZE = int(os.getenv('TMDB_POOL_SIZE', 16))
+# Seconds to wait for a TMDB connection / response before giving up
+TMDB_CONNECT_TIMEOUT = float(os.getenv('TMDB_CONNECT_TIMEOUT', 3.05))
+TMDB_READ_TIMEOUT = float(os.getenv('TMDB_READ_TIMEOUT', 10))
+# Retries on connection errors, 429 and 5xx (backoff doubles from TMDB_RETRY_BACKOFF seconds)
+TMDB_MAX_RETRIES = int(os.getenv('TMDB_MAX_RETRIES', 3))
+TMDB_RETRY_BACKOFF = float(os.getenv('TMDB_RETRY_BACKOFF', 0.5))
+# Most TMDB requests in flight at once on the async client (add/search routes, refreshes)
+TMDB_CONCURRENCY = int(os.getenv('TMDB_CONCURRENCY', 16))
+# Number of shows refreshed at the same time by /pull_new_episodes
+PULL_CONCURRENCY = int(os.getenv('PULL_CONCURRENCY', 8))
+# Minutes between background episode refreshes (0 disables the scheduler)
+REFRESH_INTERVAL_MINUTES = int(os.getenv('REFRESH_INTERVAL_MINUTES', 360))
+# Ended/canceled shows are re-checked at most this often
+ENDED_SHOW_RECHECK_DAYS = int(os.getenv('ENDED_SHOW_RECHECK_DAYS', 7))
+# How /pick_movie chooses: 'uniform' or 'rating' (favour higher TMDB ratings)
+MOVIE_PICK_WEIGHT = os.getenv('MOVIE_PICK_WEIGHT', 'uniform')
+# Most mutations accepted by one /api/batch request
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 500))
+# Default page size of /api/watched_movies
+WATCHED_MOVIES_PAGE_SIZE = int(os.getenv('WATCHED_MOVIES_PAGE_SIZE', 24))
+# Movies enriched per batch by the background TMDB backfill (0 disables it)
+MOVIE_BACKFILL_BATCH_SIZE = int(os.getenv('MOVIE_BACKFILL_BATCH_SIZE', 20))
+# Uploaded watchlist exports and their import checkpoints
+IMPORT_DIR = os.getenv('IMPORT_DIR', os.path.join(BASE_DIR, 'data', 'imports'))
+# Rows looked up on TMDB and committed together by a bulk import
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 50))
+
+# TMDB response cache: in-memory LRU backed by a SQLite file
+TMDB_CACHE_FILE = os.getenv('TMDB_CACHE_FILE', os.path.join(BASE_DIR, 'data', 'tmdb_cache.db'))
+TMDB_CACHE_MEMORY_ENTRIES = int(os.getenv('TMDB_CACHE_MEMORY_ENTRIES', 1000))
+TMDB_CACHE_DISK_ENTRIES = int(os.getenv('TMDB_CACHE_DISK_ENTRIES', 20000))
+# TTLs in seconds per kind of response
+TMDB_CACHE_SEARCH_TTL = int(os.getenv('TMDB_CACHE_SEARCH_TTL', 3600))
+TMDB_CACHE_MOVIE_SEARCH_TTL = int(os.getenv('TMDB_CACHE_MOVIE_SEARCH_TTL', 7 * 86400))
+TMDB_CACHE_SERIES_TTL = int(os.getenv('TMDB_CACHE_SERIES_TTL', 3600))
+TMDB_CACHE_FINISHED_TTL = int(os.getenv('TMDB_CACHE_FINISHED_TTL', 30 * 86400))
+# Local title index built from TMDB exports (flask ingest-tmdb-export); searched before TMDB
+TMDB_INDEX_FILE = os.getenv('TMDB_INDEX_FILE', os.path.join(BASE_DIR, 'data', 'tmdb_index.db'))
+# Normalized TV search queries kept for search-as-you-type
+TV_SEARCH_CACHE_ENTRIES = int(os.getenv('TV_SEARCH_CACHE_ENTRIES', 500))
+# Library shows listed next to TMDB results when searching
+TV_SEARCH_LOCAL_RESULTS = int(os.getenv('TV_SEARCH_LOCAL_RESULTS', 5))
+# Posters are served from a local cache of TMDB images under this directory, up to POSTER_CACHE_MAX_MB
+POSTER_CACHE_DIR = os.getenv('POSTER_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'posters'))
+# 0 links straight to TMDB instead
+POSTER_CACHE_MAX_MB = int(os.getenv('POSTER_CACHE_MAX_MB', 200))
+# Add a Server-Timing header with the time spent handling each request
+METRICS_TIMING_HEADER = os.getenv('METRICS_TIMING_HEADER', 'false').lower() == 'true'
+
+# Request, TMDB and storage metrics, served on /metrics
+metrics = Registry()
+
+tmdb_rate_limiter = TokenBucket(TMDB_RATE_LIMIT)
+
+tmdb_cache = TmdbCache(TMDB_CACHE_FILE, memory_entries=TMDB_CACHE_MEMORY_ENTRIES,
+                       disk_entries=TMDB_CACHE_DISK_ENTRIES)
+
+# Only once an export has been ingested; without it every lookup goes to TMDB
+tmdb_index = TmdbIndex(TMDB_INDEX_FILE) if os.path.exists(TMDB_INDEX_FILE) else None
+
+# Shared TMDB client: one pooled session, throttled, retried and cached
+tmdb = TmdbClient(
+    TMDB_API_KEY,
+    rate_limiter=tmdb_rate_limiter,
+    cache=tmdb_cache,
+    ttls={
+        'search': TMDB_CACHE_SEARCH_TTL,
+        'movie_search': TMDB_CACHE_MOVIE_SEARCH_TTL,
+        'series': TMDB_CACHE_SERIES_TTL,
+        'finished': TMDB_CACHE_FINISHED_TTL
+    },
+    pool_size=TMDB_POOL_SIZE,
+    connect_timeout=TMDB_CONNECT_TIMEOUT,
+    read_timeout=TMDB_READ_TIMEOUT,
+    max_retries=TMDB_MAX_RETRIES,
+    backoff=TMDB_RETRY_BACKOFF,
+    append_limit=TMDB_APPEND_LIMIT,
+    max_workers=TMDB_MAX_WORKERS,
+    metrics=metrics,
+    index=tmdb_index
+)
+
+# The same endpoints as coroutines, for the async views and the episode refresh
+tmdb_async = AsyncTmdbClient(
+    TMDB_API_KEY,
+    rate_limiter=tmdb_rate_limiter,
+    cache=tmdb_cache,
+    ttls=tmdb.ttls,
+    pool_size=TMDB_POOL_SIZE,
+    connect_timeout=TMDB_CONNECT_TIMEOUT,
+    read_timeout=TMDB_READ_TIMEOUT,
+    max_retries=TMDB_MAX_RETRIES,
+    backoff=TMDB_RETRY_BACKOFF,
+    append_limit=TMDB_APPEND_LIMIT,
+    concurrency=TMDB_CONCURRENCY,
+    metrics=metrics,
+    index=tmdb_index
+)
+
+poster_cache = (PosterCache(POSTER_CACHE_DIR, max_bytes=POSTER_CACHE_MAX_MB * 1024 * 1024, metrics=metrics)
+                if POSTER_CACHE_MAX_MB > 0 else None)
+
+# Search-as-you-type: normalized query cache with prefix answers and coalescing
+tv_search = TvSearch(tmdb_async.search_tv, ttl=TMDB_CACHE_SEARCH_TTL, max_entries=TV_SEARCH_CACHE_ENTRIES)
 
 def title_case(s):
     """Convert string to title case, handling special cases and preserving articles"""
@@ -59,263 +209,146 @@ def title_case(s):
     
     return ' '.join(words)
 
-# Function to load movies from the movies JSON file
-def load_movies():
-    # Try to load and parse the movies file
-    try:
-        # Check if the movies file exists
-        if not os.path.exists(MOVIES_FILE):
-            # If the file doesn't exist, create it with an empty list
-            with open(MOVIES_FILE, 'w') as file:
-                # Write an empty list as JSON to the new file
-                json.dump([], file)
-        
-        # Open the movies file for reading
-        with open(MOVIES_FILE, 'r') as file:
-            # Parse and return the JSON contents
-            return json.load(file)
-    # Handle any errors that occur
-    except Exception as e:
-        # Print error message and return empty list
-        print(f"Error loading movies: {str(e)}")
-        # Return empty list if there was an error
-        return []
-
-def save_movies(movies):
-    try:
-        with open(MOVIES_FILE, 'w') as file:
-            json.dump(movies, file, indent=4)
-    except Exception as e:
-        print(f"Error saving movies: {str(e)}")
+# Process-level stores: each file is parsed once and re-read only when it changes on disk.
+# Writes are appended to a change log as small mutation records (see library_mutations.py)
+movies_store = LibraryStore(MOVIES_FILE, name='movies', mutations=MOVIE_MUTATIONS,
+                            compact_every=CHANGELOG_COMPACT_EVERY, factory=MovieList, metrics=metrics)
+tv_shows_store = LibraryStore(TV_SHOWS_FILE, name='TV shows', mutations=TV_SHOW_MUTATIONS,
+                              compact_every=CHANGELOG_COMPACT_EVERY, factory=ShowList, metrics=metrics)
+tv_episodes_store = LibraryStore(TV_EPISODES_FILE, name='episodes', mutations=EPISODE_MUTATIONS,
+                                 compact_every=CHANGELOG_COMPACT_EVERY, factory=TitleIndexedList,
+                                 metrics=metrics)
 
-def load_tv_shows():
-    try:
-        if not os.path.exists(TV_SHOWS_FILE):
-            with open(TV_SHOWS_FILE, 'w') as file:
-                json.dump([], file)
-        
-        with open(TV_SHOWS_FILE, 'r') as file:
-            return json.load(file)
-    except Exception as e:
-        print(f"Error loading TV shows: {str(e)}")
-        return []
-
-def save_tv_shows(shows):
-    try:
-        with open(TV_SHOWS_FILE, 'w') as file:
-            json.dump(shows, file, indent=4)
-    except Exception as e:
-        print(f"Error saving TV shows: {str(e)}")
+# All routes go through the library interface, whichever backend is configured
+if LIBRARY_BACKEND == 'sqlite':
+    library = SqliteLibrary(LIBRARY_DB_FILE, metrics=metrics)
+else:
+    library = JsonLibrary(movies_store, tv_shows_store, tv_episodes_store)
 
-def get_unwatched_movies(movies):
-    return [movie for movie in movies if not movie['watched']]
+# Poster files never change, so browsers may keep them for a year
+POSTER_MAX_AGE = 365 * 86400
 
-def pick_random_movie(movies):
-    unwatched_movies = get_unwatched_movies(movies)
-    if not unwatched_movies:
-        return None
-    return random.choice(unwatched_movies)
+@app.template_filter('poster')
+def poster_url(url, size='card'):
+    """Where pages load a poster from: the local poster cache when enabled, else TMDB"""
+    return proxy_url(url, size) if poster_cache else url
 
-def get_movie_details(title):
+@app.route('/posters/<size>/<name>')
+def get_poster(size, name):
+    """A poster in one of POSTER_SIZES, from the poster cache (fetched from TMDB the first time)"""
+    if not poster_cache or size not in POSTER_SIZES:
+        abort(404)
     try:
-        # Format the title for better search results
-        formatted_title = title_case(title)
-        logger.debug(f"Searching for movie: {formatted_title}")
-        
-        # Set up headers with Bearer token
-        headers = {
-            'Authorization': f'Bearer {TMDB_API_KEY}',
-            'Content-Type': 'application/json;charset=utf-8'
-        }
-        
-        # Search for the movie
-        search_response = requests.get(
-            TMDB_SEARCH_URL,
-            params={
-                'query': formatted_title,
-                'language': 'en-US'
-            },
-            headers=headers  # Add headers here
-        )
-        search_data = search_response.json()
-        logger.debug(f"TMDB API Response: {search_data}")
-        
-        if search_data.get('results'):
-            movie = search_data['results'][0]
-            logger.debug(f"Found movie: {movie}")
-            
-            details = {
-                'overview': movie.get('overview'),
-                'poster': f"https://image.tmdb.org/t/p/w500{movie.get('poster_path')}" if movie.get('poster_path') else None,
-                'release_date': movie.get('release_date'),
-                'rating': movie.get('vote_average')
-            }
-            logger.debug(f"Returning details: {details}")
-            return details
-            
+        found = poster_cache.get(size, name)
     except Exception as e:
-        logger.error(f"Error fetching movie details: {str(e)}")
-    return None
-
-# Add function to get TV show details
-def get_tv_show_details(title):
-    try:
-        headers = {
-            'Authorization': f'Bearer {TMDB_API_KEY}',
-            'Content-Type': 'application/json;charset=utf-8'
-        }
-        
-        # Search for the TV show
-        search_response = requests.get(
-            TMDB_TV_SEARCH_URL,
-            params={
-                'query': title,
-                'language': 'en-US'
-            },
-            headers=headers
-        )
-        search_data = search_response.json()
-        logger.debug(f"Search results: {search_data}")
-        
-        if search_data['results']:
-            show = search_data['results'][0]
-            show_id = show['id']
-            episodes = get_tv_show_episodes(show_id)
-            
-            return {
-                'id': show['id'],  # Add this line to include the show ID
-                'overview': show.get('overview', ''),
-                'poster_path': f"https://image.tmdb.org/t/p/w500{show['poster_path']}" if show.get('poster_path') else None,
-                'first_air_date': show.get('first_air_date', ''),
-                'rating': show.get('vote_average', 0),
-                'seasons': episodes
-            }
-        else:
-            return None
-    except Exception as e:
-        logger.error(f"Error fetching TV show details: {str(e)}")
-        return None
-
-def get_tv_show_episodes(show_id):
-    try:
-        headers = {
-            'Authorization': f'Bearer {TMDB_API_KEY}',
-            'Content-Type': 'application/json;charset=utf-8'
-        }
-        
-        logger.info(f"Fetching series data for show ID: {show_id}")
-        series_response = requests.get(
-            f"https://api.themoviedb.org/3/tv/{show_id}",
-            headers=headers
-        )
-        series_data = series_response.json()
-        
-        if 'status_code' in series_data and series_data['status_code'] == 34:
-            logger.error(f"TV show not found: {show_id}")
-            return []
-
-        logger.info(f"Total seasons found: {series_data.get('number_of_seasons', 0)}")
-        seasons = []
-        today = datetime.today().date()
-        
-        for season in range(1, series_data.get('number_of_seasons', 0) + 1):
-            logger.info(f"Fetching season {season} data")
-            season_response = requests.get(
-                f"https://api.themoviedb.org/3/tv/{show_id}/season/{season}",
-                headers=headers
-            )
-            season_data = season_response.json()
-            
-            if 'episodes' in season_data:
-                episodes = []
-                for ep in season_data['episodes']:
-                    air_date = ep.get('air_date')
-                    if air_date:
-                        episode_date = datetime.strptime(air_date, '%Y-%m-%d').date()
-                        if episode_date <= today:
-                            episode = {
-                                'episode_number': ep['episode_number'],
-                                'name': ep.get('name', f'Episode {ep["episode_number"]}'),
-                                'overview': ep.get('overview', ''),
-                                'air_date': air_date,
-                                'watched': False
-                            }
-                            episodes.append(episode)
-                            logger.debug(f"Added episode: S{season}E{ep['episode_number']} - {ep.get('name')}")
-                
-                if episodes:
-                    season_obj = {
-                        'season_number': season,
-                        'episode_count': len(episodes),
-                        'episodes': sorted(episodes, key=lambda x: x['episode_number'])
-                    }
-                    seasons.append(season_obj)
-                    logger.info(f"Added season {season} with {len(episodes)} episodes")
-
-        return seasons
-
-    except Exception as e:
-        logger.error(f"Error fetching TV show episodes: {str(e)}")
-        return []
+        # Let the browser get it from TMDB rather than show a broken image
+        logger.error(f"Error caching poster {name}: {str(e)}")
+        return redirect(f"{TMDB_IMAGE_URL}/{POSTER_SIZES[size]}/{name}")
+    if not found:
+        abort(404)
+    # An open file: still readable if the cache evicts the image before it's sent
+    file, etag = found
+    response = send_file(file, mimetype=mimetypes.guess_type(name)[0], max_age=POSTER_MAX_AGE, etag=etag,
+                         conditional=True)
+    response.cache_control.immutable = True
+    return response
 
 # Update the index route to include TV shows
 @app.route('/')
 def index():
-    movies = load_movies()
-    tv_shows = load_tv_shows()
-    unwatched_count = sum(1 for movie in movies if not movie['watched'])
-    watched_movies = [movie for movie in movies if movie['watched']]
+    # Only show summaries; episodes and watched movies are fetched by the page as needed
+    tv_shows = library.list_shows()
+    unwatched_count = library.count_movies(watched=False)
+    watched_count = library.count_movies(watched=True)
     return render_template('index.html', 
                          unwatched_count=unwatched_count, 
-                         watched_movies=watched_movies,
+                         watched_count=watched_count,
                          tv_shows=tv_shows)
 
+@app.route('/api/show_episodes', methods=['GET'])
+def get_show_episodes():
+    """Seasons and episodes of one show, loaded when the show is expanded on the page"""
+    title = request.args.get('title')
+    if not title:
+        return jsonify({'success': False, 'error': 'Title is required'}), 400
+    show = library.get_show(title, with_episodes=True)
+    if not show:
+        return jsonify({'success': False, 'error': 'Show not found'}), 404
+    return jsonify({'success': True, 'title': show['title'], 'seasons': show.get('seasons', [])})
+
+@app.route('/api/watched_movies', methods=['GET'])
+def get_watched_movies():
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', WATCHED_MOVIES_PAGE_SIZE, type=int), 1), 200)
+    return jsonify({
+        'success': True,
+        'total': library.count_movies(watched=True),
+        'movies': [dict(movie, poster=poster_url(movie.get('poster'), 'thumb'))
+                   for movie in library.list_movies(watched=True, offset=offset, limit=limit)]
+    })
+
 @app.route('/pick_movie', methods=['POST'])
 def pick_movie():
     try:
-        movies = load_movies()
-        movie = pick_random_movie(movies)
+        movie = library.random_unwatched_movie(weight=request.form.get('weight', MOVIE_PICK_WEIGHT))
         
         if not movie:
             return jsonify({'error': 'No unwatched movies available'})
         
-        # Get additional details from TMDB
-        tmdb_details = get_movie_details(movie['title'])
-        
+        # Served from the details stored at add time (or by movie_backfill), no TMDB call
         response = {
             'title': movie['title'],
-            'poster': movie['poster'],  # Use the poster from our JSON
-            'year': tmdb_details['release_date'][:4] if tmdb_details and 'release_date' in tmdb_details else None,
-            'overview': tmdb_details['overview'] if tmdb_details else None,
-            'tmdb_rating': tmdb_details['rating'] if tmdb_details else None
+            'poster': poster_url(movie.get('poster'), 'full'),
+            'year': movie['release_date'][:4] if movie.get('release_date') else None,
+            'overview': movie.get('overview'),
+            'tmdb_rating': movie.get('tmdb_rating')
         }
         
         return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)})
 
+def is_duplicate(similar):
+    """True when similar_movies()/similar_shows() found the same normalized title"""
+    return bool(similar) and similar[0][1] == 1.0
+
+@app.route('/api/search', methods=['GET'])
+def search_library():
+    """Search the library's movies and shows by title (typos and missing articles are fine)"""
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if not query.strip():
+        return jsonify({'success': False, 'error': 'q is required'}), 400
+    movies = [dict(movie, poster=poster_url(movie.get('poster'), 'thumb'))
+              for movie in library.search_movies(query, limit=limit)]
+    shows = [dict({key: value for key, value in show.items() if key != 'seasons'},
+                  poster=poster_url(show.get('poster'), 'thumb'))
+             for show in library.search_shows(query, limit=limit)]
+    return jsonify({'success': True, 'movies': movies, 'shows': shows})
+
 @app.route('/mark_watched', methods=['POST'])
 def mark_watched():
     title = request.form['title']
-    movies = load_movies()
-    for movie in movies:
-        if movie['title'] == title:
-            movie['watched'] = True
-            save_movies(movies)
-            return jsonify({"message": f"'{title}' marked as watched!"})
+    if library.set_movie_watched(title):
+        return jsonify({"message": f"'{title}' marked as watched!"})
     return jsonify({"error": "Movie not found"}), 404
 
 @app.route('/add_movie', methods=['POST'])
-def add_movie():
+async def add_movie():
     new_movie_title = title_case(request.form['title'])  # Format the title
-    movies = load_movies()
-    
-    # Check if movie already exists
-    if any(movie['title'].lower() == new_movie_title.lower() for movie in movies):
+    force = request.form.get('force') == 'true'
+    # Check if movie already exists, ignoring case, punctuation and articles
+    similar = library.similar_movies(new_movie_title, limit=3)
+    if library.find_movie(new_movie_title) or is_duplicate(similar):
         return jsonify({"error": "Movie already exists!"}), 400
+    if similar and not force:
+        return jsonify({
+            "error": "A similar movie is already in your library",
+            "did_you_mean": [movie['title'] for movie, _ in similar]
+        }), 409
     
-    movie_details = get_movie_details(new_movie_title)
-    logger.debug(f"Movie details received: {movie_details}")
+    movie_details = await tmdb_async.get_movie_details(new_movie_title)
+    logger.debug("Movie details for %s: %s", new_movie_title, movie_details)
     
     new_movie = {
         "title": new_movie_title,
@@ -335,8 +368,7 @@ def add_movie():
             "tmdb_rating": movie_details.get('rating')
         })
     
-    movies.append(new_movie)
-    save_movies(movies)
+    library.add_movie(new_movie)
     return jsonify({"message": "Movie added successfully!"})
 
 @app.route('/rate_movie', methods=['POST'])
@@ -347,90 +379,57 @@ def rate_movie():
     if not title or not isinstance(rating, int) or rating < 1 or rating > 5:
         return jsonify({'success': False, 'error': 'Invalid input'}), 400
     
-    movies = load_movies()
-    for movie in movies:
-        if movie['title'] == title:
-            movie['rating'] = rating
-            save_movies(movies)
-            return jsonify({'success': True})
+    if library.set_movie_rating(title, rating):
+        return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': 'Movie not found'}), 404
 
 @app.route('/search_tv_shows', methods=['POST'])
-def search_tv_shows():
+async def search_tv_shows():
     title = request.form.get('title')
     if not title:
         return jsonify({'success': False, 'error': 'Title is required'})
     
+    # Shows already in the library are matched from the title index, no TMDB needed
+    local = [{'title': show['title'], 'status': show['status']}
+             for show in library.search_shows(title, limit=TV_SEARCH_LOCAL_RESULTS)]
+
     try:
-        headers = {
-            'Authorization': f'Bearer {TMDB_API_KEY}',
-            'Content-Type': 'application/json;charset=utf-8'
-        }
-        
-        # Search for the TV show
-        search_response = requests.get(
-            TMDB_TV_SEARCH_URL,
-            params={
-                'query': title,
-                'language': 'en-US'
-            },
-            headers=headers
-        )
-        search_data = search_response.json()
+        # Cached, prefix-filtered or shared with an identical search in flight
+        results = await tv_search.query(title)
         
-        if not search_data.get('results'):
-            return jsonify({'success': False, 'error': 'No results found'})
+        if not results:
+            return jsonify({'success': False, 'error': 'No results found', 'local': local})
         
-        # Return up to 10 results with basic info
-        results = []
-        for show in search_data.get('results')[:10]:  # Limit to 10 results
-            results.append({
-                'id': show.get('id'),
-                'title': show.get('name'),
-                'overview': show.get('overview', '')[:150] + '...' if show.get('overview') and len(show.get('overview')) > 150 else show.get('overview', ''),
-                'poster': f"https://image.tmdb.org/t/p/w200{show.get('poster_path')}" if show.get('poster_path') else None,
-                'year': show.get('first_air_date', '')[:4] if show.get('first_air_date') else None,
-                'tmdb_rating': show.get('vote_average')
-            })
-        
-        return jsonify({'success': True, 'results': results})
+        # Copies: the search cache keeps the TMDB URLs
+        results = [dict(show, poster=poster_url(show.get('poster'))) for show in results]
+        return jsonify({'success': True, 'results': results, 'local': local})
         
     except Exception as e:
         logger.error(f"Error searching TV shows: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)})
+        return jsonify({'success': False, 'error': str(e), 'local': local})
 
 # Update add_show route to include show details
 @app.route('/add_show', methods=['POST'])
-def add_show():
+async def add_show():
     title = request.form.get('title')
     show_id = request.form.get('show_id')  # Now we accept a specific show ID
     
     if not (title or show_id):
         return jsonify({'success': False, 'error': 'Title or Show ID is required'})
     
-    shows = load_tv_shows()
-    
     # If we have a show ID, we'll use it directly
     if show_id:
         # Check if we already have this show by ID
-        if any(str(show.get('tmdb_id')) == str(show_id) for show in shows):
+        if library.find_show_by_tmdb_id(show_id):
             return jsonify({'success': False, 'error': 'Show already exists'})
             
         # Get show details directly using the ID
         try:
-            headers = {
-                'Authorization': f'Bearer {TMDB_API_KEY}',
-                'Content-Type': 'application/json;charset=utf-8'
-            }
-            
-            show_response = requests.get(
-                f"https://api.themoviedb.org/3/tv/{show_id}",
-                headers=headers
-            )
-            show_data = show_response.json()
+            # One request returns both the show data and its seasons
+            show_data, episodes = await tmdb_async.fetch_tv_show(show_id)
             
-            if 'status_code' in show_data and show_data['status_code'] in [34, 404]:
+            if not show_data:
                 return jsonify({'success': False, 'error': 'Show not found'})
                 
             title = show_data.get('name')
@@ -439,11 +438,9 @@ def add_show():
             title = title_case(title) if title else ''
             
             # Check if we already have this show by title
-            if any(show['title'].lower() == title.lower() for show in shows):
+            if library.find_show(title) or is_duplicate(library.similar_shows(title, limit=1)):
                 return jsonify({'success': False, 'error': 'Show already exists'})
                 
-            episodes = get_tv_show_episodes(show_id)
-            
             new_show = {
                 'title': title,
                 'status': 'to_watch',
@@ -456,8 +453,7 @@ def add_show():
                 'seasons': episodes
             }
             
-            shows.append(new_show)
-            save_tv_shows(shows)
+            library.add_show(new_show)
             return jsonify({'success': True})
             
         except Exception as e:
@@ -468,10 +464,17 @@ def add_show():
     title = title_case(title)
     
     # Check if show already exists
-    if any(show['title'] == title for show in shows):
+    similar = library.similar_shows(title, limit=3)
+    if library.get_show(title) or is_duplicate(similar):
         return jsonify({'success': False, 'error': 'Show already exists'})
+    if similar and request.form.get('force') != 'true':
+        return jsonify({
+            'success': False,
+            'error': 'A similar show is already in your library',
+            'did_you_mean': [show['title'] for show, _ in similar]
+        }), 409
     
-    show_details = get_tv_show_details(title)
+    show_details = await tmdb_async.get_tv_show_details(title)
     if not show_details:
         return jsonify({'success': False, 'error': 'Could not fetch show details'})
         
@@ -484,11 +487,10 @@ def add_show():
         'year': show_details.get('first_air_date', '')[:4] if show_details.get('first_air_date') else None,
         'tmdb_id': show_details.get('id'),
         'tmdb_rating': show_details.get('rating'),
-        'seasons': get_tv_show_episodes(show_details.get('id'))
+        'seasons': show_details.get('seasons', [])
     }
     
-    shows.append(new_show)
-    save_tv_shows(shows)
+    library.add_show(new_show)
     return jsonify({'success': True})
 
 @app.route('/rate_show', methods=['POST'])
@@ -496,15 +498,63 @@ def rate_show():
     title = request.form.get('title')
     rating = int(request.form.get('rating'))
     
-    shows = load_tv_shows()
-    for show in shows:
-        if show['title'] == title:
-            show['rating'] = rating
-            save_tv_shows(shows)
-            return jsonify({'success': True})
+    if library.set_show_rating(title, rating):
+        return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': 'Show not found'})
 
+# The statuses the page has a list for
+SHOW_STATUSES = ('to_watch', 'ongoing', 'on_hold', 'watched')
+
+def change_show_status(title, status):
+    """Set a show's status; starting a show resets its episodes. Returns the stored title or None"""
+    show = library.find_show(title)
+    if not show:
+        return None
+    show_title = show['title']
+    library.set_show_status(show_title, status)
+    if status == 'ongoing':
+        # Reset episode watch status
+        library.set_all_episodes_watched(show_title, False)
+    return show_title
+
+def fetch_missing_episodes(show_title):
+    """When starting to watch, fetch episodes from TMDB if the show has none"""
+    if library.has_episodes(show_title):
+        return
+    logger.info(f"Refreshing episodes for show: {show_title}")
+    show_details = tmdb.get_tv_show_details(show_title)
+    if show_details and show_details.get('seasons'):
+        library.replace_seasons(show_title, show_details['seasons'])
+
+def episodes_marked(show, watched):
+    """Follow-ups after ticking episodes: resume on-hold shows and clear the new episodes flag"""
+    title = show['title']
+    # If marking as watched and show is on hold, move to currently watching
+    if watched and show['status'] == 'on_hold':
+        logger.info(f"Moving show '{title}' from On Hold to Currently Watching due to watched episode")
+        library.set_show_status(title, 'ongoing')
+
+    # **Check if all episodes are watched**
+    if show.get('new_episodes') and library.all_episodes_watched(title):
+        library.set_show_fields(title, {'new_episodes': False})
+        logger.info(f"All episodes for '{title}' are watched. 'new_episodes' set to False.")
+
+def set_episode_status(title, season, episode, watched):
+    show = library.get_show(title)
+    if not (show and library.set_episode_watched(title, season, episode, watched)):
+        return False
+    episodes_marked(show, watched)
+    return True
+
+def set_episode_status_through(title, season, episode, watched):
+    """Marks every episode up to the target; future seasons are left untouched"""
+    show = library.get_show(title)
+    if not (show and library.set_episodes_watched_through(title, season, episode, watched)):
+        return False
+    episodes_marked(show, watched)
+    return True
+
 @app.route('/update_show_status', methods=['POST'])
 def update_show_status():
     title = request.form.get('title')
@@ -512,30 +562,15 @@ def update_show_status():
     
     if not title or not new_status:
         return jsonify({'success': False, 'error': 'Missing title or status'})
+    if new_status not in SHOW_STATUSES:
+        return jsonify({'success': False, 'error': f"Unknown status '{new_status}'"})
         
     try:
-        shows = load_tv_shows()
-            
-        for show in shows:
-            if show['title'].lower() == title.lower():
-                prev_status = show.get('status')
-                show['status'] = new_status
+        show_title = change_show_status(title, new_status)
+        if show_title and new_status == 'ongoing':
+            fetch_missing_episodes(show_title)
                 
-                # When starting to watch, refresh episodes if they're missing
-                if new_status == 'ongoing':
-                    if not show.get('seasons') or not any(s.get('episodes') for s in show.get('seasons', [])):
-                        logger.info(f"Refreshing episodes for show: {title}")
-                        show_details = get_tv_show_details(title)
-                        if show_details and show_details.get('seasons'):
-                            show['seasons'] = show_details['seasons']
-                    # Reset episode watch status
-                    for season in show.get('seasons', []):
-                        for episode in season.get('episodes', []):
-                            episode['watched'] = False
-                
-        save_tv_shows(shows)
         return jsonify({'success': True})
-        
     except Exception as e:
         logger.error(f"Error updating show {title}: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
@@ -548,28 +583,8 @@ def update_episode_status():
     episode = int(request.form.get('episode'))
     watched = request.form.get('watched') == 'true'
     
-    shows = load_tv_shows()
-    for show in shows:
-        if show['title'] == title:
-            # If marking as watched and show is on hold, move to currently watching
-            if watched and show['status'] == 'on_hold':
-                logger.info(f"Moving show '{title}' from On Hold to Currently Watching due to watched episode")
-                show['status'] = 'ongoing'
-                
-            for s in show['seasons']:
-                if s['season_number'] == season:
-                    for ep in s['episodes']:
-                        if ep['episode_number'] == episode:
-                            ep['watched'] = watched
-                            # **Check if all episodes are watched**
-                            all_watched = all(
-                                ep['watched'] for season in show['seasons'] for ep in season['episodes']
-                            )
-                            if all_watched:
-                                show['new_episodes'] = False
-                                logger.info(f"All episodes for '{title}' are watched. 'new_episodes' set to False.")
-                            save_tv_shows(shows)
-                            return jsonify({'success': True})
+    if set_episode_status(title, season, episode, watched):
+        return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': 'Show/episode not found'}), 404
 
@@ -582,46 +597,96 @@ def update_episode_status_batch():
         target_episode = int(request.form.get('episode'))
         watched = request.form.get('watched') == 'true'
         
-        shows = load_tv_shows()
-        for show in shows:
-            if show['title'] == title:
-                # If marking as watched and show is on hold, move to currently watching
-                if watched and show['status'] == 'on_hold':
-                    logger.info(f"Moving show '{title}' from On Hold to Currently Watching due to batch watched episodes")
-                    show['status'] = 'ongoing'
-                    
-                updated = False
-                for season in show['seasons']:
-                    season_num = season['season_number']
-                    # For seasons before the target season, mark all episodes
-                    if season_num < target_season:
-                        for ep in season['episodes']:
-                            ep['watched'] = watched
-                            updated = True
-                    # For the target season, mark episodes up to target_episode
-                    elif season_num == target_season:
-                        for ep in season['episodes']:
-                            if ep['episode_number'] <= target_episode:
-                                ep['watched'] = watched
-                                updated = True
-                    # Don't touch episodes in future seasons
-                
-                if updated:
-                    # **Check if all episodes are watched**
-                    all_watched = all(
-                        ep['watched'] for season in show['seasons'] for ep in season['episodes']
-                    )
-                    if all_watched:
-                        show['new_episodes'] = False
-                        logger.info(f"All episodes for '{title}' are watched. 'new_episodes' set to False.")
-                    save_tv_shows(shows)
-                    return jsonify({'success': True})
+        if set_episode_status_through(title, target_season, target_episode, watched):
+            return jsonify({'success': True})
                 
         return jsonify({'success': False, 'error': 'Show/season not found'})
     except Exception as e:
         logger.error(f"Error in batch update: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _is_text(value):
+    return isinstance(value, str) and bool(value)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _is_bool(value):
+    return isinstance(value, bool)
+
+def _is_movie_rating(value):
+    return _is_int(value) and 1 <= value <= 5
+
+def _is_show_status(value):
+    return value in SHOW_STATUSES
+
+# /api/batch operations: name -> (handler, {field: check})
+BATCH_OPERATIONS = {
+    'set_episode_watched': (set_episode_status,
+                            {'title': _is_text, 'season': _is_int, 'episode': _is_int, 'watched': _is_bool}),
+    'set_episodes_watched_through': (set_episode_status_through,
+                                     {'title': _is_text, 'season': _is_int, 'episode': _is_int,
+                                      'watched': _is_bool}),
+    'set_show_rating': (library.set_show_rating, {'title': _is_text, 'rating': _is_int}),
+    'set_show_status': (change_show_status, {'title': _is_text, 'status': _is_show_status}),
+    'set_movie_watched': (library.set_movie_watched, {'title': _is_text, 'watched': _is_bool}),
+    'set_movie_rating': (library.set_movie_rating, {'title': _is_text, 'rating': _is_movie_rating}),
+}
+
+def parse_batch_operation(operation):
+    """Validate one /api/batch operation; returns (handler, kwargs) or raises ValueError"""
+    if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+        raise ValueError(f"unknown operation {operation.get('op') if isinstance(operation, dict) else operation!r}")
+    handler, fields = BATCH_OPERATIONS[operation['op']]
+    for field, check in fields.items():
+        if not check(operation.get(field)):
+            raise ValueError(f"invalid or missing '{field}' for {operation['op']}")
+    return handler, {field: operation[field] for field in fields}
+
+@app.route('/api/batch', methods=['POST'])
+def apply_batch():
+    """Apply an ordered list of mutations in one transaction with a single write.
+
+    Body: {"operations": [{"op": "set_episode_watched", "title": ..., ...}, ...]}.
+    Invalid operations reject the whole batch before anything is applied;
+    targets that don't exist only fail their own entry in `results`. With
+    "expected_version" (the `version` of an earlier response) the batch is
+    only applied if nothing changed the library since, otherwise it's a 409.
+    """
+    payload = request.get_json(silent=True) or {}
+    operations = payload.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'success': False, 'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}), 400
+
+    parsed = []
+    for i, operation in enumerate(operations):
+        try:
+            parsed.append(parse_batch_operation(operation))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Operation {i}: {str(e)}'}), 400
+
+    try:
+        with library.batch(expected_version=payload.get('expected_version')):
+            outcomes = [handler(**args) for handler, args in parsed]
+    except VersionConflict as e:
+        return jsonify({'success': False, 'error': str(e), 'version': e.current}), 409
+    except Exception as e:
+        logger.error(f"Error applying batch of {len(parsed)} operations: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    # TMDB lookups happen after the commit so they never hold the library
+    for (handler, args), outcome in zip(parsed, outcomes):
+        if handler is change_show_status and outcome and args['status'] == 'ongoing':
+            try:
+                fetch_missing_episodes(outcome)
+            except Exception as e:
+                logger.error(f"Error fetching episodes for {outcome}: {str(e)}")
+
+    results = [{'success': True} if outcome else {'success': False, 'error': 'Not found'} for outcome in outcomes]
+    return jsonify({'success': True, 'results': results, 'version': library.version()})
+
 # Add new route to delete TV shows
 @app.route('/delete_show', methods=['POST'])
 def delete_show():
@@ -629,158 +694,315 @@ def delete_show():
     if not title:
         return jsonify({'success': False, 'error': 'Title is required'})
     
-    shows = load_tv_shows()
-    shows = [show for show in shows if show['title'] != title]
-    save_tv_shows(shows)
+    library.delete_show(title)
     return jsonify({'success': True})
 
+async def fetch_show_refresh(show, from_season=1):
+    """Network half of a refresh: resolve the TMDB id if it's missing and fetch fresh seasons.
+
+    Seasons before from_season (the last one stored) are known and not fetched
+    again. Returns (show_id, series_data, seasons).
+    """
+    show_id = show.get('tmdb_id')
+    if not show_id:
+        # Try to get show ID from TMDB; the details already include the episodes
+        show_details = await tmdb_async.get_tv_show_details(show['title'])
+        if show_details:
+            return show_details['id'], {}, show_details.get('seasons', [])
+        return None, {}, []
+
+    logger.debug("Checking episodes for show %s (TMDB id %s)", show['title'], show_id)
+    series_data, seasons = await tmdb_async.fetch_tv_show(show_id, from_season=from_season)
+    return show_id, series_data, seasons
+
+def can_skip_refresh(show, today):
+    """True when the air dates recorded at the last check mean nothing new can have aired since"""
+    last_checked = show.get('last_checked')
+    if not last_checked:
+        return False
+    next_air_date = show.get('next_air_date')
+    if next_air_date:
+        return next_air_date > today.isoformat()
+    # Finished shows without an announced episode only need an occasional look
+    if show.get('tmdb_status') in ('Ended', 'Canceled'):
+        days_since_check = (today - datetime.fromisoformat(last_checked).date()).days
+        return days_since_check < ENDED_SHOW_RECHECK_DAYS
+    return False
+
+def record_show_check(show, show_id, series_data):
+    """Store when the show was checked and TMDB's schedule, so later runs can skip it"""
+    fields = {'last_checked': datetime.now().isoformat(timespec='seconds')}
+    if show_id and not show.get('tmdb_id'):
+        fields['tmdb_id'] = show_id
+    if series_data:
+        fields.update({
+            'next_air_date': (series_data.get('next_episode_to_air') or {}).get('air_date'),
+            'last_air_date': series_data.get('last_air_date'),
+            'tmdb_status': series_data.get('status')
+        })
+    library.set_show_fields(show['title'], fields)
+
+def apply_show_refresh(show, new_seasons, today):
+    """Merge fresh TMDB seasons into the stored show and record the changes.
+
+    new_seasons may start at any season (the refresh only fetches the last
+    stored one and up); only episodes missing from those seasons are added,
+    and stored episodes keep their watch state. Returns (has_new_episodes,
+    status_change or None).
+    """
+    if not new_seasons:
+        return False, None
+
+    # Watch state of the stored episodes of the seasons we got, keyed by (season, episode)
+    first_season = min(season['season_number'] for season in new_seasons)
+    current_episodes = library.episode_states(show['title'], from_season=first_season)
+
+    added_seasons = []
+    for season in new_seasons:
+        episodes = [ep for ep in season.get('episodes', [])
+                    if (season['season_number'], ep['episode_number']) not in current_episodes]
+        if episodes:
+            added_seasons.append({'season_number': season['season_number'], 'episodes': episodes})
+    has_new_episodes = bool(added_seasons)
+    
+    # Find latest episode air date
+    latest_air_date = None
+    for season in new_seasons:
+        for episode in season.get('episodes', []):
+            if episode.get('air_date'):
+                episode_date = datetime.strptime(episode['air_date'], '%Y-%m-%d').date()
+                if not latest_air_date or episode_date > latest_air_date:
+                    latest_air_date = episode_date
+    
+    # Update show status based on latest episode
+    status_change = None
+    if latest_air_date:
+        days_since_latest = (today - latest_air_date).days
+        
+        if show['status'] == 'ongoing' and days_since_latest > 30:
+            library.set_show_status(show['title'], 'on_hold')
+            status_change = {'show': show['title'], 'from': 'ongoing', 'to': 'on_hold'}
+        elif show['status'] == 'on_hold' and has_new_episodes:
+            library.set_show_status(show['title'], 'ongoing')
+            status_change = {'show': show['title'], 'from': 'on_hold', 'to': 'ongoing'}
+    
+    # Store only the new episodes; the stored ones and their watch state are left alone
+    if has_new_episodes:
+        added = 0
+        for season in added_seasons:
+            for ep in season['episodes']:
+                ep['watched'] = False
+                added += 1
+        library.add_episodes(show['title'], added_seasons)
+        logger.info("Added %d new episodes to %s (S%sE%s and up)", added, show['title'],
+                    added_seasons[0]['season_number'], added_seasons[0]['episodes'][0]['episode_number'])
+        # **Set the 'new_episodes' flag to True**
+        library.set_show_fields(show['title'], {'new_episodes': True})
+    elif show.get('new_episodes'):
+        # **Ensure the 'new_episodes' flag is False if no new episodes**
+        library.set_show_fields(show['title'], {'new_episodes': False})
+
+    return has_new_episodes, status_change
+
+def refresh_shows(shows, job):
+    """Refresh shows from TMDB, PULL_CONCURRENCY at a time.
+
+    The TMDB requests run as coroutines on the async client's loop (throttled
+    by tmdb_rate_limiter); each show's diff is applied on the calling thread
+    as soon as its results arrive, and the job's progress is updated along
+    the way.
+    """
+    today = datetime.today().date()
+    limit = asyncio.Semaphore(PULL_CONCURRENCY)
+
+    async def fetch(show, from_season):
+        async with limit:
+            return await fetch_show_refresh(show, from_season)
+
+    futures = {tmdb_async.submit(fetch(show, library.latest_season(show['title']) or 1)): show
+               for show in shows}
+    for future in as_completed(futures):
+        show = futures[future]
+        try:
+            show_id, series_data, new_seasons = future.result()
+            record_show_check(show, show_id, series_data)
+            has_new_episodes, status_change = apply_show_refresh(show, new_seasons, today)
+        except Exception as e:
+            logger.error(f"Error refreshing show {show['title']}: {str(e)}")
+            job.errors.append({'show': show['title'], 'error': str(e)})
+            continue
+        finally:
+            job.checked += 1
+        job.new_episodes_added = job.new_episodes_added or has_new_episodes
+        if status_change:
+            job.status_changes.append(status_change)
+
+def run_refresh_job(job):
+    """Refresh every ongoing/on_hold show, skipping those with nothing new to air"""
+    shows = library.list_shows(status=('ongoing', 'on_hold'))
+    today = datetime.today().date()
+    job.total = len(shows)
+
+    to_check = []
+    for show in shows:
+        if not job.force and can_skip_refresh(show, today):
+            # Nothing new aired, but still apply the status rules to the stored episodes
+            stored = library.get_show(show['title'], with_episodes=True)
+            # The latest air date is in the last season
+            _, status_change = apply_show_refresh(show, stored['seasons'][-1:] if stored else [], today)
+            if status_change:
+                job.status_changes.append(status_change)
+            job.skipped += 1
+        else:
+            to_check.append(show)
+
+    refresh_shows(to_check, job)
+
+    logger.info("Pull complete. New episodes added: %s", job.new_episodes_added)
+    for change in job.status_changes:
+        logger.info("Status change: %s: %s -> %s", change['show'], change['from'], change['to'])
+
+refresh_scheduler = RefreshScheduler(run_refresh_job, interval_minutes=REFRESH_INTERVAL_MINUTES)
+
+# Fetches TMDB details for movies stored without them, so /pick_movie never has to.
+# One worker at a time runs it; the others skip it rather than repeat the same lookups
+backfill_lock = (LIBRARY_DB_FILE if LIBRARY_BACKEND == 'sqlite' else MOVIES_FILE) + '.backfill.lock'
+movie_backfill = MovieBackfill(library, lambda title: tmdb.find_movie(title_case(title)),
+                               batch_size=MOVIE_BACKFILL_BATCH_SIZE, concurrency=TMDB_MAX_WORKERS,
+                               lock_path=backfill_lock)
+
+# Watchlist imports (CSV/JSON exports), checkpointed per batch so they can be resumed
+bulk_importer = BulkImporter(library, tmdb_async, IMPORT_DIR, normalize_title=title_case,
+                             batch_size=IMPORT_BATCH_SIZE, concurrency=PULL_CONCURRENCY)
+
+@app.before_request
+def start_background_jobs():
+    # Started lazily so CLI commands and the reloader's parent process don't run them
+    refresh_scheduler.start()
+    movie_backfill.start()
+
 # Add this function to pull new episodes for all currently watching shows
 @app.route('/pull_new_episodes', methods=['POST'])
 def pull_new_episodes():
+    # The refresh runs as a background job; poll /api/refresh_jobs/<id> for progress
+    force = request.form.get('force') == 'true'
+    job = refresh_scheduler.trigger('manual', force=force)
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+@app.route('/api/refresh_jobs/latest', methods=['GET'])
+def get_latest_refresh_job():
+    job = refresh_scheduler.latest()
+    if not job:
+        return jsonify({'success': False, 'error': 'No refresh job has run yet'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/refresh_jobs/<int:job_id>', methods=['GET'])
+def get_refresh_job(job_id):
+    job = refresh_scheduler.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+def import_format(filename, fmt=None):
+    """The export format asked for, or the one the file extension says"""
+    fmt = (fmt or os.path.splitext(filename or '')[1].lstrip('.')).lower()
+    return fmt if fmt in IMPORT_FORMATS else None
+
+@app.route('/api/imports', methods=['POST'])
+def create_import():
+    """Start importing an uploaded watchlist export (multipart field `file`).
+
+    Optional form fields: format (csv, json or jsonl; defaults to the file
+    extension), kind (movie or show, for exports that don't say) and watched
+    (true/false, overriding what the export says). Poll
+    /api/imports/<id> for progress.
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    fmt = import_format(upload.filename, request.form.get('format'))
+    if not fmt:
+        return jsonify({'success': False, 'error': f"format must be one of {', '.join(IMPORT_FORMATS)}"}), 400
+    kind = request.form.get('kind') or None
+    if kind not in (None, 'movie', 'show'):
+        return jsonify({'success': False, 'error': 'kind must be movie or show'}), 400
+    watched = request.form.get('watched')
+    watched = watched == 'true' if watched in ('true', 'false') else None
     try:
-        shows = load_tv_shows()
-        new_episodes_added = False
-        status_changes = []
-        today = datetime.today().date()
-        
-        for show in shows:
-            if show['status'] in ['ongoing', 'on_hold']:
-                # First get the show ID if it's missing
-                show_id = show.get('tmdb_id')
-                if not show_id:
-                    # Try to get show ID from TMDB
-                    show_details = get_tv_show_details(show['title'])
-                    if show_details:
-                        show_id = show_details['id']
-                        show['tmdb_id'] = show_id
-                
-                if show_id:
-                    logger.info(f"\n{'='*50}\nChecking episodes for show: {show['title']} (ID: {show_id})")
-                    
-                    # Get fresh episodes data from TMDB
-                    new_seasons = get_tv_show_episodes(show_id)
-                    if new_seasons:
-                        # Create dictionaries for better comparison
-                        current_episodes = {
-                            f"s{s['season_number']}e{e['episode_number']}": e
-                            for s in show.get('seasons', [])
-                            for e in s.get('episodes', [])
-                        }
-                        
-                        new_episodes = {
-                            f"s{s['season_number']}e{e['episode_number']}": e
-                            for s in new_seasons
-                            for e in s.get('episodes', [])
-                        }
-                        
-                        # Log current state
-                        logger.debug(f"Current episodes: {list(current_episodes.keys())}")
-                        logger.debug(f"New episodes: {list(new_episodes.keys())}")
-                        
-                        # Check for new episodes
-                        has_new_episodes = bool(new_episodes.keys() - current_episodes.keys())
-                        
-                        # Find latest episode air date
-                        latest_air_date = None
-                        for episode in new_episodes.values():
-                            if episode.get('air_date'):
-                                episode_date = datetime.strptime(episode['air_date'], '%Y-%m-%d').date()
-                                if not latest_air_date or episode_date > latest_air_date:
-                                    latest_air_date = episode_date
-                        
-                        # Update show status based on latest episode
-                        if latest_air_date:
-                            days_since_latest = (today - latest_air_date).days
-                            
-                            if show['status'] == 'ongoing' and days_since_latest > 30:
-                                show['status'] = 'on_hold'
-                                status_changes.append({
-                                    'show': show['title'],
-                                    'from': 'ongoing',
-                                    'to': 'on_hold'
-                                })
-                            elif show['status'] == 'on_hold' and has_new_episodes:
-                                show['status'] = 'ongoing'
-                                status_changes.append({
-                                    'show': show['title'],
-                                    'from': 'on_hold',
-                                    'to': 'ongoing'
-                                })
-                        
-                        # Update episodes while preserving watch status
-                        if has_new_episodes:
-                            new_episodes_added = True
-                            show['seasons'] = new_seasons
-                            for season in show['seasons']:
-                                for ep in season['episodes']:
-                                    key = f"s{season['season_number']}e{ep['episode_number']}"
-                                    if key in current_episodes:
-                                        ep['watched'] = current_episodes[key]['watched']
-                                    else:
-                                        ep['watched'] = False
-                                        logger.info(f"Added new episode: {key} - {ep['name']}")
-                            # **Set the 'new_episodes' flag to True**
-                            show['new_episodes'] = True
-                        else:
-                            # **Ensure the 'new_episodes' flag is False if no new episodes**
-                            show['new_episodes'] = False
-        
-        if new_episodes_added or status_changes:
-            save_tv_shows(shows)
-        
-        logger.info(f"\nPull complete. New episodes added: {new_episodes_added}")
-        if status_changes:
-            logger.info("Status changes:")
-            for change in status_changes:
-                logger.info(f"- {change['show']}: {change['from']} -> {change['to']}")
-        logger.info('='*50)
-        
-        return jsonify({
-            'success': True, 
-            'new_episodes_added': new_episodes_added,
-            'status_changes': status_changes
-        })
+        job = bulk_importer.create(upload, fmt, kind=kind, watched=watched)
     except Exception as e:
-        logger.error(f"Error pulling new episodes: {str(e)}")
+        logger.error(f"Error storing import upload: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    bulk_importer.start(job)
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+@app.route('/api/imports/<job_id>', methods=['GET'])
+def get_import(job_id):
+    job = bulk_importer.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Import not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/imports/<job_id>/resume', methods=['POST'])
+def resume_import(job_id):
+    job = bulk_importer.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Import not found'}), 404
+    if not bulk_importer.start(job):
+        return jsonify({'success': False, 'error': f"Import is {job.state}", 'job': job.to_dict()}), 409
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+def encode_feed_cursor(episode):
+    key = [episode['show_title'], episode['season'], episode['episode']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_feed_cursor(cursor):
+    title, season, episode = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return str(title), int(season), int(episode)
 
 @app.route('/api/unwatched_episodes', methods=['GET'])
 def get_unwatched_episodes():
+    """Unwatched episodes of ongoing shows, sorted by show title, then season and episode number.
+
+    Optional query args: limit (page size; the response's next_cursor fetches
+    the next page via cursor) and since (ISO date, keeps episodes aired on or
+    after it). Responses carry an ETag of the library version, so polling
+    with If-None-Match costs a 304 while nothing changes.
+    """
     try:
-        shows = load_tv_shows()
-        unwatched_episodes = []
-        
-        for show in shows:
-            # Only include shows that are being watched
-            if show['status'] == 'ongoing':
-                show_episodes = []
-                for season in show.get('seasons', []):
-                    for episode in season.get('episodes', []):
-                        if not episode.get('watched', False):
-                            # Format the episode information
-                            episode_info = {
-                                'show_title': show['title'],
-                                'season': season['season_number'],
-                                'episode': episode['episode_number'],
-                                'title': episode['name'],
-                                'air_date': episode.get('air_date'),
-                                'poster': show.get('poster')  # Include show poster if available
-                            }
-                            show_episodes.append(episode_info)
-                
-                # Sort episodes by season and episode number
-                if show_episodes:
-                    show_episodes.sort(key=lambda x: (x['season'], x['episode']))
-                    unwatched_episodes.extend(show_episodes)
-        
-        # Sort all episodes by show title
-        unwatched_episodes.sort(key=lambda x: x['show_title'])
-        
-        return jsonify({
+        limit = request.args.get('limit', type=int)
+        since = request.args.get('since')
+        cursor = request.args.get('cursor')
+        if limit is not None and limit < 1:
+            return jsonify({'success': False, 'error': 'limit must be positive'}), 400
+        try:
+            after = decode_feed_cursor(cursor) if cursor else None
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+
+        etag = hashlib.sha1(repr((library.version(), limit, since, cursor)).encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        # One extra row tells us whether there is a next page
+        unwatched_episodes = library.unwatched_episodes(status='ongoing', after=after,
+                                                        limit=limit + 1 if limit else None, since=since)
+        next_cursor = None
+        if limit and len(unwatched_episodes) > limit:
+            unwatched_episodes = unwatched_episodes[:limit]
+            next_cursor = encode_feed_cursor(unwatched_episodes[-1])
+
+        response = jsonify({
             'success': True,
-            'unwatched_count': len(unwatched_episodes),
-            'episodes': unwatched_episodes
+            'unwatched_count': library.count_unwatched_episodes(status='ongoing', since=since),
+            'episodes': [dict(episode, poster=poster_url(episode.get('poster'), 'thumb'))
+                         for episode in unwatched_episodes],
+            'next_cursor': next_cursor
         })
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         logger.error(f"Error getting unwatched episodes: {str(e)}")
@@ -789,5 +1011,122 @@ def get_unwatched_episodes():
             'error': str(e)
         }), 500
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.counter('http_requests_total', 'Requests by route, method and status',
+                    ('route', 'method', 'status')).inc(route=route, method=request.method,
+                                                      status=response.status_code)
+    metrics.histogram('http_request_duration_seconds', 'Request handling time by route',
+                      ('route', 'method')).observe(elapsed, route=route, method=request.method)
+    if METRICS_TIMING_HEADER:
+        response.headers['Server-Timing'] = f"app;dur={elapsed * 1000:.1f}"
+    return response
+
+def collect_cache_metrics():
+    """Stats kept by the TMDB cache and the TV search, in metrics form"""
+    cache = tmdb_cache.get_stats()
+    search = tv_search.get_stats()
+    return [
+        ('tmdb_cache_hits_total', 'counter', 'TMDB response cache hits by layer',
+         [({'layer': 'memory'}, cache['memory_hits']), ({'layer': 'disk'}, cache['disk_hits'])]),
+        ('tmdb_cache_misses_total', 'counter', 'TMDB response cache misses', [({}, cache['misses'])]),
+        ('tmdb_cache_evictions_total', 'counter', 'TMDB responses evicted from memory',
+         [({}, cache['evictions'])]),
+        ('tmdb_cache_memory_entries', 'gauge', 'TMDB responses held in memory',
+         [({}, cache['memory_entries'])]),
+        ('tv_search_queries_total', 'counter', 'TV searches by how they were answered',
+         [({'answer': 'cache'}, search['hits']), ({'answer': 'prefix'}, search['prefix_hits']),
+          ({'answer': 'coalesced'}, search['coalesced']), ({'answer': 'tmdb'}, search['upstream'])]),
+    ]
+
+def collect_poster_metrics():
+    posters = poster_cache.get_stats()
+    return [
+        ('poster_cache_bytes', 'gauge', 'Bytes of poster images on disk, as of the last fetch',
+         [({}, posters['bytes'])]),
+        ('poster_cache_entries', 'gauge', 'Poster images on disk, as of the last fetch',
+         [({}, posters['entries'])]),
+        ('poster_cache_evictions_total', 'counter', 'Poster images deleted to stay under POSTER_CACHE_MAX_MB',
+         [({}, posters['evictions'])]),
+    ]
+
+metrics.add_collector(collect_cache_metrics)
+if poster_cache:
+    metrics.add_collector(collect_poster_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/tmdb_cache', methods=['GET'])
+def get_tmdb_cache_stats():
+    return jsonify({'success': True, 'stats': tmdb_cache.get_stats(), 'tv_search': tv_search.get_stats(),
+                    'index': tmdb_index.get_stats() if tmdb_index else None,
+                    'posters': poster_cache.get_stats() if poster_cache else None})
+
+@app.cli.command('import-json')
+def import_json_command():
+    """Import movies.json and tv_shows.json into the SQLite library (LIBRARY_DB_FILE)"""
+    target = SqliteLibrary(LIBRARY_DB_FILE)
+    source = JsonLibrary(movies_store, tv_shows_store, tv_episodes_store)
+    movies_added, shows_added = import_json_library(target, source.list_movies(),
+                                                    source.list_shows(with_episodes=True))
+    print(f"Imported {movies_added} movies and {shows_added} TV shows into {LIBRARY_DB_FILE}")
+
+@app.cli.command('import-watchlist')
+@click.argument('path', required=False)
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), help='Defaults to the file extension')
+@click.option('--kind', type=click.Choice(['movie', 'show']), help="For exports that don't say")
+@click.option('--watched/--unwatched', default=None, help='Override what the export says')
+@click.option('--resume', 'job_id', help='Carry on with an interrupted import')
+def import_watchlist_command(path, fmt, kind, watched, job_id):
+    """Import a watchlist export (Letterboxd/IMDb CSV, JSON or JSON lines) into the library"""
+    if job_id:
+        job = bulk_importer.get(job_id)
+        if not job:
+            raise click.ClickException(f"No import {job_id} in {IMPORT_DIR}")
+        if job.done:
+            raise click.ClickException(f"Import {job_id} already finished")
+    else:
+        if not path:
+            raise click.UsageError('Give the export to import, or --resume an import')
+        fmt = import_format(path, fmt)
+        if not fmt:
+            raise click.UsageError('Unknown file type; pass --format')
+        job = bulk_importer.create_from_path(path, fmt, kind=kind, watched=watched)
+        print(f"Import {job.id} (resume with --resume {job.id})")
+
+    def progress(job):
+        print(f"{job.offset}/{job.total} rows: {job.added} added, {job.duplicates} duplicates, "
+              f"{job.not_found} not found on TMDB")
+
+    bulk_importer.run(job, progress=progress)
+    print(f"Import {job.state}: {job.added} added, {job.duplicates} duplicates, "
+          f"{job.not_found} not found on TMDB, {job.failed} failed")
+    for error in job.errors:
+        print(f"  {error['title'] or '-'}: {error['error']}")
+
+@app.cli.command('ingest-tmdb-export')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--kind', type=click.Choice(TMDB_INDEX_KINDS), help='Defaults to what each row looks like')
+def ingest_tmdb_export_command(paths, kind):
+    """Add TMDB JSON-lines exports (optionally gzipped) to the local title index (TMDB_INDEX_FILE)"""
+    index = tmdb_index or TmdbIndex(TMDB_INDEX_FILE)
+    for path in paths:
+        count = index.ingest(path, kind=kind, progress=lambda count: print(f"{path}: {count} rows"))
+        print(f"Ingested {count} rows from {path}")
+    stats = index.get_stats()
+    print(f"{TMDB_INDEX_FILE} now has {stats.get('movie', 0)} movies and {stats.get('show', 0)} shows")
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
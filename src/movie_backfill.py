@@ -0,0 +1,114 @@
+import os
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def needs_enrichment(movie):
+    """Movies saved without TMDB metadata (legacy entries, or added while TMDB was down)"""
+    return (not movie.get('tmdb_checked')
+            and movie.get('overview') is None
+            and movie.get('release_date') is None
+            and movie.get('tmdb_rating') is None)
+
+
+class MovieBackfill:
+    """Fills in overview/release date/rating for movies stored without them.
+
+    Runs once per process on a background thread, `batch_size` movies at a
+    time with up to `concurrency` TMDB lookups in flight; each batch's
+    updates are written to the library together. `lookup(title)`
+    returns the details dict, None when TMDB has no match, or raises on
+    errors; movies that errored are left alone and retried on the next run.
+    With `lock_path`, processes sharing the library take turns through that
+    lock file, and a process that finds another one backfilling skips its run.
+    """
+
+    def __init__(self, library, lookup, batch_size=20, concurrency=4, lock_path=None):
+        self.library = library
+        self.lookup = lookup
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lock_path = lock_path
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the backfill (once per process); no-op when batch_size is 0."""
+        with self._lock:
+            if self.batch_size <= 0 or self._thread:
+                return
+            self._thread = threading.Thread(target=self.run, name='movie-backfill', daemon=True)
+        self._thread.start()
+
+    def _fetch(self, title):
+        try:
+            return title, self.lookup(title), None
+        except Exception as e:
+            return title, None, e
+
+    @contextmanager
+    def _run_lock(self):
+        """Yield whether this process may backfill; only one process does at a time"""
+        if fcntl is None or not self.lock_path:
+            yield True
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def run(self):
+        with self._run_lock() as allowed:
+            if not allowed:
+                logger.debug("Movie backfill already running in another process")
+                return
+            self._backfill()
+
+    def _backfill(self):
+        titles = [movie['title'] for movie in self.library.list_movies() if needs_enrichment(movie)]
+        if not titles:
+            return
+        logger.info(f"Backfilling TMDB details for {len(titles)} movies")
+        enriched = not_found = errors = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for start in range(0, len(titles), self.batch_size):
+                batch = titles[start:start + self.batch_size]
+                # All lookups first, so the library isn't locked while TMDB answers
+                results = list(pool.map(self._fetch, batch))
+                with self.library.batch():
+                    for title, details, error in results:
+                        if error:
+                            logger.error(f"Error backfilling movie {title}: {str(error)}")
+                            errors += 1
+                            continue
+                        fields = {'tmdb_checked': date.today().isoformat()}
+                        if details:
+                            fields.update({
+                                'overview': details.get('overview'),
+                                'release_date': details.get('release_date'),
+                                'tmdb_rating': details.get('rating')
+                            })
+                            movie = self.library.get_movie(title)
+                            if movie and not movie.get('poster') and details.get('poster'):
+                                fields['poster'] = details['poster']
+                            enriched += 1
+                        else:
+                            not_found += 1
+                        self.library.set_movie_fields(title, fields)
+        logger.info(f"Movie backfill done: {enriched} enriched, {not_found} not found, {errors} errors")
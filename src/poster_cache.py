@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+import logging
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from tmdb_client import TMDB_IMAGE_URL
+
+logger = logging.getLogger(__name__)
+
+# Sizes the page asks for, as TMDB image widths: list thumbnails, grid cards and the picked movie
+POSTER_SIZES = {'thumb': 'w92', 'card': 'w185', 'full': 'w342'}
+
+# TMDB image URLs as stored in the library and in search results
+FILE_NAME_PATTERN = re.compile(r'[A-Za-z0-9_-]+\.(?:jpg|jpeg|png|webp)')
+TMDB_IMAGE_PATTERN = re.compile(
+    re.escape(TMDB_IMAGE_URL) + r'/(?:w\d+|original)/(' + FILE_NAME_PATTERN.pattern + ')$'
+)
+
+
+def poster_file(url):
+    """TMDB file name of a poster URL (e.g. 'abc.jpg'), or None for other URLs"""
+    match = TMDB_IMAGE_PATTERN.match(url) if url else None
+    return match.group(1) if match else None
+
+
+def proxy_url(url, size):
+    """Our /posters URL for a TMDB poster URL; other URLs are returned unchanged"""
+    name = poster_file(url)
+    return f"/posters/{size}/{name}" if name else url
+
+
+class PosterCache:
+    """On-disk cache of TMDB poster images, one file per size and poster.
+
+    Each image is fetched from TMDB once, in the width POSTER_SIZES gives for
+    its size, so thumbnails are TMDB's own small renditions rather than
+    resized locally. Files are kept under `directory`/<size>/. Serving a file
+    bumps its mtime, and after every fetch the least recently served files are
+    deleted until the directory holds at most `max_bytes`. That check scans
+    the directory under a lock file, so the bound holds for all the processes
+    sharing it. Concurrent requests for an image that isn't cached yet share
+    one fetch.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, image_url=TMDB_IMAGE_URL, timeout=(3.05, 10),
+                 metrics=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.image_url = image_url
+        self.timeout = timeout
+        self.metrics = metrics
+        self.lock_path = os.path.join(directory, '.lock')
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        # key -> [lock, number of requests holding or waiting for it]
+        self._fetch_locks = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'not_found': 0}
+        # As of the last trim()
+        self._usage = {'entries': 0, 'bytes': 0}
+        for size in POSTER_SIZES:
+            os.makedirs(os.path.join(directory, size), exist_ok=True)
+        # POSTER_CACHE_MAX_MB may have been lowered since
+        self.trim()
+
+    def _path(self, key):
+        return os.path.join(self.directory, *key.split('/'))
+
+    @staticmethod
+    def etag(key, size):
+        # TMDB never changes the image behind a file name, so name and length identify the content
+        return f"{key.replace('/', '-')}-{size}"
+
+    def _count(self, result):
+        if self.metrics:
+            self.metrics.counter('poster_cache_lookups_total', 'Poster cache lookups by result',
+                                 ('result',)).inc(result=result)
+
+    def get(self, size, name):
+        """(open binary file, etag) of the cached image, fetching it first if needed.
+
+        None if TMDB has no such image. The caller closes the file; holding it
+        open keeps the image readable even if it is evicted meanwhile. Network
+        errors and other TMDB errors are raised.
+        """
+        if size not in POSTER_SIZES or not FILE_NAME_PATTERN.fullmatch(name):
+            return None
+        key = f"{size}/{name}"
+        found = self._open(key)
+        if found:
+            return found
+
+        with self._lock:
+            entry = self._fetch_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                # Someone (maybe another process) may have fetched it while we waited
+                found = self._open(key)
+                if found:
+                    return found
+                self._count('miss')
+                with self._lock:
+                    self.stats['misses'] += 1
+                return self._fetch(size, name, key)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                # Dropped only once nobody is queued on it, so there's never a second lock for the key
+                if not entry[1]:
+                    del self._fetch_locks[key]
+
+    def _open(self, key):
+        path = self._path(key)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            # Served now: most recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted just after we opened it; the open file still reads fine
+            pass
+        self._count('hit')
+        with self._lock:
+            self.stats['hits'] += 1
+        return file, self.etag(key, os.fstat(file.fileno()).st_size)
+
+    def _fetch(self, size, name, key):
+        url = f"{self.image_url}/{POSTER_SIZES[size]}/{name}"
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code == 404:
+            with self._lock:
+                self.stats['not_found'] += 1
+            return None
+        response.raise_for_status()
+
+        content = response.content
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+        file = open(path, 'rb')
+        logger.debug("Cached poster %s (%d bytes)", key, len(content))
+        self.trim()
+        return file, self.etag(key, len(content))
+
+    @contextmanager
+    def _dir_lock(self):
+        if fcntl is None:
+            # No flock (Windows): other processes may trim at the same time, which only deletes more
+            yield
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def trim(self):
+        """Delete the least recently served files until the directory is within max_bytes"""
+        with self._dir_lock():
+            files = []
+            for size in POSTER_SIZES:
+                for entry in os.scandir(os.path.join(self.directory, size)):
+                    if entry.is_file() and FILE_NAME_PATTERN.fullmatch(entry.name):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        files.append((stat.st_mtime, entry.path, stat.st_size))
+            files.sort()
+            total = sum(length for _, _, length in files)
+            evicted = 0
+            # The newest file stays, even on its own over the bound
+            for _, path, length in files[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= length
+                evicted += 1
+        with self._lock:
+            self.stats['evictions'] += evicted
+            self._usage = {'entries': len(files) - evicted, 'bytes': total}
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, **self._usage, max_bytes=self.max_bytes)
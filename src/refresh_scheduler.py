@@ -0,0 +1,122 @@
+import itertools
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshJob:
+    """Progress and outcome of one episode refresh run"""
+
+    def __init__(self, job_id, trigger, force=False):
+        self.id = job_id
+        self.trigger = trigger
+        self.force = force
+        self.state = 'queued'
+        self.total = 0
+        self.checked = 0
+        self.skipped = 0
+        self.new_episodes_added = False
+        self.status_changes = []
+        self.errors = []
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._started = None
+        self._finished = None
+
+    @property
+    def done(self):
+        return self.state in ('finished', 'failed')
+
+    def to_dict(self):
+        if self._started is None:
+            duration = None
+        else:
+            duration = round((self._finished or time.monotonic()) - self._started, 3)
+        return {
+            'id': self.id,
+            'trigger': self.trigger,
+            'state': self.state,
+            'total': self.total,
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'new_episodes_added': self.new_episodes_added,
+            'status_changes': self.status_changes,
+            'errors': self.errors,
+            'created_at': self.created_at.isoformat(timespec='seconds'),
+            'started_at': self.started_at.isoformat(timespec='seconds') if self.started_at else None,
+            'finished_at': self.finished_at.isoformat(timespec='seconds') if self.finished_at else None,
+            'duration': duration
+        }
+
+
+class RefreshScheduler:
+    """Runs the episode refresh in the background, on demand and on an interval.
+
+    `run` is called with a RefreshJob and fills in its progress. Only one job
+    runs at a time; triggering while one is running returns the running job.
+    An interval of 0 disables the periodic runs (manual triggers still work).
+    """
+
+    def __init__(self, run, interval_minutes=0, history=20):
+        self.run = run
+        self.interval = interval_minutes * 60
+        self.history = history
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._current = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def trigger(self, trigger='manual', force=False):
+        with self._lock:
+            if self._current and not self._current.done:
+                return self._current
+            job = RefreshJob(next(self._ids), trigger, force=force)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+            self._current = job
+        threading.Thread(target=self._execute, args=(job,), name=f"refresh-job-{job.id}", daemon=True).start()
+        return job
+
+    def _execute(self, job):
+        job.state = 'running'
+        job.started_at = datetime.now()
+        job._started = time.monotonic()
+        try:
+            self.run(job)
+            job.state = 'finished'
+        except Exception as e:
+            logger.error(f"Refresh job {job.id} failed: {str(e)}")
+            job.errors.append({'show': None, 'error': str(e)})
+            job.state = 'failed'
+        finally:
+            job._finished = time.monotonic()
+            job.finished_at = datetime.now()
+            logger.info(f"Refresh job {job.id} {job.state}: checked {job.checked}, skipped {job.skipped}, "
+                        f"{len(job.errors)} errors in {job.to_dict()['duration']}s")
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def latest(self):
+        return next(reversed(self._jobs.values()), None)
+
+    def start(self):
+        """Start the periodic loop (once per process); no-op when the interval is 0."""
+        with self._lock:
+            if self.interval <= 0 or self._thread:
+                return
+            self._thread = threading.Thread(target=self._loop, name='refresh-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Episode refresh scheduled every {self.interval // 60} minutes")
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.trigger('scheduled')
@@ -0,0 +1,608 @@
+import json
+import random
+import sqlite3
+import time
+import threading
+from contextlib import contextmanager
+
+from library_index import title_key, rating_weight
+from library_store import VersionConflict
+from title_index import TitleIndex
+
+# Append at position n + 1
+UNWATCHED_ADD = """
+INSERT INTO unwatched_movies (pos, movie_id)
+VALUES (COALESCE((SELECT MAX(pos) FROM unwatched_movies), 0) + 1, NEW.id);
+"""
+# Move the movie at the last position into the freed one (flipping the freed position's
+# sign first, so the two don't collide), then drop the row
+UNWATCHED_REMOVE = """
+UPDATE unwatched_movies SET pos = -pos WHERE movie_id = OLD.id;
+UPDATE unwatched_movies SET pos = -(SELECT pos FROM unwatched_movies WHERE movie_id = OLD.id)
+WHERE pos = (SELECT MAX(pos) FROM unwatched_movies)
+AND pos > -(SELECT pos FROM unwatched_movies WHERE movie_id = OLD.id);
+DELETE FROM unwatched_movies WHERE movie_id = OLD.id;
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL UNIQUE,
+    title_key TEXT NOT NULL,
+    watched INTEGER NOT NULL DEFAULT 0,
+    rating INTEGER NOT NULL DEFAULT 0,
+    poster TEXT,
+    overview TEXT,
+    release_date TEXT,
+    tmdb_rating REAL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS movies_title_key ON movies (title_key);
+CREATE INDEX IF NOT EXISTS movies_watched ON movies (watched);
+CREATE INDEX IF NOT EXISTS movies_unwatched_rating ON movies (watched, tmdb_rating);
+
+-- Unwatched movies at dense positions 1..n, kept by the triggers below, for O(log n) random picks
+CREATE TABLE IF NOT EXISTS unwatched_movies (
+    pos INTEGER PRIMARY KEY,
+    movie_id INTEGER NOT NULL UNIQUE
+);
+CREATE TRIGGER IF NOT EXISTS movies_insert_unwatched AFTER INSERT ON movies WHEN NEW.watched = 0
+BEGIN {add} END;
+CREATE TRIGGER IF NOT EXISTS movies_unwatch AFTER UPDATE OF watched ON movies
+WHEN OLD.watched != 0 AND NEW.watched = 0
+BEGIN {add} END;
+CREATE TRIGGER IF NOT EXISTS movies_watch AFTER UPDATE OF watched ON movies
+WHEN OLD.watched = 0 AND NEW.watched != 0
+BEGIN {remove} END;
+CREATE TRIGGER IF NOT EXISTS movies_delete_unwatched AFTER DELETE ON movies WHEN OLD.watched = 0
+BEGIN {remove} END;
+
+CREATE TABLE IF NOT EXISTS shows (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL UNIQUE,
+    title_key TEXT NOT NULL,
+    tmdb_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'to_watch',
+    rating INTEGER NOT NULL DEFAULT 0,
+    overview TEXT,
+    poster TEXT,
+    year TEXT,
+    tmdb_rating REAL,
+    new_episodes INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS shows_title_key ON shows (title_key);
+CREATE INDEX IF NOT EXISTS shows_tmdb_id ON shows (tmdb_id);
+CREATE INDEX IF NOT EXISTS shows_status ON shows (status);
+
+CREATE TABLE IF NOT EXISTS episodes (
+    show_id INTEGER NOT NULL REFERENCES shows (id) ON DELETE CASCADE,
+    season_number INTEGER NOT NULL,
+    episode_number INTEGER NOT NULL,
+    name TEXT,
+    overview TEXT,
+    air_date TEXT,
+    watched INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (show_id, season_number, episode_number)
+);
+CREATE INDEX IF NOT EXISTS episodes_unwatched ON episodes (show_id, watched);
+
+-- Bumped by triggers on every change, for cheap ETags across processes
+CREATE TABLE IF NOT EXISTS library_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO library_version (id, version) VALUES (1, 0);
+""".replace('{add}', UNWATCHED_ADD).replace('{remove}', UNWATCHED_REMOVE) + "".join(
+    f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table} "
+    "BEGIN UPDATE library_version SET version = version + 1; END;\n"
+    for table in ('movies', 'shows', 'episodes')
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+) + """
+-- Bumped only when titles are added, removed or renamed, so title indexes survive other writes
+CREATE TABLE IF NOT EXISTS title_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO title_versions (name, version) VALUES ('movies', 0), ('shows', 0);
+""" + "".join(
+    f"CREATE TRIGGER IF NOT EXISTS {table}_{name}_title_version AFTER {event} ON {table} "
+    f"BEGIN UPDATE title_versions SET version = version + 1 WHERE name = '{table}'; END;\n"
+    for table in ('movies', 'shows')
+    for name, event in (('insert', 'INSERT'), ('delete', 'DELETE'), ('rename', 'UPDATE OF title'))
+)
+
+MOVIE_COLUMNS = ('title', 'watched', 'rating', 'poster', 'overview', 'release_date', 'tmdb_rating')
+SHOW_COLUMNS = ('title', 'status', 'rating', 'overview', 'poster', 'year', 'tmdb_id',
+                'tmdb_rating', 'new_episodes')
+BOOLEAN_COLUMNS = {'watched', 'new_episodes'}
+
+
+def _row_to_dict(row, columns):
+    item = {}
+    for column in columns:
+        value = row[column]
+        if column in BOOLEAN_COLUMNS and value is not None:
+            value = bool(value)
+        item[column] = value
+    # Keys we have no column for are kept as JSON so nothing is lost on import
+    if row['extra']:
+        item.update(json.loads(row['extra']))
+    return item
+
+
+def _split_fields(item, columns):
+    values = {column: item.get(column) for column in columns if column in item}
+    extra = {key: value for key, value in item.items() if key not in columns and key != 'seasons'}
+    return values, (json.dumps(extra) if extra else None)
+
+
+class SqliteLibrary:
+    """Library backend on a SQLite database.
+
+    Every route maps to one or two indexed queries instead of loading the
+    whole library. Shows are returned in the same shape as tv_shows.json,
+    with seasons rebuilt from the episodes table. Write transactions are
+    timed in `metrics` (a metrics.Registry) when given.
+    """
+
+    def __init__(self, path, metrics=None):
+        self.path = path
+        self.metrics = metrics
+        self._local = threading.local()
+        # table -> (title version, TitleIndex of its titles)
+        self._title_indexes = {}
+        self._title_index_lock = threading.Lock()
+        with self._write() as conn:
+            conn.executescript(SCHEMA)
+            self._fill_unwatched_movies(conn)
+
+    @staticmethod
+    def _fill_unwatched_movies(conn):
+        # Databases from before unwatched_movies existed: the triggers only track changes
+        listed = conn.execute('SELECT COUNT(*) FROM unwatched_movies').fetchone()[0]
+        if listed != conn.execute('SELECT COUNT(*) FROM movies WHERE watched = 0').fetchone()[0]:
+            conn.execute('DELETE FROM unwatched_movies')
+            conn.execute('INSERT INTO unwatched_movies (pos, movie_id) '
+                         'SELECT ROW_NUMBER() OVER (ORDER BY id), id FROM movies WHERE watched = 0')
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Connection for a write; commits on exit unless a batch() is open"""
+        conn = self._conn()
+        if getattr(self._local, 'batching', False):
+            yield conn
+            return
+        started = time.perf_counter()
+        with conn:
+            yield conn
+        self._record_write(started)
+
+    def _record_write(self, started):
+        if self.metrics:
+            self.metrics.histogram('library_write_seconds', 'Library write transactions, commit included',
+                                   ('store',)).observe(time.perf_counter() - started, store='sqlite')
+
+    @contextmanager
+    def batch(self, expected_version=None):
+        """Run the writes made inside the block as one transaction, rolled back if it raises.
+
+        With expected_version, raises VersionConflict up front if the library
+        has moved on since.
+        """
+        if getattr(self._local, 'batching', False):
+            yield
+            return
+        conn = self._conn()
+        started = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.batching = True
+        try:
+            current = self.version()
+            if expected_version is not None and str(expected_version) != str(current):
+                raise VersionConflict(expected_version, current)
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+            self._record_write(started)
+        finally:
+            self._local.batching = False
+
+    def version(self):
+        """Changes whenever anything in the library changes (used for ETags)"""
+        return self._conn().execute('SELECT version FROM library_version').fetchone()[0]
+
+    def _title_index(self, table):
+        """TitleIndex over a table's titles, rebuilt when a title was added, removed or renamed"""
+        version = self._conn().execute('SELECT version FROM title_versions WHERE name = ?',
+                                       (table,)).fetchone()[0]
+        with self._title_index_lock:
+            cached = self._title_indexes.get(table)
+            if cached and cached[0] == version:
+                return cached[1]
+            index = TitleIndex(row[0] for row in self._conn().execute(f'SELECT title FROM {table}'))
+            self._title_indexes[table] = (version, index)
+            return index
+
+    # Movies
+
+    def list_movies(self, watched=None, offset=0, limit=None):
+        page = (-1 if limit is None else limit, offset)
+        if watched is None:
+            rows = self._conn().execute('SELECT * FROM movies ORDER BY id LIMIT ? OFFSET ?', page)
+        else:
+            rows = self._conn().execute('SELECT * FROM movies WHERE watched = ? ORDER BY id LIMIT ? OFFSET ?',
+                                        (int(watched), *page))
+        return [_row_to_dict(row, MOVIE_COLUMNS) for row in rows]
+
+    def count_movies(self, watched=None):
+        if watched is None:
+            return self._conn().execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+        return self._conn().execute('SELECT COUNT(*) FROM movies WHERE watched = ?',
+                                    (int(watched),)).fetchone()[0]
+
+    def _one_movie(self, sql, params):
+        row = self._conn().execute(sql, params).fetchone()
+        return _row_to_dict(row, MOVIE_COLUMNS) if row else None
+
+    def get_movie(self, title):
+        return self._one_movie('SELECT * FROM movies WHERE title = ?', (title,))
+
+    def find_movie(self, title):
+        return self._one_movie('SELECT * FROM movies WHERE title_key = ? ORDER BY id LIMIT 1', (title_key(title),))
+
+    def similar_movies(self, title, limit=5):
+        """[(movie, score)] with titles close to `title`, best first; 1.0 is a normalized duplicate"""
+        matches = ((self.get_movie(match), score) for match, score in self._title_index('movies').similar(title, limit))
+        return [(movie, score) for movie, score in matches if movie]
+
+    def search_movies(self, query, limit=10):
+        movies = (self.get_movie(match) for match in self._title_index('movies').search(query, limit))
+        return [movie for movie in movies if movie]
+
+    def random_unwatched_movie(self, weight=None):
+        """Uniform pick, or weighted by TMDB rating with weight='rating'.
+
+        A uniform pick is one lookup of a random position in unwatched_movies.
+        Weighted picks accept a uniform pick with probability weight / the
+        largest weight (read off the movies_unwatched_rating index) and try
+        again otherwise, which picks in proportion to weight; with TMDB
+        ratings that takes one or two tries on average.
+        """
+        conn = self._conn()
+        if weight != 'rating':
+            return self._random_unwatched(conn)
+        top = conn.execute('SELECT MAX(tmdb_rating) FROM movies WHERE watched = 0').fetchone()[0]
+        # Movies without a rating weigh 5 (see rating_weight)
+        bound = max(rating_weight({'tmdb_rating': top}), 5.0)
+        while True:
+            movie = self._random_unwatched(conn)
+            if movie is None or random.random() * bound < rating_weight(movie):
+                return movie
+
+    def _random_unwatched(self, conn):
+        while True:
+            count = conn.execute('SELECT MAX(pos) FROM unwatched_movies').fetchone()[0]
+            if not count:
+                return None
+            movie = self._one_movie('SELECT m.* FROM unwatched_movies u JOIN movies m ON m.id = u.movie_id '
+                                    'WHERE u.pos = ?', (random.randrange(count) + 1,))
+            # None only if another writer shrank the list in between
+            if movie:
+                return movie
+
+    def add_movie(self, movie):
+        if self.find_movie(movie['title']):
+            return False
+        values, extra = _split_fields(movie, MOVIE_COLUMNS)
+        values['watched'] = int(bool(values.get('watched')))
+        values.setdefault('rating', 0)
+        values['title_key'] = title_key(movie['title'])
+        values['extra'] = extra
+        columns = ', '.join(values)
+        placeholders = ', '.join('?' for _ in values)
+        with self._write() as conn:
+            cursor = conn.execute(f'INSERT OR IGNORE INTO movies ({columns}) VALUES ({placeholders})',
+                                  tuple(values.values()))
+        return cursor.rowcount > 0
+
+    def set_movie_watched(self, title, watched=True):
+        with self._write() as conn:
+            cursor = conn.execute('UPDATE movies SET watched = ? WHERE title = ?', (int(watched), title))
+        return cursor.rowcount > 0
+
+    def set_movie_rating(self, title, rating):
+        with self._write() as conn:
+            cursor = conn.execute('UPDATE movies SET rating = ? WHERE title = ?', (rating, title))
+        return cursor.rowcount > 0
+
+    def set_movie_fields(self, title, fields):
+        return self._set_fields('movies', MOVIE_COLUMNS, title, fields)
+
+    def _set_fields(self, table, columns, title, fields):
+        """Update known columns in place and merge anything else into `extra`"""
+        with self._write() as conn:
+            row = conn.execute(f'SELECT id, extra FROM {table} WHERE title = ?', (title,)).fetchone()
+            if not row:
+                return False
+            values, extra = _split_fields(fields, columns)
+            if extra:
+                merged = json.loads(row['extra']) if row['extra'] else {}
+                merged.update(json.loads(extra))
+                values['extra'] = json.dumps(merged)
+            for column in BOOLEAN_COLUMNS & values.keys():
+                if values[column] is not None:
+                    values[column] = int(values[column])
+            if values:
+                assignments = ', '.join(f'{column} = ?' for column in values)
+                conn.execute(f'UPDATE {table} SET {assignments} WHERE id = ?', (*values.values(), row['id']))
+        return True
+
+    # TV shows
+
+    def _load_seasons(self, show_ids):
+        """Rebuild the seasons/episodes structure for the given show ids in one query"""
+        seasons_by_show = {show_id: [] for show_id in show_ids}
+        if not show_ids:
+            return seasons_by_show
+        rows = []
+        # Chunked to stay under SQLite's bound-parameter limit on big libraries
+        for i in range(0, len(show_ids), 500):
+            chunk = show_ids[i:i + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows.extend(self._conn().execute(
+                f'SELECT * FROM episodes WHERE show_id IN ({placeholders}) '
+                'ORDER BY show_id, season_number, episode_number',
+                tuple(chunk)
+            ))
+        for row in rows:
+            seasons = seasons_by_show[row['show_id']]
+            if not seasons or seasons[-1]['season_number'] != row['season_number']:
+                seasons.append({'season_number': row['season_number'], 'episode_count': 0, 'episodes': []})
+            seasons[-1]['episodes'].append({
+                'episode_number': row['episode_number'],
+                'name': row['name'],
+                'overview': row['overview'],
+                'air_date': row['air_date'],
+                'watched': bool(row['watched'])
+            })
+            seasons[-1]['episode_count'] += 1
+        return seasons_by_show
+
+    def _shows(self, sql, params=(), with_episodes=False):
+        rows = self._conn().execute(sql, params).fetchall()
+        if not with_episodes:
+            return [_row_to_dict(row, SHOW_COLUMNS) for row in rows]
+        seasons_by_show = self._load_seasons([row['id'] for row in rows])
+        shows = []
+        for row in rows:
+            show = _row_to_dict(row, SHOW_COLUMNS)
+            show['seasons'] = seasons_by_show[row['id']]
+            shows.append(show)
+        return shows
+
+    def _one_show(self, sql, params, with_episodes=False):
+        shows = self._shows(sql + ' ORDER BY id LIMIT 1', params, with_episodes=with_episodes)
+        return shows[0] if shows else None
+
+    def _show_id(self, conn, title):
+        row = conn.execute('SELECT id FROM shows WHERE title = ?', (title,)).fetchone()
+        return row['id'] if row else None
+
+    def list_shows(self, status=None, with_episodes=False):
+        if status is None:
+            return self._shows('SELECT * FROM shows ORDER BY id', with_episodes=with_episodes)
+        statuses = (status,) if isinstance(status, str) else tuple(status)
+        placeholders = ', '.join('?' for _ in statuses)
+        return self._shows(f'SELECT * FROM shows WHERE status IN ({placeholders}) ORDER BY id', statuses,
+                           with_episodes=with_episodes)
+
+    def get_show(self, title, with_episodes=False):
+        return self._one_show('SELECT * FROM shows WHERE title = ?', (title,), with_episodes=with_episodes)
+
+    def find_show(self, title):
+        return self._one_show('SELECT * FROM shows WHERE title_key = ?', (title_key(title),))
+
+    def similar_shows(self, title, limit=5):
+        matches = ((self.get_show(match), score) for match, score in self._title_index('shows').similar(title, limit))
+        return [(show, score) for show, score in matches if show]
+
+    def search_shows(self, query, limit=10):
+        """Shows matching a search box query, best first"""
+        shows = (self.get_show(match) for match in self._title_index('shows').search(query, limit))
+        return [show for show in shows if show]
+
+    def find_show_by_tmdb_id(self, tmdb_id):
+        try:
+            tmdb_id = int(tmdb_id)
+        except (TypeError, ValueError):
+            return None
+        return self._one_show('SELECT * FROM shows WHERE tmdb_id = ?', (tmdb_id,))
+
+    def has_episodes(self, title):
+        row = self._conn().execute(
+            'SELECT EXISTS (SELECT 1 FROM episodes e JOIN shows s ON s.id = e.show_id WHERE s.title = ?)',
+            (title,)
+        ).fetchone()
+        return bool(row[0])
+
+    def all_episodes_watched(self, title):
+        row = self._conn().execute(
+            'SELECT id, NOT EXISTS (SELECT 1 FROM episodes WHERE show_id = shows.id AND watched = 0) '
+            'FROM shows WHERE title = ?',
+            (title,)
+        ).fetchone()
+        return bool(row and row[1])
+
+    def latest_season(self, title):
+        """Highest stored season number, or None"""
+        return self._conn().execute(
+            'SELECT MAX(e.season_number) FROM episodes e JOIN shows s ON s.id = e.show_id WHERE s.title = ?',
+            (title,)
+        ).fetchone()[0]
+
+    def episode_states(self, title, from_season=None):
+        """{(season_number, episode_number): watched} for every stored episode (from from_season on)"""
+        rows = self._conn().execute(
+            'SELECT e.season_number, e.episode_number, e.watched FROM episodes e '
+            'JOIN shows s ON s.id = e.show_id WHERE s.title = ? AND e.season_number >= ?',
+            (title, from_season or 0)
+        )
+        return {(row[0], row[1]): bool(row[2]) for row in rows}
+
+    def unwatched_episodes(self, status='ongoing', after=None, limit=None, since=None):
+        """Unwatched episodes ordered by show title, season and episode.
+
+        `after` is the (show title, season, episode) key of the last episode
+        already seen, `limit` caps the page and `since` keeps episodes that
+        aired on or after that ISO date.
+        """
+        sql = ('SELECT s.title AS show_title, s.poster, e.season_number, e.episode_number, e.name, e.air_date '
+               'FROM episodes e JOIN shows s ON s.id = e.show_id '
+               'WHERE s.status = ? AND e.watched = 0')
+        params = [status]
+        if after:
+            sql += ' AND (s.title, e.season_number, e.episode_number) > (?, ?, ?)'
+            params.extend(after)
+        if since:
+            sql += ' AND e.air_date >= ?'
+            params.append(since)
+        sql += ' ORDER BY s.title, e.season_number, e.episode_number'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        rows = self._conn().execute(sql, params)
+        return [{
+            'show_title': row['show_title'],
+            'season': row['season_number'],
+            'episode': row['episode_number'],
+            'title': row['name'],
+            'air_date': row['air_date'],
+            'poster': row['poster']
+        } for row in rows]
+
+    def count_unwatched_episodes(self, status='ongoing', since=None):
+        sql = ('SELECT COUNT(*) FROM episodes e JOIN shows s ON s.id = e.show_id '
+               'WHERE s.status = ? AND e.watched = 0')
+        params = [status]
+        if since:
+            sql += ' AND e.air_date >= ?'
+            params.append(since)
+        return self._conn().execute(sql, params).fetchone()[0]
+
+    def _insert_episodes(self, conn, show_id, seasons, keep_existing=False):
+        conn.executemany(
+            f"INSERT OR {'IGNORE' if keep_existing else 'REPLACE'} INTO episodes "
+            '(show_id, season_number, episode_number, name, overview, air_date, watched) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (show_id, season['season_number'], ep['episode_number'], ep.get('name'),
+                 ep.get('overview'), ep.get('air_date'), int(bool(ep.get('watched'))))
+                for season in seasons or []
+                for ep in season.get('episodes', [])
+            ]
+        )
+
+    def add_show(self, show):
+        values, extra = _split_fields(show, SHOW_COLUMNS)
+        values['title_key'] = title_key(show['title'])
+        values['extra'] = extra
+        for column in BOOLEAN_COLUMNS & values.keys():
+            if values[column] is not None:
+                values[column] = int(values[column])
+        columns = ', '.join(values)
+        placeholders = ', '.join('?' for _ in values)
+        with self._write() as conn:
+            cursor = conn.execute(f'INSERT OR IGNORE INTO shows ({columns}) VALUES ({placeholders})',
+                                  tuple(values.values()))
+            if not cursor.rowcount:
+                return False
+            self._insert_episodes(conn, cursor.lastrowid, show.get('seasons'))
+        return True
+
+    def delete_show(self, title):
+        with self._write() as conn:
+            cursor = conn.execute('DELETE FROM shows WHERE title = ?', (title,))
+        return cursor.rowcount > 0
+
+    def set_show_rating(self, title, rating):
+        return self.set_show_fields(title, {'rating': rating})
+
+    def set_show_status(self, title, status):
+        return self.set_show_fields(title, {'status': status})
+
+    def set_show_fields(self, title, fields):
+        return self._set_fields('shows', SHOW_COLUMNS, title, fields)
+
+    def replace_seasons(self, title, seasons):
+        with self._write() as conn:
+            show_id = self._show_id(conn, title)
+            if show_id is None:
+                return False
+            conn.execute('DELETE FROM episodes WHERE show_id = ?', (show_id,))
+            self._insert_episodes(conn, show_id, seasons)
+        return True
+
+    def add_episodes(self, title, seasons):
+        """Store episodes the show doesn't have yet; stored episodes are left as they are"""
+        with self._write() as conn:
+            show_id = self._show_id(conn, title)
+            if show_id is None:
+                return False
+            self._insert_episodes(conn, show_id, seasons, keep_existing=True)
+        return True
+
+    def set_episode_watched(self, title, season, episode, watched):
+        with self._write() as conn:
+            cursor = conn.execute(
+                'UPDATE episodes SET watched = ? '
+                'WHERE show_id = (SELECT id FROM shows WHERE title = ?) '
+                'AND season_number = ? AND episode_number = ?',
+                (int(watched), title, season, episode)
+            )
+        return cursor.rowcount > 0
+
+    def set_episodes_watched_through(self, title, season, episode, watched):
+        """Mark every episode up to and including S{season}E{episode}"""
+        with self._write() as conn:
+            cursor = conn.execute(
+                'UPDATE episodes SET watched = ? '
+                'WHERE show_id = (SELECT id FROM shows WHERE title = ?) '
+                'AND (season_number < ? OR (season_number = ? AND episode_number <= ?))',
+                (int(watched), title, season, season, episode)
+            )
+        return cursor.rowcount > 0
+
+    def set_all_episodes_watched(self, title, watched):
+        with self._write() as conn:
+            show_id = self._show_id(conn, title)
+            if show_id is None:
+                return False
+            conn.execute('UPDATE episodes SET watched = ? WHERE show_id = ?', (int(watched), show_id))
+        return True
+
+
+def import_json_library(library, movies, shows):
+    """One-shot import of the JSON movies/TV shows lists into a SqliteLibrary.
+
+    Entries whose title is already in the database are skipped, so running
+    it twice is harmless. Returns (movies_added, shows_added).
+    """
+    movies_added = sum(1 for movie in movies if library.add_movie(dict(movie)))
+    shows_added = sum(1 for show in shows if library.add_show(dict(show)))
+    return movies_added, shows_added
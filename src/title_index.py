@@ -0,0 +1,110 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+# Dropped when comparing titles: "The Lord of the Rings" matches "Lord of Rings"
+ARTICLES = {'a', 'an', 'the'}
+
+
+def normalize_title(title):
+    """Comparison form of a title: no case, accents, punctuation or articles"""
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(char for char in title if not unicodedata.combining(char))
+    title = title.lower().replace('&', ' and ')
+    words = re.findall(r'[^\W_]+', title)
+    return ' '.join(word for word in words if word not in ARTICLES)
+
+
+def trigrams(normalized):
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _numbers(normalized):
+    return {word for word in normalized.split() if word.isdigit()}
+
+
+class TitleIndex:
+    """Normalized-title lookups over a collection of titles.
+
+    Exact matches on the normalized form are a dict lookup. Fuzzy matches
+    come from a trigram inverted index: only titles sharing a trigram with
+    the query are scored (Dice coefficient of the trigram sets), so a lookup
+    costs about the number of similar titles, not the library size.
+    """
+
+    def __init__(self, titles=()):
+        self._normalized = {}
+        self._by_normalized = {}
+        self._postings = defaultdict(set)
+        for title in titles:
+            self.add(title)
+
+    def __len__(self):
+        return len(self._normalized)
+
+    def add(self, title):
+        if title in self._normalized:
+            return
+        normalized = normalize_title(title)
+        self._normalized[title] = (normalized, len(trigrams(normalized)))
+        self._by_normalized.setdefault(normalized, title)
+        for gram in trigrams(normalized):
+            self._postings[gram].add(title)
+
+    def exact(self, title):
+        """Stored title whose normalized form equals title's, or None"""
+        return self._by_normalized.get(normalize_title(title))
+
+    def _scores(self, normalized):
+        grams = trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        for title, count in shared.items():
+            yield title, 2 * count / (len(grams) + self._normalized[title][1])
+
+    def similar(self, title, limit=5, threshold=0.6):
+        """[(stored title, score)] best first; 1.0 means the same normalized title.
+
+        Titles numbered differently ("Toy Story 2" / "Toy Story 3") never
+        match, so sequels aren't reported as duplicates.
+        """
+        normalized = normalize_title(title)
+        if not normalized:
+            return []
+        numbers = _numbers(normalized)
+        matches = []
+        for stored, score in self._scores(normalized):
+            stored_normalized = self._normalized[stored][0]
+            if stored_normalized == normalized:
+                score = 1.0
+            elif score < threshold or _numbers(stored_normalized) != numbers:
+                continue
+            matches.append((stored, score))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit]
+
+    def search(self, query, limit=10, threshold=0.3):
+        """Stored titles for a search box: those starting with the query first,
+        then those containing it, then the closest fuzzy matches."""
+        normalized = normalize_title(query)
+        if not normalized:
+            return []
+        if len(normalized) < 3:
+            # Too short for trigrams to say much; look at every title
+            candidates = ((title, 0.0) for title in self._normalized)
+        else:
+            candidates = self._scores(normalized)
+        matches = []
+        for stored, score in candidates:
+            stored_normalized = self._normalized[stored][0]
+            if stored_normalized.startswith(normalized):
+                score = 2.0 + score
+            elif normalized in stored_normalized:
+                score = 1.0 + score
+            elif score < threshold:
+                continue
+            matches.append((stored, score))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return [title for title, _ in matches[:limit]]
@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TmdbCache:
+    """Two-tier cache for TMDB JSON responses.
+
+    An in-memory LRU of `memory_entries` items sits in front of a SQLite file
+    that survives restarts. Every entry carries its own expiry, so callers
+    can pick a TTL per endpoint. The disk tier is trimmed back to
+    `disk_entries` rows, least recently used first.
+    """
+
+    def __init__(self, path, memory_entries=1000, disk_entries=20000):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        try:
+            self._conn().execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._conn().execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+            self._conn().commit()
+        except sqlite3.Error as e:
+            # Fall back to memory only rather than failing every TMDB call
+            logger.error(f"TMDB cache file unavailable, caching in memory only: {str(e)}")
+            self.path = None
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(url, params=None):
+        return url + '?' + json.dumps(params or {}, sort_keys=True, default=str)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        if self.path:
+            try:
+                conn = self._conn()
+                row = conn.execute('SELECT value, expires FROM responses WHERE key = ?', (key,)).fetchone()
+                if row and row[1] > now:
+                    conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+                    conn.commit()
+                    value = json.loads(row[0])
+                    with self._lock:
+                        self.stats['disk_hits'] += 1
+                        self._remember(key, value, row[1])
+                    return value
+            except sqlite3.Error as e:
+                logger.error(f"Error reading TMDB cache: {str(e)}")
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def _remember(self, key, value, expires):
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        now = time.time()
+        expires = now + ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            self.stats['stores'] += 1
+            self._writes += 1
+            trim = self._writes % 100 == 0
+
+        if self.path:
+            try:
+                conn = self._conn()
+                conn.execute('INSERT OR REPLACE INTO responses (key, value, expires, last_used) VALUES (?, ?, ?, ?)',
+                             (key, json.dumps(value), expires, now))
+                if trim:
+                    self._trim(conn, now)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing TMDB cache: {str(e)}")
+
+    def _trim(self, conn, now):
+        # Drop expired rows, then the least recently used ones beyond the size cap
+        conn.execute('DELETE FROM responses WHERE expires <= ?', (now,))
+        conn.execute(
+            'DELETE FROM responses WHERE key IN ('
+            'SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (self.disk_entries,)
+        )
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else None
+        return stats
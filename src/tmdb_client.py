@@ -0,0 +1,364 @@
+import os
+import re
+import time
+import logging
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Overridable so benchmarks can point the clients at a local stub
+TMDB_API_URL = os.getenv('TMDB_API_URL', "https://api.themoviedb.org/3")
+TMDB_IMAGE_URL = "https://image.tmdb.org/t/p"
+
+# Status codes worth another attempt: rate limited or a TMDB/edge hiccup
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _season_finished(season_data, today):
+    episodes = season_data.get('episodes') or []
+    return bool(episodes) and all(ep.get('air_date') and ep['air_date'] <= today for ep in episodes)
+
+
+def _retry_after(response):
+    """Seconds asked for by a Retry-After header (delta or HTTP date), or None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_season(season, season_data, today):
+    """Turn a TMDB season payload into our season object, keeping only aired episodes"""
+    if 'episodes' not in season_data:
+        return None
+    episodes = []
+    for ep in season_data['episodes']:
+        air_date = ep.get('air_date')
+        if air_date:
+            episode_date = datetime.strptime(air_date, '%Y-%m-%d').date()
+            if episode_date <= today:
+                episode = {
+                    'episode_number': ep['episode_number'],
+                    'name': ep.get('name', f'Episode {ep["episode_number"]}'),
+                    'overview': ep.get('overview', ''),
+                    'air_date': air_date,
+                    'watched': False
+                }
+                episodes.append(episode)
+
+    if not episodes:
+        return None
+    # One line per season, not per episode: a refresh builds thousands of these
+    logger.debug("Built season %s with %d aired episodes", season, len(episodes))
+    return {
+        'season_number': season,
+        'episode_count': len(episodes),
+        'episodes': sorted(episodes, key=lambda x: x['episode_number'])
+    }
+
+
+def endpoint_name(url):
+    """Metrics label for a TMDB URL: its path with ids left out, e.g. tv/{id}/season/{id}"""
+    return re.sub(r'(?<=/)\d+(?=/|$)', '{id}', url.split('/3/', 1)[-1])
+
+
+def record_request(metrics, url, status, seconds):
+    """Count one TMDB request attempt (status is the HTTP status, or 'error')"""
+    if metrics:
+        endpoint = endpoint_name(url)
+        metrics.counter('tmdb_requests_total', 'TMDB requests by endpoint and HTTP status',
+                        ('endpoint', 'status')).inc(endpoint=endpoint, status=status)
+        metrics.histogram('tmdb_request_duration_seconds', 'TMDB request latency',
+                          ('endpoint',)).observe(seconds, endpoint=endpoint)
+
+
+def record_cache_lookup(metrics, url, hit):
+    if metrics:
+        metrics.counter('tmdb_cache_lookups_total', 'TMDB response cache lookups by endpoint',
+                        ('endpoint', 'result')).inc(endpoint=endpoint_name(url), result='hit' if hit else 'miss')
+
+
+def index_lookup(index, metrics, kind, title, year=None):
+    """TMDB search result for `title` from the local TMDB index, or None on a miss (or without an index)"""
+    if index is None:
+        return None
+    try:
+        hit = index.find(kind, title, year)
+    except Exception as e:
+        logger.error(f"Error reading the TMDB index: {str(e)}")
+        hit = None
+    if kind == 'movie' and hit and not (hit.get('overview') or hit.get('release_date')):
+        # ID-only export rows say nothing a movie needs; search for the details
+        hit = None
+    if metrics:
+        metrics.counter('tmdb_index_lookups_total', 'Local TMDB index lookups by kind',
+                        ('kind', 'result')).inc(kind=kind, result='hit' if hit else 'miss')
+    return hit
+
+
+def cache_ttl(ttls, url, data):
+    """Seconds a TMDB response may be served from cache, based on what it is"""
+    path = url.split('/3/', 1)[-1]
+    today = datetime.today().date().isoformat()
+    if path.startswith('search/movie'):
+        return ttls['movie_search']
+    if path.startswith('search/'):
+        return ttls['search']
+    if '/season/' in path:
+        # Seasons that have fully aired won't change any more
+        return ttls['finished'] if _season_finished(data, today) else ttls['series']
+    if data.get('status') in ('Ended', 'Canceled'):
+        return ttls['finished']
+    return ttls['series']
+
+
+def movie_details(movie):
+    """Our movie details from a TMDB search result"""
+    return {
+        'overview': movie.get('overview'),
+        'poster': f"{TMDB_IMAGE_URL}/w500{movie.get('poster_path')}" if movie.get('poster_path') else None,
+        'release_date': movie.get('release_date'),
+        'rating': movie.get('vote_average')
+    }
+
+
+def show_details(show, seasons):
+    """Our show details from a TMDB search result and its seasons"""
+    return {
+        'id': show['id'],
+        'overview': show.get('overview', ''),
+        'poster_path': f"{TMDB_IMAGE_URL}/w500{show['poster_path']}" if show.get('poster_path') else None,
+        'first_air_date': show.get('first_air_date', ''),
+        'rating': show.get('vote_average', 0),
+        'seasons': seasons
+    }
+
+
+def season_batches(number_of_seasons, append_limit, first_season=1):
+    """Season numbers left after the first append_to_response batch, in batches of append_limit"""
+    remaining = list(range(first_season + append_limit, number_of_seasons + 1))
+    return [remaining[i:i + append_limit] for i in range(0, len(remaining), append_limit)]
+
+
+def assemble_seasons(number_of_seasons, season_data, first_season=1):
+    """Our seasons from first_season on, in season order, from the TMDB season payloads by number"""
+    seasons = []
+    today = datetime.today().date()
+    for season in range(first_season, number_of_seasons + 1):
+        season_obj = _build_season(season, season_data.get(season) or {}, today)
+        if season_obj:
+            seasons.append(season_obj)
+    return seasons
+
+
+class TmdbClient:
+    """TMDB API client over one pooled, keep-alive requests.Session.
+
+    Every request is throttled by `rate_limiter`, bounded by connect/read
+    timeouts and retried with exponential backoff on connection errors and
+    429/5xx responses (honouring Retry-After). Successful JSON responses are
+    stored in `cache` with a TTL chosen by cache_ttl(). Requests and cache
+    lookups are counted in `metrics` (a metrics.Registry) when given.
+    Title searches are answered from `index` (a tmdb_index.TmdbIndex) when
+    it knows the title.
+    """
+
+    def __init__(self, api_key, rate_limiter=None, cache=None, ttls=None, pool_size=16,
+                 connect_timeout=3.05, read_timeout=10, max_retries=3, backoff=0.5,
+                 append_limit=20, max_workers=4, metrics=None, index=None):
+        self.api_key = api_key
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.metrics = metrics
+        self.index = index
+        self.ttls = {'search': 3600, 'movie_search': 7 * 86400, 'series': 3600, 'finished': 30 * 86400}
+        self.ttls.update(ttls or {})
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.append_limit = append_limit
+        self.max_workers = max_workers
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers())
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def headers(self):
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json;charset=utf-8'
+        }
+
+    # HTTP
+
+    def get(self, url, params=None):
+        """Throttled GET with timeouts and retries; returns the last response"""
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record_request(self.metrics, url, 'error', time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"TMDB request to {url} failed ({str(e)}), retrying in {delay}s")
+            else:
+                record_request(self.metrics, url, response.status_code, time.perf_counter() - started)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                retry_after = _retry_after(response)
+                delay = retry_after if retry_after is not None else self.backoff * 2 ** attempt
+                logger.warning(f"TMDB returned {response.status_code} for {url}, retrying in {delay}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def cache_ttl(self, url, data):
+        return cache_ttl(self.ttls, url, data)
+
+    def get_json(self, url, params=None):
+        """GET a TMDB endpoint and return its JSON, served from the cache when fresh"""
+        key = None
+        if self.cache:
+            key = self.cache.make_key(url, params)
+            data = self.cache.get(key)
+            record_cache_lookup(self.metrics, url, data is not None)
+            if data is not None:
+                return data
+
+        response = self.get(url, params=params)
+        try:
+            data = response.json()
+        except ValueError:
+            # Not JSON (e.g. an HTML error page from the edge)
+            response.raise_for_status()
+            raise
+        # Error payloads (not found, bad key, rate limited) are never cached
+        if self.cache and response.status_code == 200 and 'status_code' not in data:
+            self.cache.set(key, data, self.cache_ttl(url, data))
+        return data
+
+    # Endpoints
+
+    def search_movies(self, query, year=None):
+        params = {'query': query, 'language': 'en-US'}
+        if year:
+            params['year'] = year
+        return self.get_json(f"{TMDB_API_URL}/search/movie", params=params)
+
+    def search_tv(self, query):
+        return self.get_json(f"{TMDB_API_URL}/search/tv", params={'query': query, 'language': 'en-US'})
+
+    def find_movie(self, title, year=None):
+        """Details of the best TMDB match for `title` (from `year` when given), or None when nothing matches.
+
+        Unlike get_movie_details(), TMDB and network errors are raised.
+        """
+        hit = index_lookup(self.index, self.metrics, 'movie', title, year)
+        if hit:
+            return movie_details(hit)
+        search_data = self.search_movies(title, year)
+        if 'status_code' in search_data:
+            raise requests.HTTPError(f"TMDB error: {search_data.get('status_message')}")
+
+        results = search_data.get('results')
+        # A summary, not the payload: logging whole responses costs more than fetching them
+        logger.debug("TMDB movie search for %r: %d results", title, len(results or ()))
+        if results:
+            return movie_details(results[0])
+        return None
+
+    def get_movie_details(self, title):
+        try:
+            return self.find_movie(title)
+        except Exception as e:
+            logger.error(f"Error fetching movie details: {str(e)}")
+        return None
+
+    def get_tv_show_details(self, title):
+        try:
+            show = index_lookup(self.index, self.metrics, 'show', title)
+            if show is None:
+                search_data = self.search_tv(title)
+                logger.debug("TMDB TV search for %r: %d results", title, len(search_data.get('results') or ()))
+                show = search_data['results'][0] if search_data['results'] else None
+
+            if show:
+                episodes = self.get_tv_show_episodes(show['id'])
+                return show_details(show, episodes)
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching TV show details: {str(e)}")
+            return None
+
+    def get_tv_show_episodes(self, show_id):
+        return self.fetch_tv_show(show_id)[1]
+
+    def fetch_tv_show(self, show_id, from_season=1):
+        """Fetch a show's series data and its aired seasons; returns (series_data, seasons).
+
+        Only seasons numbered from_season and up are fetched.
+        """
+        try:
+            series_url = f"{TMDB_API_URL}/tv/{show_id}"
+
+            def fetch_season_batch(season_numbers):
+                # append_to_response returns each season under a "season/N" key
+                data = self.get_json(
+                    series_url,
+                    params={'append_to_response': ','.join(f"season/{n}" for n in season_numbers)}
+                )
+                return data, {n: data.get(f"season/{n}") for n in season_numbers}
+
+            def fetch_season(season):
+                logger.debug("Fetching season %s of show %s", season, show_id)
+                return season, self.get_json(f"{series_url}/season/{season}")
+
+            # The series request itself carries the first batch of seasons,
+            # so shows with up to append_limit seasons need a single round trip
+            logger.debug("Fetching series data for show %s", show_id)
+            series_data, season_data = fetch_season_batch(range(from_season, from_season + self.append_limit))
+
+            if 'status_code' in series_data:
+                if series_data['status_code'] == 34:
+                    logger.error(f"TV show not found: {show_id}")
+                else:
+                    logger.error(f"TMDB error for show {show_id}: {series_data.get('status_message')}")
+                return {}, []
+
+            number_of_seasons = series_data.get('number_of_seasons', 0)
+            logger.debug("Show %s has %d seasons", show_id, number_of_seasons)
+            batches = season_batches(number_of_seasons, self.append_limit, from_season)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for _, batch_data in pool.map(fetch_season_batch, batches):
+                    season_data.update(batch_data)
+
+                # Fall back to the per-season endpoint for anything the batches didn't return
+                missing = [n for n in range(from_season, number_of_seasons + 1) if not season_data.get(n)]
+                for season, data in pool.map(fetch_season, missing):
+                    season_data[season] = data
+
+            # Assemble in season order regardless of which request finished first
+            return series_data, assemble_seasons(number_of_seasons, season_data, from_season)
+
+        except Exception as e:
+            logger.error(f"Error fetching TV show episodes: {str(e)}")
+            return {}, []
@@ -0,0 +1,153 @@
+import gzip
+import json
+import sqlite3
+import threading
+import logging
+
+from title_index import normalize_title
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('movie', 'show')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    air_date TEXT,
+    overview TEXT,
+    vote_average REAL,
+    poster_path TEXT,
+    popularity REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, id)
+);
+-- One row per title an item is known by (title and original title)
+CREATE TABLE IF NOT EXISTS titles (
+    kind TEXT NOT NULL,
+    title_key TEXT NOT NULL,
+    year TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (kind, title_key, year, id)
+) WITHOUT ROWID;
+"""
+
+
+def _year(date):
+    # '' when unknown (ID exports carry no dates); key columns can't be NULL
+    return date[:4] if date and len(date) >= 4 else ''
+
+
+def row_kind(row):
+    """'show' for TV rows (name/original_name), 'movie' for movie rows (title/original_title)"""
+    return 'show' if 'name' in row or 'original_name' in row else 'movie'
+
+
+def _open_export(path):
+    # TMDB's daily exports come gzipped
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+class TmdbIndex:
+    """Local TMDB title index in a SQLite file, built from JSON-lines exports.
+
+    Rows are TMDB-shaped objects, one per line: TMDB's daily ID exports
+    (id, original_title/original_name, popularity) or fuller records with
+    title/name, release_date/first_air_date, overview, vote_average and
+    poster_path. Lookups go by normalized title (see title_index), optionally
+    with the year, and return the most popular match shaped like a TMDB
+    search result, so the clients can use it in place of a search request.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def ingest(self, path, kind=None, batch_size=10000, progress=None):
+        """Add (or update) the rows of a JSON-lines export; returns how many were read.
+
+        kind is 'movie' or 'show'; by default each row says by its fields.
+        progress(count) is called after every batch.
+        """
+        conn = self._conn()
+        items, titles, count = [], [], 0
+
+        def flush():
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)', items)
+                conn.executemany('INSERT OR IGNORE INTO titles VALUES (?, ?, ?, ?)', titles)
+            items.clear()
+            titles.clear()
+            if progress:
+                progress(count)
+
+        with _open_export(path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                item_kind = kind or row_kind(row)
+                names = {row.get(key) for key in ('title', 'name', 'original_title', 'original_name')}
+                names.discard(None)
+                if not names or 'id' not in row:
+                    continue
+                air_date = row.get('release_date') or row.get('first_air_date') or None
+                title = (row.get('title') or row.get('name')
+                         or row.get('original_title') or row.get('original_name'))
+                items.append((item_kind, row['id'], title, air_date, row.get('overview'),
+                              row.get('vote_average'), row.get('poster_path'), row.get('popularity') or 0))
+                for name in names:
+                    title_key = normalize_title(name)
+                    if title_key:
+                        titles.append((item_kind, title_key, _year(air_date), row['id']))
+                count += 1
+                if len(items) >= batch_size:
+                    flush()
+        if items:
+            flush()
+        # Lookups go by (kind, title_key, year) prefix of the primary key
+        conn.execute('ANALYZE')
+        return count
+
+    def find(self, kind, title, year=None):
+        """Most popular item titled `title` (from that year when given), as a TMDB search result, or None"""
+        title_key = normalize_title(title)
+        if not title_key:
+            return None
+        sql = ('SELECT i.* FROM titles t JOIN items i ON i.kind = t.kind AND i.id = t.id '
+               'WHERE t.kind = ? AND t.title_key = ?')
+        params = [kind, title_key]
+        order = 'i.popularity DESC'
+        if year:
+            # The right year first, then items whose year isn't known
+            sql += " AND t.year IN (?, '')"
+            order = "t.year = '', " + order
+            params.append(str(year))
+        row = self._conn().execute(f'{sql} ORDER BY {order} LIMIT 1', params).fetchone()
+        if not row:
+            return None
+        if kind == 'movie':
+            result = {'id': row['id'], 'title': row['title'], 'release_date': row['air_date']}
+        else:
+            result = {'id': row['id'], 'name': row['title'], 'first_air_date': row['air_date']}
+        result.update({'overview': row['overview'], 'vote_average': row['vote_average'],
+                       'poster_path': row['poster_path'], 'popularity': row['popularity']})
+        return result
+
+    def get_stats(self):
+        rows = self._conn().execute('SELECT kind, COUNT(*) FROM items GROUP BY kind')
+        return {kind: count for kind, count in rows}
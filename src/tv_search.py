@@ -0,0 +1,140 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from tmdb_client import TMDB_IMAGE_URL
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search query"""
+    return ' '.join(query.lower().split())
+
+
+def show_summary(show):
+    """What the search results list needs from a TMDB search/tv result"""
+    overview = show.get('overview') or ''
+    return {
+        'id': show.get('id'),
+        'title': show.get('name'),
+        'overview': overview[:150] + '...' if len(overview) > 150 else overview,
+        'poster': f"{TMDB_IMAGE_URL}/w200{show.get('poster_path')}" if show.get('poster_path') else None,
+        'year': show.get('first_air_date', '')[:4] if show.get('first_air_date') else None,
+        'tmdb_rating': show.get('vote_average')
+    }
+
+
+class TvSearch:
+    """Search-as-you-type front for TMDB search/tv.
+
+    Queries are normalized first. An answer cached for the same query is
+    returned as is. A longer query whose prefix was cached with TMDB's
+    complete result set (a single page of matches) is answered by filtering
+    those results by title, without a network call. Otherwise identical
+    queries already in flight share one upstream request.
+
+    `search(query)` is the coroutine doing the TMDB request and returning
+    its JSON payload.
+    """
+
+    def __init__(self, search, ttl=3600, max_entries=500, max_results=10):
+        self.search = search
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_results = max_results
+        # normalized query -> (summaries, complete, expires)
+        self._results = OrderedDict()
+        # normalized query -> Future shared by everyone waiting for it
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'prefix_hits': 0, 'coalesced': 0, 'upstream': 0}
+
+    def _cached(self, query, now):
+        entry = self._results.get(query)
+        if entry and entry[2] > now:
+            self._results.move_to_end(query)
+            return entry
+        return None
+
+    def _from_cache(self, query):
+        """Results for query from the cache, exact or by prefix, or None"""
+        now = time.time()
+        entry = self._cached(query, now)
+        if entry:
+            self.stats['hits'] += 1
+            return entry[0]
+        for end in range(len(query) - 1, 0, -1):
+            entry = self._cached(query[:end], now)
+            if entry and entry[1]:
+                matches = [show for show in entry[0] if query in normalize_query(show['title'] or '')]
+                # TMDB also matches on alternative titles; let it have a go when nothing's left
+                if matches:
+                    self.stats['prefix_hits'] += 1
+                    return matches
+                return None
+        return None
+
+    def _remember(self, query, results, complete):
+        self._results[query] = (results, complete, time.time() + self.ttl)
+        self._results.move_to_end(query)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def query(self, query):
+        """Up to max_results summaries of the TV shows TMDB finds for query"""
+        query = normalize_query(query)
+        with self._lock:
+            results = self._from_cache(query)
+            if results is not None:
+                return results[:self.max_results]
+            future = self._in_flight.get(query)
+            leader = future is None
+            if leader:
+                future = self._in_flight[query] = Future()
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            try:
+                # Works from any event loop: the Future isn't tied to one. Shielded, so a
+                # waiter being cancelled doesn't cancel the search for everyone else
+                results = await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled before it got an answer: ask again
+                return await self.query(query)
+            return results[:self.max_results]
+
+        try:
+            with self._lock:
+                self.stats['upstream'] += 1
+            data = await self.search(query)
+            if 'status_code' in data:
+                raise RuntimeError(f"TMDB error: {data.get('status_message')}")
+            results = [show_summary(show) for show in data.get('results', [])]
+            complete = data.get('total_pages', 1) <= 1
+            with self._lock:
+                self._remember(query, results, complete)
+            future.set_result(results)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[query]
+            if not future.done():
+                # Cancelled (a BaseException, so not caught above); waiters mustn't hang
+                future.cancel()
+        return results[:self.max_results]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._results)
+            stats['in_flight'] = len(self._in_flight)
+        return stats
@@ -0,0 +1,46 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The app's modules are flat files in src/, imported by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def library(request, tmp_path):
+    """Each backend behind the same interface main.py uses"""
+    if request.param == 'sqlite':
+        from sqlite_library import SqliteLibrary
+        return SqliteLibrary(str(tmp_path / 'library.db'))
+    from test_json_library import open_library
+    return open_library(str(tmp_path))
+
+
+@pytest.fixture(scope='session')
+def main(tmp_path_factory):
+    """src/main.py with its files in a temp dir and nothing running in the background"""
+    directory = str(tmp_path_factory.mktemp('app'))
+    env = {
+        'MOVIES_FILE': os.path.join(directory, 'movies.json'),
+        'TV_SHOWS_FILE': os.path.join(directory, 'tv_shows.json'),
+        'LIBRARY_BACKEND': 'json',
+        'TMDB_API_KEY': 'test',
+        'TMDB_CACHE_FILE': os.path.join(directory, 'tmdb_cache.db'),
+        'TMDB_INDEX_FILE': os.path.join(directory, 'tmdb_index.db'),
+        'IMPORT_DIR': os.path.join(directory, 'imports'),
+        'POSTER_CACHE_DIR': os.path.join(directory, 'posters'),
+        'REFRESH_INTERVAL_MINUTES': '0',
+        'MOVIE_BACKFILL_BATCH_SIZE': '0',
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        yield importlib.import_module('main')
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
@@ -0,0 +1,20 @@
+def test_batch_rejects_unknown_show_statuses(main):
+    main.library.add_show({'title': 'The Wire', 'status': 'to_watch', 'rating': 0, 'seasons': []})
+    client = main.app.test_client()
+
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'set_show_status', 'title': 'The Wire', 'status': 'bogus'}]})
+    assert response.status_code == 400
+    assert main.library.get_show('The Wire')['status'] == 'to_watch'
+
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'set_show_status', 'title': 'The Wire', 'status': 'on_hold'}]})
+    assert response.get_json()['success']
+    assert main.library.get_show('The Wire')['status'] == 'on_hold'
+
+
+def test_update_show_status_rejects_unknown_statuses(main):
+    main.library.add_show({'title': 'Deadwood', 'status': 'to_watch', 'rating': 0, 'seasons': []})
+    response = main.app.test_client().post('/update_show_status', data={'title': 'Deadwood', 'status': 'bogus'})
+    assert not response.get_json()['success']
+    assert main.library.get_show('Deadwood')['status'] == 'to_watch'
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+from json_library import JsonLibrary
+from library_index import MovieList, ShowList, TitleIndexedList
+from library_mutations import EPISODE_MUTATIONS, MOVIE_MUTATIONS, TV_SHOW_MUTATIONS
+from library_store import LibraryStore
+
+
+def open_library(directory):
+    """A JsonLibrary with stores of its own, like one worker process has"""
+    def store(name, mutations, factory):
+        return LibraryStore(os.path.join(directory, f"{name}.json"), name=name, mutations=mutations,
+                            factory=factory)
+    return JsonLibrary(store('movies', MOVIE_MUTATIONS, MovieList), store('tv_shows', TV_SHOW_MUTATIONS, ShowList),
+                       store('episodes', EPISODE_MUTATIONS, TitleIndexedList))
+
+
+def show(title):
+    episodes = [{'episode_number': n, 'name': f"Episode {n}", 'air_date': '2020-01-01', 'watched': False}
+                for n in (1, 2)]
+    return {'title': title, 'status': 'ongoing', 'rating': 0,
+            'seasons': [{'season_number': 1, 'episode_count': 2, 'episodes': episodes}]}
+
+
+def test_episode_metadata_is_written_once_across_processes(tmp_path):
+    writer, reader = open_library(str(tmp_path)), open_library(str(tmp_path))
+    reader.list_shows()
+    writer.add_show(show('One'))
+    writer.add_show(show('Two'))
+    episodes_log = str(tmp_path / 'episodes.json.log')
+    size = os.path.getsize(episodes_log)
+
+    # Reloading replays both add_show records; their metadata is already stored
+    names = [ep['name'] for ep in reader.get_show('Two', with_episodes=True)['seasons'][0]['episodes']]
+    assert names == ['Episode 1', 'Episode 2']
+    writer.set_show_rating('One', 4)
+    reader.list_shows()
+    assert os.path.getsize(episodes_log) == size
+
+
+def test_metadata_saved_inside_a_batch_does_not_deadlock_with_another_thread(tmp_path):
+    writer, reader = open_library(str(tmp_path)), open_library(str(tmp_path))
+    shows = reader.tv_shows_store.load()
+    writer.add_show(show('One'))
+    in_batch, saving = threading.Event(), threading.Event()
+
+    def batch():
+        # Loading the stores replays add_show, which leaves metadata for _shows() to save
+        with reader.batch():
+            in_batch.set()
+            saving.wait(5)
+            time.sleep(0.2)
+            reader.list_shows()
+
+    def save():
+        in_batch.wait(5)
+        saving.set()
+        reader._save_metadata(shows, {'Two': {'1': [{'name': 'Pilot'}]}})
+
+    threads = [threading.Thread(target=batch, daemon=True), threading.Thread(target=save, daemon=True)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    assert reader.get_show('One', with_episodes=True)['seasons'][0]['episodes'][0]['name'] == 'Episode 1'
@@ -0,0 +1,75 @@
+from sqlite_library import SqliteLibrary, import_json_library
+from test_json_library import open_library
+
+
+def show(title, tmdb_id=None, seasons=1, episodes=2):
+    return {'title': title, 'status': 'ongoing', 'rating': 0, 'tmdb_id': tmdb_id,
+            'seasons': [{'season_number': s, 'episode_count': episodes,
+                         'episodes': [{'episode_number': n, 'name': f"S{s}E{n}", 'air_date': '2020-01-01',
+                                       'watched': False} for n in range(1, episodes + 1)]}
+                        for s in range(1, seasons + 1)]}
+
+
+def test_movies(library):
+    assert library.add_movie({'title': 'Heat', 'watched': False, 'rating': 0})
+    assert not library.add_movie({'title': 'Heat', 'watched': False, 'rating': 0})
+    assert library.add_movie({'title': 'Alien', 'watched': False, 'rating': 0})
+
+    assert library.find_movie('heat')['title'] == 'Heat'
+    assert library.set_movie_watched('Heat')
+    assert not library.set_movie_watched('Missing')
+    assert library.set_movie_rating('Heat', 4)
+    assert library.get_movie('Heat')['rating'] == 4
+    assert library.count_movies() == 2
+    assert library.count_movies(watched=True) == 1
+    assert [movie['title'] for movie in library.list_movies(watched=False)] == ['Alien']
+    assert library.random_unwatched_movie()['title'] == 'Alien'
+
+
+def test_shows_and_episodes(library):
+    assert library.add_show(show('The Wire', tmdb_id=1438, seasons=2))
+    assert not library.add_show(show('The Wire'))
+
+    assert library.find_show_by_tmdb_id(1438)['title'] == 'The Wire'
+    assert library.set_show_status('The Wire', 'on_hold')
+    assert [s['title'] for s in library.list_shows(status='on_hold')] == ['The Wire']
+    assert library.latest_season('The Wire') == 2
+
+    assert library.set_episode_watched('The Wire', 1, 2, True)
+    assert not library.set_episode_watched('The Wire', 3, 1, True)
+    library.set_show_status('The Wire', 'ongoing')
+    unwatched = library.unwatched_episodes(status='ongoing')
+    assert [(e['season'], e['episode']) for e in unwatched] == [(1, 1), (2, 1), (2, 2)]
+    assert library.count_unwatched_episodes(status='ongoing') == 3
+
+    library.set_all_episodes_watched('The Wire', True)
+    assert library.all_episodes_watched('The Wire')
+    assert library.delete_show('The Wire')
+    assert library.get_show('The Wire') is None
+
+
+def test_add_episodes_keeps_stored_episodes_and_their_state(library):
+    library.add_show(show('The Wire'))
+    library.set_episode_watched('The Wire', 1, 1, True)
+
+    pulled = show('The Wire', seasons=2, episodes=3)['seasons']
+    assert library.add_episodes('The Wire', pulled)
+    assert not library.add_episodes('Missing', pulled)
+
+    seasons = library.get_show('The Wire', with_episodes=True)['seasons']
+    assert [[e['episode_number'] for e in s['episodes']] for s in seasons] == [[1, 2, 3], [1, 2, 3]]
+    assert seasons[0]['episodes'][0]['watched']
+    assert library.count_unwatched_episodes(status='ongoing') == 5
+
+
+def test_import_json_library_skips_titles_already_imported(tmp_path):
+    source = open_library(str(tmp_path))
+    source.add_movie({'title': 'Heat', 'watched': True, 'rating': 5})
+    source.add_show(show('The Wire'))
+    target = SqliteLibrary(str(tmp_path / 'library.db'))
+
+    movies, shows = source.list_movies(), source.list_shows(with_episodes=True)
+    assert import_json_library(target, movies, shows) == (1, 1)
+    assert import_json_library(target, movies, shows) == (0, 0)
+    assert target.get_movie('Heat')['watched']
+    assert target.get_show('The Wire', with_episodes=True)['seasons'][0]['episodes'][1]['name'] == 'S1E2'
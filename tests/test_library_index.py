@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+
+from library_index import FenwickTree, MovieList, RandomPicker
+
+
+def test_fenwick_tree_prefix_sums_follow_appends_pops_and_updates():
+    weights = [3.0, 1.0, 4.0, 1.0, 5.0]
+    tree = FenwickTree(weights[:2])
+    for weight in weights[2:]:
+        tree.append(weight)
+    tree.add(1, 1.0)
+    weights[1] += 1.0
+    assert [tree.prefix_sum(n) for n in range(6)] == [sum(weights[:n]) for n in range(6)]
+    tree.pop()
+    assert tree.total() == sum(weights[:4])
+    assert [tree.find(target) for target in (0, 2.9, 3.0, 4.9, 5.0, 9.9)] == [0, 0, 1, 1, 2, 3]
+
+
+def test_picker_swap_removes_and_keeps_weights_with_their_items():
+    items = [{'name': name, 'weight': weight} for name, weight in (('a', 1), ('b', 2), ('c', 3), ('d', 4))]
+    picker = RandomPicker(weight=lambda item: item['weight'])
+    for item in items:
+        picker.add(item)
+    picker.discard(items[0])
+    picker.discard(items[0])
+
+    assert len(picker) == 3 and items[0] not in picker
+    for slot, item in enumerate(picker.items):
+        assert picker.slots[id(item)] == slot
+        assert picker.weights.prefix_sum(slot + 1) - picker.weights.prefix_sum(slot) == item['weight']
+
+
+def test_weighted_picks_follow_the_weights():
+    random.seed(0)
+    items = [{'name': 'low', 'weight': 1}, {'name': 'high', 'weight': 3}]
+    picker = RandomPicker(weight=lambda item: item['weight'])
+    for item in items:
+        picker.add(item)
+
+    picks = Counter(picker.choice(weighted=True)['name'] for _ in range(4000))
+    assert 0.7 < picks['high'] / 4000 < 0.8
+
+
+def test_movie_list_tracks_unwatched_movies_as_they_change():
+    movies = MovieList([{'title': 'Heat', 'watched': False}, {'title': 'Alien', 'watched': True}])
+    assert [movie['title'] for movie in movies.unwatched.items] == ['Heat']
+
+    movies.append({'title': 'Up', 'watched': False})
+    movies.update_item(movies.get('Heat'), {'watched': True})
+    movies.update_item(movies.get('Alien'), {'watched': False})
+    assert sorted(movie['title'] for movie in movies.unwatched.items) == ['Alien', 'Up']
@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+
+import pytest
+
+from library_index import MovieList
+from library_mutations import MOVIE_MUTATIONS
+from library_store import LibraryStore, fcntl
+
+
+def open_store(path, compact_every=500):
+    return LibraryStore(path, name='movies', mutations=MOVIE_MUTATIONS, compact_every=compact_every,
+                        factory=MovieList)
+
+
+def add_movies(path, worker, count, compact_every):
+    store = open_store(path, compact_every)
+    for i in range(count):
+        store.apply('add_movie', movie={'title': f"Movie {worker}-{i}", 'watched': False, 'rating': 0})
+    if store._compactor:
+        store._compactor.join()
+
+
+@pytest.mark.skipif(fcntl is None, reason='needs flock to share the files between processes')
+def test_writers_in_several_processes_lose_nothing_across_compactions(tmp_path):
+    path = str(tmp_path / 'movies.json')
+    start_version = open_store(path).version()
+    workers, count = 4, 200
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=add_movies, args=(path, worker, count, 37)) for worker in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    store = open_store(path)
+    titles = {movie['title'] for movie in store.load()}
+    assert titles == {f"Movie {worker}-{i}" for worker in range(workers) for i in range(count)}
+    assert store.version() == start_version + workers * count
+
+
+def test_replaced_files_are_noticed_when_stat_cannot_tell_them_apart(tmp_path, monkeypatch):
+    path = str(tmp_path / 'movies.json')
+    reader, writer = open_store(path), open_store(path)
+    writer.apply('add_movie', movie={'title': 'First', 'watched': False, 'rating': 0})
+    assert [movie['title'] for movie in reader.load()] == ['First']
+
+    # As if inodes were reused and mtimes fell in the same tick: only the log's generation differs
+    monkeypatch.setattr(LibraryStore, '_stat',
+                        staticmethod(lambda path: (1, 1, 1) if os.path.exists(path) else None))
+    reader.invalidate()
+    reader.load()
+    writer.save([{'title': 'Second', 'watched': False, 'rating': 0}])
+    assert [movie['title'] for movie in reader.load()] == ['Second']
+
+
+def test_unreadable_file_serves_an_empty_library(tmp_path):
+    path = tmp_path / 'movies.json'
+    path.write_text('{not json')
+    store = open_store(str(path))
+
+    movies = store.load()
+    assert isinstance(movies, MovieList)
+    assert len(movies.unwatched) == 0
+    assert store.apply('set_movie_rating', title='Missing', rating=3) is False
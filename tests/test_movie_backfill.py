@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from movie_backfill import MovieBackfill, fcntl
+from test_json_library import open_library
+
+
+def test_each_batch_is_one_library_write(tmp_path):
+    library = open_library(str(tmp_path))
+    for n in range(5):
+        library.add_movie({'title': f"Movie {n}", 'watched': False})
+    log_path = str(tmp_path / 'movies.json.log')
+    with open(log_path) as file:
+        records = len(file.readlines())
+
+    def lookup(title):
+        if title == 'Movie 3':
+            raise OSError('timed out')
+        return None if title == 'Movie 4' else {'overview': 'Plot', 'release_date': '2001-01-01', 'rating': 7.5}
+
+    MovieBackfill(library, lookup, batch_size=2, concurrency=2).run()
+
+    with open(log_path) as file:
+        assert len(file.readlines()) == records + 3
+    assert library.get_movie('Movie 0')['tmdb_rating'] == 7.5
+    assert library.get_movie('Movie 4')['tmdb_checked']
+    assert not library.get_movie('Movie 3').get('tmdb_checked')
+
+
+@pytest.mark.skipif(fcntl is None, reason='needs flock to share the lock between processes')
+def test_backfill_is_skipped_while_another_process_runs_it(tmp_path):
+    library = open_library(str(tmp_path))
+    library.add_movie({'title': 'Heat', 'watched': False})
+    lock_path = str(tmp_path / 'movies.json.backfill.lock')
+    looked_up = []
+
+    def lookup(title):
+        looked_up.append(title)
+
+    backfill = MovieBackfill(library, lookup, lock_path=lock_path)
+    # Another worker's lock: flock locks are per open file, so this holds it against us too
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        backfill.run()
+        assert looked_up == []
+    finally:
+        os.close(fd)
+
+    backfill.run()
+    assert looked_up == ['Heat']
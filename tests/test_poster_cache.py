@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from poster_cache import PosterCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.content = content
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeSession:
+    """Serves 1000-byte images slowly and counts the fetches per URL"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fetches = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout=None):
+        with self._lock:
+            self.fetches[url] = self.fetches.get(url, 0) + 1
+        time.sleep(self.delay)
+        return FakeResponse(200, b'x' * 1000)
+
+
+def open_cache(directory, max_bytes=10 ** 6, session=None):
+    cache = PosterCache(str(directory), max_bytes=max_bytes, image_url='http://tmdb.test')
+    cache.session = session or FakeSession()
+    return cache
+
+
+def read(found):
+    file, _ = found
+    with file:
+        return file.read()
+
+
+def test_concurrent_requests_share_one_fetch(tmp_path):
+    session = FakeSession(delay=0.05)
+    cache = open_cache(tmp_path, session=session)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: read(cache.get('card', 'a.jpg')), range(16)))
+    assert results == [b'x' * 1000] * 16
+    assert session.fetches == {'http://tmdb.test/w185/a.jpg': 1}
+    assert cache._fetch_locks == {}
+
+
+def test_a_served_file_survives_its_eviction(tmp_path):
+    cache = open_cache(tmp_path, max_bytes=1500)
+    found = cache.get('card', 'a.jpg')
+    cache.get('card', 'b.jpg')
+    assert not (tmp_path / 'card' / 'a.jpg').exists()
+    assert read(found) == b'x' * 1000
+
+
+def test_the_bound_holds_across_processes_sharing_the_directory(tmp_path):
+    first, second = open_cache(tmp_path, max_bytes=2500), open_cache(tmp_path, max_bytes=2500)
+    for i in range(3):
+        read(first.get('card', f"first{i}.jpg"))
+        read(second.get('card', f"second{i}.jpg"))
+    files = sorted(path.name for path in (tmp_path / 'card').iterdir())
+    assert files == ['first2.jpg', 'second2.jpg']
+    # Files fetched by the other process are served without fetching them again
+    assert read(first.get('card', 'second2.jpg')) == b'x' * 1000
+    assert 'http://tmdb.test/w185/second2.jpg' not in first.session.fetches
@@ -0,0 +1,16 @@
+POSTER = 'https://image.tmdb.org/t/p/w500/abc.jpg'
+
+
+def test_search_and_unwatched_episodes_link_to_cached_thumbnails(main):
+    main.library.add_movie({'title': 'Arrival', 'watched': False, 'rating': 0, 'poster': POSTER})
+    episodes = [{'episode_number': 1, 'name': 'Pilot', 'air_date': '2020-01-01', 'watched': False}]
+    main.library.add_show({'title': 'Arrested Development', 'status': 'ongoing', 'rating': 0, 'poster': POSTER,
+                           'seasons': [{'season_number': 1, 'episode_count': 1, 'episodes': episodes}]})
+    client = main.app.test_client()
+
+    found = client.get('/api/search?q=arr').get_json()
+    assert [movie['poster'] for movie in found['movies']] == ['/posters/thumb/abc.jpg']
+    assert [show['poster'] for show in found['shows']] == ['/posters/thumb/abc.jpg']
+
+    feed = client.get('/api/unwatched_episodes').get_json()
+    assert {episode['poster'] for episode in feed['episodes']} == {'/posters/thumb/abc.jpg'}
@@ -0,0 +1,70 @@
+from sqlite_library import SqliteLibrary
+
+
+def movie(title, watched=False, tmdb_rating=None):
+    return {'title': title, 'watched': watched, 'rating': 0, 'tmdb_rating': tmdb_rating}
+
+
+def test_title_index_is_rebuilt_only_when_titles_change(tmp_path):
+    library = SqliteLibrary(str(tmp_path / 'library.db'))
+    library.add_movie(movie('Heat'))
+    index = library._title_index('movies')
+
+    library.set_movie_watched('Heat')
+    library.set_movie_rating('Heat', 4)
+    assert library._title_index('movies') is index
+
+    library.add_movie(movie('Alien'))
+    assert library._title_index('movies') is not index
+    assert [found['title'] for found in library.search_movies('alien')] == ['Alien']
+
+
+def unwatched_positions(library):
+    rows = library._conn().execute('SELECT pos, movie_id FROM unwatched_movies ORDER BY pos').fetchall()
+    ids = {row[0] for row in library._conn().execute('SELECT id FROM movies WHERE watched = 0')}
+    return [row[0] for row in rows], {row[1] for row in rows} == ids
+
+
+def test_unwatched_positions_stay_dense_as_movies_are_watched(tmp_path):
+    library = SqliteLibrary(str(tmp_path / 'library.db'))
+    for i in range(10):
+        library.add_movie(movie(f"Movie {i}", watched=i == 3))
+    for title in ('Movie 0', 'Movie 9', 'Movie 5'):
+        library.set_movie_watched(title)
+    library.set_movie_watched('Movie 3', False)
+
+    positions, same_movies = unwatched_positions(library)
+    assert positions == list(range(1, 8))
+    assert same_movies
+    picks = {library.random_unwatched_movie()['title'] for _ in range(300)}
+    assert picks == {f"Movie {i}" for i in (1, 2, 3, 4, 6, 7, 8)}
+
+
+def test_unwatched_positions_are_filled_in_for_existing_databases(tmp_path):
+    path = str(tmp_path / 'library.db')
+    library = SqliteLibrary(path)
+    for i in range(5):
+        library.add_movie(movie(f"Movie {i}", watched=i % 2 == 0))
+    with library._write() as conn:
+        conn.execute('DELETE FROM unwatched_movies')
+
+    positions, same_movies = unwatched_positions(SqliteLibrary(path))
+    assert positions == [1, 2]
+    assert same_movies
+
+
+def test_weighted_picks_follow_the_tmdb_rating(tmp_path):
+    library = SqliteLibrary(str(tmp_path / 'library.db'))
+    library.add_movie(movie('Good', tmdb_rating=9.0))
+    library.add_movie(movie('Poor', tmdb_rating=1.0))
+    picks = [library.random_unwatched_movie(weight='rating')['title'] for _ in range(2000)]
+    # 90% expected
+    assert 0.85 < picks.count('Good') / len(picks) < 0.95
+
+
+def test_add_movie_reports_rows_skipped_by_the_insert(tmp_path, monkeypatch):
+    library = SqliteLibrary(str(tmp_path / 'library.db'))
+    assert library.add_movie(movie('Heat'))
+    # Another writer inserting the title between the lookup and the INSERT
+    monkeypatch.setattr(library, 'find_movie', lambda title: None)
+    assert not library.add_movie(movie('Heat'))
@@ -0,0 +1,36 @@
+from title_index import TitleIndex, normalize_title
+
+
+def test_normalized_titles_ignore_case_accents_punctuation_and_articles():
+    assert normalize_title('The Lord of the Rings: The Return of the King') == 'lord of rings return of king'
+    assert normalize_title('Amélie') == normalize_title('amelie')
+    assert normalize_title('Fast & Furious') == 'fast and furious'
+
+
+def test_exact_and_fuzzy_matches():
+    index = TitleIndex(['The Lord of the Rings: The Return of the King', 'Toy Story 2', 'Alien'])
+
+    assert index.exact('lord of the rings - return of the king') == 'The Lord of the Rings: The Return of the King'
+    assert index.exact('Aliens') is None
+    assert index.similar('Lord of the Rings Return of King')[0] == ('The Lord of the Rings: The Return of the King', 1.0)
+    assert [title for title, _ in index.similar('Aliens')] == ['Alien']
+    # Sequels aren't duplicates
+    assert index.similar('Toy Story 3') == []
+
+
+def test_search_puts_prefix_matches_first():
+    index = TitleIndex(['Star Wars', 'Lone Star', 'Stargate', 'Heat'])
+    assert index.search('star')[:2] == ['Star Wars', 'Stargate']
+    assert 'Lone Star' in index.search('star')
+    assert index.search('stra wars')[0] == 'Star Wars'
+
+
+def test_library_duplicate_checks_and_search(library):
+    library.add_movie({'title': 'The Lord of the Rings: The Return of the King', 'watched': False, 'rating': 0})
+    library.add_movie({'title': 'Heat', 'watched': False, 'rating': 0})
+
+    (movie, score), = library.similar_movies('Lord of the Rings - Return of the King')
+    assert movie['title'] == 'The Lord of the Rings: The Return of the King' and score == 1.0
+    assert [movie['title'] for movie in library.search_movies('return king')] == [
+        'The Lord of the Rings: The Return of the King']
+    assert library.similar_movies('Heat 2') == []
@@ -0,0 +1,44 @@
+import asyncio
+
+from tv_search import TvSearch
+
+
+def test_waiters_search_again_when_the_leader_is_cancelled():
+    calls = []
+
+    async def search(query):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return {'total_pages': 1, 'results': [{'id': 1, 'name': 'The Wire'}]}
+
+    async def run():
+        tv_search = TvSearch(search)
+        leader = asyncio.ensure_future(tv_search.query('the wire'))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(tv_search.query('The Wire'))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.wait_for(waiter, 1)
+        return results, tv_search.get_stats()
+
+    results, stats = asyncio.run(run())
+    assert [show['title'] for show in results] == ['The Wire']
+    assert calls == ['the wire', 'the wire']
+    assert stats['in_flight'] == 0
+
+
+def test_a_cancelled_waiter_leaves_the_shared_search_running():
+    async def search(query):
+        await asyncio.sleep(0.05)
+        return {'total_pages': 1, 'results': [{'id': 1, 'name': 'The Wire'}]}
+
+    async def run():
+        tv_search = TvSearch(search)
+        leader = asyncio.ensure_future(tv_search.query('the wire'))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(tv_search.query('the wire'))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        return await asyncio.wait_for(leader, 1)
+
+    assert [show['title'] for show in asyncio.run(run())] == ['The Wire']